@@ -0,0 +1,21 @@
+"""
+Бенчмарки сервиса. Запуск из корня репозитория: python -m benchmarks.<name>
+"""
+import os
+import sys
+
+# logconf импортирует config как модуль верхнего уровня (как при запуске src/main.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Значения по умолчанию для обязательных переменных окружения config.py
+for key, value in (
+        ('WORKER_HOST', '127.0.0.1'),
+        ('WORKER_PORT', '9001'),
+        ('GATEWAY_HOST', '127.0.0.1'),
+        ('GATEWAY_PORT', '9002'),
+        ('THIS_HOST', '127.0.0.1'),
+        ('THIS_PORT', '8000'),
+        ('LOG_LEVEL', 'WARNING'),
+        ('SECRET_KEY', 'benchmark-secret-key-0123456789abcdef'),
+):
+    os.environ.setdefault(key, value)
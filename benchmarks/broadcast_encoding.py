@@ -0,0 +1,59 @@
+"""
+Микро-бенчмарк стоимости сериализации одного сообщения чата.
+
+До: model_dump() для рассылки, json.dumps на каждого получателя
+(как starlette send_json) и model_dump_json() для worker'а.
+После: один model_dump_json(), тот же буфер вкладывается в кадр.
+
+Запуск: python -m benchmarks.broadcast_encoding [--recipients 2] [--count 100000]
+"""
+import argparse
+import json
+import time
+
+from src.models import MessageContent
+from src.services.frames import wrap
+
+
+def make_message() -> MessageContent:
+    return MessageContent(
+        sender="nickname",
+        text="Hello! How are you doing today? Привет, как дела?",
+        created_at="2025-01-01T12:00:00.000+03:00",
+        room_id="6f1c2c1e-8a3b-4c7e-9f0a-1b2c3d4e5f60",
+    )
+
+
+def before(message: MessageContent, recipients: int):
+    message.model_dump_json()
+    frame = {"type": "new_message", "message": message.model_dump()}
+    for _ in range(recipients):
+        json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+
+def after(message: MessageContent, recipients: int):
+    payload = message.model_dump_json()
+    wrap("new_message", "message", payload)
+
+
+def measure(func, message: MessageContent, recipients: int, count: int) -> float:
+    start = time.process_time()
+    for _ in range(count):
+        func(message, recipients)
+    return (time.process_time() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=2)
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    message = make_message()
+    for name, func in (("before", before), ("after", after)):
+        cost = measure(func, message, args.recipients, args.count)
+        print(f"{name:>6}: {cost:.2f} us CPU per message ({args.recipients} recipients)")
+
+
+if __name__ == "__main__":
+    main()
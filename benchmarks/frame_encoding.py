@@ -0,0 +1,97 @@
+"""
+Размер и стоимость кодирования кадров чата: JSON и MessagePack,
+без сжатия и с permessage-deflate (параметры SERVER_WS_DEFLATE_*).
+
+Сжатие считается как в соединении: один контекст zlib на поток кадров
+(context takeover), после каждого кадра Z_SYNC_FLUSH.
+
+Запуск: python -m benchmarks.frame_encoding [--history 50] [--count 2000]
+Для MessagePack нужен пакет msgpack.
+"""
+import argparse
+import random
+import string
+import time
+import zlib
+from typing import Callable, List
+
+from src.config import config
+from src.services.frames import dumps, loads, msgpack, pack, wrap
+
+
+# Словарь для текстов: одинаковые сообщения сжимаются нереалистично хорошо
+_random = random.Random(0)
+WORDS = [
+    ''.join(_random.choices(string.ascii_lowercase, k=_random.randint(2, 9))) for _ in range(300)
+] + ["привет", "как", "дела", "слово", "учить", "язык", "сегодня", "хорошо"] * 10
+
+
+def make_message(i: int) -> dict:
+    return {
+        "sender": f"nickname{i % 2}",
+        "text": ' '.join(_random.choices(WORDS, k=_random.randint(3, 25))),
+        "created_at": f"2025-01-01T12:{i // 60 % 60:02d}:{i % 60:02d}.000+03:00",
+        "room_id": "6f1c2c1e-8a3b-4c7e-9f0a-1b2c3d4e5f60",
+    }
+
+
+def deflated_size(frames: List[bytes]) -> float:
+    """Средний размер кадра после permessage-deflate"""
+    settings = config.server
+    compressor = zlib.compressobj(wbits=-settings.ws_deflate_window_bits, memLevel=settings.ws_deflate_mem_level)
+    total = 0
+    for frame in frames:
+        # websockets отбрасывает хвост 00 00 ff ff каждого кадра
+        total += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total / len(frames)
+
+
+def per_call_us(func: Callable, count: int) -> float:
+    start = time.process_time()
+    for _ in range(count):
+        func()
+    return (time.process_time() - start) / count * 1e6
+
+
+def report(name: str, frames_json: List[str], encode_msgpack: Callable, count: int):
+    raw_json = [frame.encode() for frame in frames_json]
+    print(f"{name}:")
+    print(f"  json     {sum(map(len, raw_json)) / len(raw_json):9.0f} B   "
+          f"deflate {deflated_size(raw_json):9.0f} B   "
+          f"decode {per_call_us(lambda: loads(raw_json[0]), count):7.1f} us")
+
+    if msgpack is None:
+        print("  msgpack  not installed")
+        return
+    packed = [pack(frame) for frame in frames_json]
+    print(f"  msgpack  {sum(map(len, packed)) / len(packed):9.0f} B   "
+          f"deflate {deflated_size(packed):9.0f} B   "
+          f"decode {per_call_us(lambda: msgpack.unpackb(packed[0]), count):7.1f} us   "
+          f"encode {per_call_us(encode_msgpack, count):7.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=50, help="сообщений в кадре истории")
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+
+    messages = [make_message(i) for i in range(args.history * 20)]
+
+    # История: словарь кодируется сразу в нужный формат, без промежуточного JSON
+    histories = [
+        {"type": "message_history", "messages": messages[i:i + args.history], "has_more": True, "incremental": False}
+        for i in range(0, len(messages), args.history)
+    ]
+    history = histories[0]
+    print(f"json encode of history: {per_call_us(lambda: dumps(history), args.count):7.1f} us")
+    report(f"message_history ({args.history} messages)", [dumps(frame) for frame in histories],
+           lambda: pack(history), args.count)
+
+    # Рассылка: готовый JSON-кадр перекодируется один раз на комнату
+    frames = [wrap("new_message", "message", dumps(message)) for message in messages]
+    report("new_message", frames, lambda: pack(frames[0]), args.count * 10)
+
+
+if __name__ == "__main__":
+    main()
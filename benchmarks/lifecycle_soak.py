@@ -0,0 +1,140 @@
+"""
+Soak-тест жизненного цикла соединений чата: память не должна расти.
+
+Гоняет ConnectionService и LifecycleManager в одном процессе на
+заглушках сокетов. Циклы чередуются:
+    normal  - оба участника подключились, обменялись сообщением, вышли;
+    orphan  - сокет умер без disconnect (упал обработчик), сессию убирает sweep;
+    ended   - session_ended, сокеты закрывает сервер;
+    idle    - комната простаивает дольше ROOM_IDLE_TIMEOUT и закрывается sweep.
+
+Каждые --checkpoint циклов печатает RSS и число объектов Python.
+Код выхода 1, если после разогрева RSS вырос больше --max-growth-mb
+или после теста остались сессии и комнаты.
+
+Запуск: python -m benchmarks.lifecycle_soak [--cycles 1000000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+
+from starlette.websockets import WebSocketState
+
+from src.services.connection import ConnectionService
+from src.services.frames import dumps
+from src.services.lifecycle import LifecycleManager
+
+KINDS = ('normal', 'orphan', 'ended', 'idle')
+
+
+class FakeWebSocket:
+    """ Заглушка сокета с состояниями starlette """
+
+    __slots__ = ('sent', 'application_state', 'client_state')
+
+    def __init__(self):
+        self.sent = 0
+        self.application_state = WebSocketState.CONNECTING
+        self.client_state = WebSocketState.CONNECTING
+
+    async def accept(self, subprotocol=None):
+        self.application_state = WebSocketState.CONNECTED
+        self.client_state = WebSocketState.CONNECTED
+
+    async def send_text(self, data: str):
+        self.sent += 1
+
+    async def close(self, code: int = 1000):
+        self.application_state = WebSocketState.DISCONNECTED
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+def rss_bytes() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+async def run_cycle(service: ConnectionService, lifecycle: LifecycleManager, kind: str, i: int):
+    room_id = f'room-{i}'
+    sockets = (FakeWebSocket(), FakeWebSocket())
+    for websocket, username in zip(sockets, ('alice', 'bob')):
+        await service.connect(websocket, room_id, {"nickname": username, "token": f'token-{i}'})
+
+    if kind == 'normal':
+        await service.broadcast_to_room(dumps({"type": "new_message", "message": {"text": "hi"}}), room_id)
+        await asyncio.sleep(0)
+        for websocket in sockets:
+            await service.disconnect(websocket)
+
+    elif kind == 'orphan':
+        # Клиент пропал, а обработчик сокета не дошел до disconnect
+        for websocket in sockets:
+            websocket.client_state = WebSocketState.DISCONNECTED
+
+    elif kind == 'ended':
+        await lifecycle.end_session(room_id, "Partner left")
+        await asyncio.gather(*lifecycle._closing)
+
+    elif kind == 'idle':
+        service.rooms[room_id].last_active -= lifecycle.room_idle_timeout + 1
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=1_000_000)
+    parser.add_argument("--checkpoint", type=int, default=100_000)
+    parser.add_argument("--sweep-every", type=int, default=1000, help="циклов между проходами sweep")
+    parser.add_argument("--max-growth-mb", type=float, default=16.0)
+    args = parser.parse_args()
+
+    service = ConnectionService()
+    await service.start()
+    lifecycle = LifecycleManager(service, sweep_interval=3600, room_idle_timeout=60, close_timeout=1)
+    service.add_remote_listener(lifecycle.observe_frame)
+
+    baseline = None
+    samples = []
+    start = time.perf_counter()
+    for i in range(1, args.cycles + 1):
+        await run_cycle(service, lifecycle, KINDS[i % len(KINDS)], i)
+
+        if i % args.sweep_every == 0:
+            await lifecycle.sweep()
+
+        if i % args.checkpoint == 0 or i == args.cycles:
+            await lifecycle.sweep()
+            gc.collect()
+            rss = rss_bytes()
+            objects = len(gc.get_objects())
+            samples.append((i, rss, objects))
+            # Первая точка - разогрев: аллокатор и кэши уже выросли до рабочего размера
+            if baseline is None:
+                baseline = rss
+            print(
+                f"{i:>9} cycles  {time.perf_counter() - start:7.1f}s  "
+                f"rss {rss / 2 ** 20:7.1f} MB ({(rss - baseline) / 2 ** 20:+6.1f})  "
+                f"objects {objects:>8}  sessions {len(service.sessions)}  rooms {len(service.rooms)}"
+            )
+
+    await service.close()
+
+    print(f"lifecycle: {lifecycle.stats()}")
+    growth = (samples[-1][1] - baseline) / 2 ** 20
+    failures = []
+    if growth > args.max_growth_mb:
+        failures.append(f"RSS grew by {growth:.1f} MB after warm-up (limit {args.max_growth_mb} MB)")
+    if service.sessions or service.rooms:
+        failures.append(f"leaked {len(service.sessions)} sessions and {len(service.rooms)} rooms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: RSS growth {growth:+.1f} MB over {args.cycles} cycles")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,418 @@
+"""
+Нагрузочные сценарии против настоящего сервера (src/server.py) и заглушек
+gateway и worker (benchmarks.stubs) с заданной задержкой upstream.
+
+chat        - --rooms комнат по два участника обмениваются --messages
+              сообщениями через /ws/chat; задержка - от отправки до
+              получения партнером
+waiting     - --clients клиентов опрашивают очередь, как страница ожидания:
+              /queue/status, /queue/{id}/status и /check_match
+dictionary  - --clients пользователей по кругу создают, читают, меняют и
+              удаляют слова
+
+Для каждого сценария: пропускная способность, p50/p99 задержки, ошибки и RSS
+сервера (всех его процессов). Результат сохраняется в JSON; --compare
+сравнивает с сохраненным ранее прогоном.
+
+Запуск: python -m benchmarks.load [chat waiting dictionary]
+            [--rooms 200] [--clients 100] [--duration 10] [--upstream-latency 0.005]
+            [--workers 4] [--output results.json] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+from src.config import config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("chat", "waiting", "dictionary")
+
+
+class Recorder:
+    """Задержки и ошибки одного сценария"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add(self, latency: float):
+        self.latencies.append(latency)
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        ordered = sorted(self.latencies)
+
+        def pick(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1000, 3)
+
+        return {
+            "operations": len(ordered),
+            "errors": self.errors,
+            "duration_s": round(elapsed, 3),
+            "throughput_per_s": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": pick(0.50),
+                "p99": pick(0.99),
+                "max": pick(1.0),
+                "mean": round(statistics.mean(ordered) * 1000, 3) if ordered else 0.0,
+            },
+        }
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """RSS процесса и его потомков (воркеры uvicorn), только Linux"""
+    total = 0
+    for process in [pid, *_children(pid)]:
+        try:
+            with open(f"/proc/{process}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            if process == pid:
+                return None
+    return round(total / 1024, 1)
+
+
+class RssSampler:
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if not self.samples:
+            return {}
+        return {"start": self.samples[0], "peak": max(self.samples), "end": self.samples[-1]}
+
+    async def _run(self):
+        while True:
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            await asyncio.sleep(self.interval)
+
+
+async def chat_scenario(base_url: str, args) -> Recorder:
+    recorder = Recorder()
+    ws_url = base_url.replace("http", "ws", 1)
+    sent: Dict[str, float] = {}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        async def token(user_id: int, room_id: str) -> str:
+            resp = await client.get("/api/user/create_token", params={"user_id": user_id, "room_id": room_id})
+            resp.raise_for_status()
+            return resp.json()["token"]
+
+        async def participant(user_id: int, room_id: str, ready: asyncio.Barrier):
+            url = f"{ws_url}/ws/chat?room_id={room_id}&token={await token(user_id, room_id)}"
+            async with websockets.connect(url, max_queue=None) as ws:
+                expected = args.messages
+                received = 0
+
+                async def reader():
+                    nonlocal received
+                    async for raw in ws:
+                        frame = json.loads(raw)
+                        # При CHAT_BATCHING сообщения частых комнат приходят пачками
+                        if frame.get("type") == "new_message":
+                            messages = [frame["message"]]
+                        elif frame.get("type") == "new_messages":
+                            messages = frame["messages"]
+                        else:
+                            continue
+                        for message in messages:
+                            if message["sender"] == f"user{user_id}":
+                                continue
+                            start = sent.pop(message["text"], None)
+                            if start is not None:
+                                recorder.add(time.perf_counter() - start)
+                            received += 1
+                        if received >= expected:
+                            return
+
+                reading = asyncio.create_task(reader())
+                await ready.wait()
+                for index in range(args.messages):
+                    text = f"{user_id}:{index}"
+                    sent[text] = time.perf_counter()
+                    await ws.send(json.dumps({"type": "send_message", "text": text}))
+                    await asyncio.sleep(args.message_interval)
+                try:
+                    await asyncio.wait_for(reading, timeout=args.timeout)
+                except asyncio.TimeoutError:
+                    recorder.errors += expected - received
+
+        ready = asyncio.Barrier(args.rooms * 2)
+        tasks = []
+        for room in range(args.rooms):
+            room_id = f"load-room-{room}"
+            for user_id in (room * 2 + 1, room * 2 + 2):
+                tasks.append(participant(user_id, room_id, ready))
+
+        recorder.started = time.perf_counter()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        recorder.stop()
+        recorder.errors += sum(1 for result in results if isinstance(result, Exception))
+    return recorder
+
+
+async def waiting_scenario(base_url: str, args) -> Recorder:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        deadline = time.perf_counter() + args.duration
+
+        async def poller(user_id: int):
+            paths = ("/api/worker/queue/status", f"/api/worker/queue/{user_id}/status",
+                     f"/api/worker/check_match?user_id={user_id}")
+            await asyncio.sleep(random.uniform(0, args.poll_interval))
+            while time.perf_counter() < deadline:
+                for path in paths:
+                    start = time.perf_counter()
+                    try:
+                        resp = await client.get(path)
+                        if resp.status_code >= 400:
+                            recorder.errors += 1
+                            continue
+                    except httpx.HTTPError:
+                        recorder.errors += 1
+                        continue
+                    recorder.add(time.perf_counter() - start)
+                await asyncio.sleep(args.poll_interval)
+
+        recorder.started = time.perf_counter()
+        await asyncio.gather(*(poller(user_id) for user_id in range(1, args.clients + 1)))
+        recorder.stop()
+    return recorder
+
+
+async def dictionary_scenario(base_url: str, args) -> Recorder:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        deadline = time.perf_counter() + args.duration
+
+        async def call(method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                recorder.errors += 1
+                return None
+            if resp.status_code >= 400:
+                recorder.errors += 1
+                return None
+            recorder.add(time.perf_counter() - start)
+            return resp
+
+        async def user(user_id: int):
+            cycle = 0
+            while time.perf_counter() < deadline:
+                word = {"user_id": user_id, "word": f"word{cycle}", "translations": {"ru": f"слово{cycle}"}}
+                await call("POST", "/api/words", json=word)
+                resp = await call("GET", "/api/words", params={"user_id": user_id})
+                await call("PUT", "/api/words", json={**word, "context": "updated"})
+
+                words = resp.json() if resp is not None else []
+                if words:
+                    await call("DELETE", "/api/words", params={"user_id": user_id, "word_id": words[0]["word_id"]})
+                cycle += 1
+
+        recorder.started = time.perf_counter()
+        await asyncio.gather(*(user(user_id) for user_id in range(1, args.clients + 1)))
+        recorder.stop()
+    return recorder
+
+
+RUNNERS = {
+    "chat": chat_scenario,
+    "waiting": waiting_scenario,
+    "dictionary": dictionary_scenario,
+}
+
+
+def wait_for_port(host: str, port: int, process: subprocess.Popen, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{host}:{port} did not start in {timeout}s")
+
+
+def start_processes(args) -> List[subprocess.Popen]:
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    if args.workers:
+        env["SERVER_WORKERS"] = str(args.workers)
+    # Нагрузка чата намеренно выше лимитов сообщений; измеряем сервер, а не rate limiter
+    env.setdefault("CHAT_RATE_LIMIT", "0")
+    env.setdefault("CHAT_ROOM_RATE_LIMIT", "0")
+
+    stubs = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stubs",
+         "--worker-port", str(config.worker.port), "--gateway-port", str(config.gateway.port),
+         "--latency", str(args.upstream_latency), "--jitter", str(args.upstream_jitter)],
+        cwd=ROOT, env=env,
+    )
+    processes = [stubs]
+    try:
+        wait_for_port(config.worker.host, config.worker.port, stubs)
+        wait_for_port(config.gateway.host, config.gateway.port, stubs)
+
+        processes.append(subprocess.Popen([sys.executable, "src/server.py"], cwd=ROOT, env=env))
+        wait_for_port(config.this_host, config.this_port, processes[-1])
+    except Exception:
+        stop_processes(processes)
+        raise
+    return processes
+
+
+def stop_processes(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict):
+    """Изменение пропускной способности и p99 относительно прошлого прогона"""
+    print(f"-- compared with {previous['meta'].get('revision')} ({previous['meta'].get('timestamp')})")
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+
+        def delta(now: float, then: float) -> str:
+            return f"{(now - then) / then:+.1%}" if then else "n/a"
+
+        print(f"{name:<11} throughput {delta(result['throughput_per_s'], before['throughput_per_s']):>8}   "
+              f"p99 {delta(result['latency_ms']['p99'], before['latency_ms']['p99']):>8}   "
+              f"peak rss {delta(result['rss_mb'].get('peak', 0), before['rss_mb'].get('peak', 0)):>8}")
+
+
+async def run_scenarios(args, server_pid: int) -> dict:
+    base_url = f"http://{config.this_host}:{config.this_port}"
+    results = {}
+    for name in args.scenarios:
+        sampler = RssSampler(server_pid)
+        sampler.start()
+        recorder = await RUNNERS[name](base_url, args)
+        summary = recorder.summary()
+        summary["rss_mb"] = await sampler.stop()
+        results[name] = summary
+
+        latency = summary["latency_ms"]
+        print(f"{name:<11} {summary['throughput_per_s']:>9,.0f} ops/s   p50 {latency['p50']:7.2f} ms   "
+              f"p99 {latency['p99']:7.2f} ms   errors {summary['errors']}   "
+              f"rss peak {summary['rss_mb'].get('peak')} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenarios", nargs="*", help=f"из {', '.join(SCENARIOS)}, по умолчанию все")
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--message-interval", type=float, default=0.05)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--upstream-latency", type=float, default=0.005)
+    parser.add_argument("--upstream-jitter", type=float, default=0.005)
+    parser.add_argument("--workers", type=int, default=0, help="SERVER_WORKERS для сервера")
+    parser.add_argument("--output", help="по умолчанию benchmarks/results/load-<ревизия>.json")
+    parser.add_argument("--compare", help="JSON прошлого прогона")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    processes = start_processes(args)
+    try:
+        scenarios = asyncio.run(run_scenarios(args, processes[-1].pid))
+    finally:
+        stop_processes(processes)
+
+    revision = git_revision()
+    report = {
+        "meta": {
+            "revision": revision,
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"load-{revision or datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Пропускная способность логирования и задержки цикла событий.
+
+Цикл событий пишет --records записей пачками по --burst, параллельно
+тикер каждую миллисекунду замеряет, насколько позже он просыпается.
+Вывод идет в приемник, имитирующий stdout контейнера; --sink-delay -
+задержка записи одной строки (заполненный pipe, медленный драйвер логов).
+
+color: CustomLogger, форматирование и запись в потоке цикла событий.
+json:  QueueLogger, в цикле событий только постановка в очередь.
+
+Отдельно: стоимость отключенного DEBUG с f-строкой и с аргументами.
+
+Запуск: python -m benchmarks.logging_pipeline [--records 50000] [--sink-delay 0.00002]
+"""
+import argparse
+import asyncio
+import io
+import logging
+import statistics
+import sys
+import time
+import timeit
+
+from src.logconf import CustomLogger, QueueLogger
+
+
+class Sink(io.TextIOBase):
+    """Приемник вывода с задержкой на каждую запись"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        self.lines += text.count("\n")
+        self.writes += 1
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.001
+        await asyncio.sleep(0.001)
+        lags.append(max(loop.time() - expected, 0.0))
+
+
+async def produce(logger: logging.Logger, records: int, burst: int) -> float:
+    room = {"room_id": "room-1", "members": ["alice", "bob"]}
+    start = time.perf_counter()
+    for index in range(0, records, burst):
+        for offset in range(burst):
+            logger.info("Message %s delivered to %s", index + offset, room)
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def measure(logger: logging.Logger, args) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+    elapsed = await produce(logger, args.records, args.burst)
+    stop.set()
+    await tick
+    return {
+        "elapsed": elapsed,
+        "lag_p99": percentile(lags, 0.99),
+        "lag_max": max(lags),
+        "lag_mean": statistics.mean(lags),
+    }
+
+
+def report(name: str, result: dict, records: int, extra: str = ""):
+    print(f"{name:<6} {records / result['elapsed']:>10,.0f} rec/s on loop   "
+          f"loop lag mean {result['lag_mean'] * 1000:6.2f} ms  p99 {result['lag_p99'] * 1000:6.2f} ms  "
+          f"max {result['lag_max'] * 1000:7.2f} ms {extra}")
+
+
+def run(args):
+    real_stdout = sys.stdout
+
+    sink = Sink(args.sink_delay)
+    sys.stdout = sink
+    try:
+        color = CustomLogger().setup_logger("bench.color", level="INFO")
+    finally:
+        sys.stdout = real_stdout
+    report("color", asyncio.run(measure(color, args)), args.records, f"{sink.lines} lines in {sink.writes} writes")
+
+    sink = Sink(args.sink_delay)
+    sys.stdout = sink
+    try:
+        queued = QueueLogger(queue_size=args.queue_size)
+    finally:
+        sys.stdout = real_stdout
+    logger = queued.setup_logger("bench.json", level="INFO")
+    result = asyncio.run(measure(logger, args))
+    start = time.perf_counter()
+    queued.stop()
+    drain = time.perf_counter() - start
+    report("json", result, args.records,
+           f"{sink.lines} lines in {sink.writes} writes, dropped {queued.handler.dropped}, drained {drain:.2f}s later")
+
+    # Отключенный уровень: f-строка собирается всегда, аргументы - только при выводе
+    payload = {str(user_id): [{"word": f"w{index}"} for index in range(20)] for user_id in range(50)}
+    gated = logging.getLogger("bench.gated")
+    gated.setLevel(logging.INFO)
+    number = 20000
+    eager = timeit.timeit(lambda: gated.debug(f"all words: {payload}"), number=number) / number
+    lazy = timeit.timeit(lambda: gated.debug("all words: %s", payload), number=number) / number
+    print(f"disabled debug with 1000-word payload: f-string {eager * 1e6:.1f} us, args {lazy * 1e6:.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--sink-delay", type=float, default=0.00002)
+    parser.add_argument("--queue-size", type=int, default=100000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
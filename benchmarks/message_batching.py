@@ -0,0 +1,136 @@
+"""
+Микро-пачки new_message: кадры и CPU на частых комнатах.
+
+Комнаты 1:1 в одном процессе, оба участника пишут с частотой --rate
+сообщений в секунду. Сравнивается рассылка по кадру на сообщение и
+CHAT_BATCHING: число отправленных кадров, процессорное время и
+задержка от рассылки до отправки в сокет.
+
+Заглушка сокета делает то же, что протокол websockets на каждый кадр:
+сжатие permessage-deflate (SERVER_WS_DEFLATE_*), заголовок кадра и write.
+
+Запуск: python -m benchmarks.message_batching [--rooms 200] [--rate 50] [--duration 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+from src.config import config
+from src.services.connection import ConnectionService
+from src.services.frames import dumps, wrap
+
+
+DEVNULL = os.open(os.devnull, os.O_WRONLY)
+
+
+class FakeWebSocket:
+    """ Кодирует и пишет кадры; сокеты первой комнаты запоминают время отправки """
+
+    __slots__ = ('frames', 'log', 'extensions')
+
+    def __init__(self, log: bool):
+        self.frames = 0
+        self.log = [] if log else None
+        settings = config.server
+        self.extensions = [PerMessageDeflate(
+            remote_no_context_takeover=False,
+            local_no_context_takeover=False,
+            remote_max_window_bits=15,
+            local_max_window_bits=settings.ws_deflate_window_bits,
+            compress_settings={"memLevel": settings.ws_deflate_mem_level},
+        )] if settings.ws_deflate else []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        self.frames += 1
+        os.write(DEVNULL, Frame(Opcode.TEXT, data.encode()).serialize(mask=False, extensions=self.extensions))
+        if self.log is not None:
+            self.log.append((time.perf_counter(), data))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def writer(service: ConnectionService, room_id: str, sender: str, rate: float, duration: float,
+                 sent: dict):
+    interval = 1 / rate
+    deadline = time.perf_counter() + duration
+    index = 0
+    while time.perf_counter() < deadline:
+        text = f'{sender}:{index}'
+        sent[text] = time.perf_counter()
+        payload = dumps({"sender": sender, "text": text, "created_at": "", "room_id": room_id})
+        await service.broadcast_to_room(wrap("new_message", "message", payload), room_id)
+        index += 1
+        await asyncio.sleep(interval)
+
+
+async def run(batching: bool, args) -> dict:
+    service = ConnectionService(batching=batching)
+    await service.start()
+
+    sockets = []
+    for room in range(args.rooms):
+        for username in ('alice', 'bob'):
+            websocket = FakeWebSocket(log=room == 0)
+            await service.connect(websocket, f'room-{room}', {"nickname": username})
+            sockets.append(websocket)
+    await asyncio.sleep(0.1)
+    connect_frames = sum(websocket.frames for websocket in sockets)
+
+    sent = {}
+    start_cpu = time.process_time()
+    await asyncio.gather(*(
+        writer(service, f'room-{room}', username, args.rate, args.duration, sent if room == 0 else {})
+        for room in range(args.rooms) for username in ('alice', 'bob')
+    ))
+    await asyncio.sleep(0.1)
+    cpu = time.process_time() - start_cpu
+    await service.close()
+
+    delays = []
+    for websocket in sockets[:2]:
+        for at, data in websocket.log:
+            frame = json.loads(data)
+            messages = frame.get("messages") or ([frame["message"]] if "message" in frame else [])
+            delays.extend((at - sent[message["text"]]) * 1000 for message in messages if message["text"] in sent)
+
+    messages = args.rooms * 2 * args.rate * args.duration
+    frames = sum(websocket.frames for websocket in sockets) - connect_frames
+    return {
+        "frames": frames,
+        "messages": messages,
+        "cpu": cpu,
+        "p50": statistics.median(delays) if delays else 0.0,
+        "p99": statistics.quantiles(delays, n=100)[98] if len(delays) > 1 else 0.0,
+        "batches": service.batcher.stats() if service.batcher is not None else {},
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50, help="сообщений в секунду от каждого участника")
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    settings = config.chat_batching
+    print(f"window {settings.window_ms} ms, threshold {settings.threshold}/s, max {settings.max_size}")
+    for batching in (False, True):
+        result = await run(batching, args)
+        print(f"batching {'on ' if batching else 'off'}: "
+              f"{result['frames']:>7} frames for ~{result['messages']:.0f} messages x2 recipients, "
+              f"cpu {result['cpu']:5.2f}s, delay p50 {result['p50']:5.2f} ms p99 {result['p99']:5.2f} ms "
+              f"{result['batches']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
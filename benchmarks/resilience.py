@@ -0,0 +1,89 @@
+"""
+Поведение ResilientClient против заглушки worker'а с внесенными сбоями.
+
+1. Хвост задержек: часть запросов /check_match "зависает" на --hang-time,
+   сравниваются p50/p99 без hedging и с ним.
+2. Отказ: worker отвечает 503 на все запросы - цепь размыкается и запросы
+   отклоняются сразу; после восстановления цепь закрывается через half-open.
+
+Запуск: python -m benchmarks.resilience [--requests 300] [--hang-rate 0.05]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.stubs import StubState, create_worker_app, serve_in_thread
+from src.config import config
+from src.services.resilience import ResilientClient
+from src.services.upstream import UpstreamClients
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def measure(client: ResilientClient, requests: int) -> list:
+    latencies = []
+    for user_id in range(requests):
+        start = time.perf_counter()
+        await client.get(f'/check_match?user_id={user_id}')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: list):
+    print(f"{name:<18} p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms   max {max(latencies) * 1000:7.1f} ms")
+
+
+async def run(args):
+    state = StubState(latency=0.005, jitter=0.005, hang_rate=args.hang_rate, hang_time=args.hang_time)
+    serve_in_thread(create_worker_app(state), config.worker.host, config.worker.port)
+    base_url = config.worker.url + config.worker.prefix
+
+    print(f"-- tail latency: {args.hang_rate:.0%} of requests hang for {args.hang_time}s")
+    plain = ResilientClient('worker', UpstreamClients._build_client(base_url))
+    plain.hedge_delays = {}
+    report("no hedging", await measure(plain, args.requests))
+
+    hedged = ResilientClient('worker', UpstreamClients._build_client(base_url))
+    hedged.hedge_delays = {'/check_match': args.hedge_delay}
+    report(f"hedge after {args.hedge_delay * 1000:.0f}ms", await measure(hedged, args.requests))
+    print(f"hedged requests: {hedged.hedged}")
+
+    print("-- outage: worker returns 503")
+    state.hang_rate = 0.0
+    state.failure_rate = 1.0
+    client = ResilientClient('worker', UpstreamClients._build_client(base_url))
+    client.retries = 0
+    client.breaker.reset_timeout = args.reset_timeout
+
+    latencies = await measure(client, args.requests)
+    fast = [latency for latency in latencies[client.breaker.failure_threshold:]]
+    print(f"breaker: {client.breaker.stats()}")
+    print(f"fast-fail p50 {statistics.median(fast) * 1e6:.0f} us "
+          f"(first {client.breaker.failure_threshold} requests reached the worker)")
+
+    state.failure_rate = 0.0
+    await asyncio.sleep(args.reset_timeout)
+    resp = await client.get('/check_match?user_id=1')
+    print(f"after recovery: status {resp.status_code}, breaker {client.breaker.state}")
+
+    for item in (plain, hedged, client):
+        await item.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--hang-rate", type=float, default=0.05)
+    parser.add_argument("--hang-time", type=float, default=1.0)
+    parser.add_argument("--hedge-delay", type=float, default=0.05)
+    parser.add_argument("--reset-timeout", type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
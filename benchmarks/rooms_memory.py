@@ -0,0 +1,147 @@
+"""
+Память и стоимость операций ConnectionService на большом числе комнат 1:1.
+
+Сравнивает прежнюю раскладку (dict комнат + dict сессий на сокет)
+со структурами Room/Member, и отдельно - полный ConnectionService
+с очередями исходящих сообщений.
+
+Запуск: python -m benchmarks.rooms_memory [--rooms 100000]
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from src.services.connection import ConnectionService
+from src.services.rooms import Member, Room
+
+
+class FakeWebSocket:
+    """ Минимальная заглушка сокета """
+
+    __slots__ = ('sent',)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        self.sent += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def measure(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return result, size
+
+
+def build_legacy(rooms: int, sockets: list):
+    active_connections, sessions = {}, {}
+    for i in range(rooms):
+        room_id = f'room-{i}'
+        active_connections[room_id] = {}
+        for j, username in enumerate(('alice', 'bob')):
+            ws = sockets[i * 2 + j]
+            active_connections[room_id][username] = ws
+            sessions[ws] = {"room_id": room_id, "username": username, "token": None}
+    return active_connections, sessions
+
+
+def build_rooms(rooms: int, sockets: list):
+    room_map, sessions = {}, {}
+    for i in range(rooms):
+        room = room_map[f'room-{i}'] = Room(f'room-{i}')
+        for j, username in enumerate(('alice', 'bob')):
+            ws = sockets[i * 2 + j]
+            member = Member(username, ws, room)
+            room.add(member)
+            sessions[ws] = member
+    return room_map, sessions
+
+
+async def build_service(rooms: int, sockets: list) -> ConnectionService:
+    service = ConnectionService()
+    for i in range(rooms):
+        for j, username in enumerate(('alice', 'bob')):
+            await service.connect(sockets[i * 2 + j], f'room-{i}', {"nickname": username})
+    return service
+
+
+def legacy_partner(active_connections: dict, room_id: str, current: str):
+    users_in_room = list(active_connections[room_id].keys())
+    if not users_in_room:
+        return None
+    for username, ws in active_connections[room_id].items():
+        if username != current:
+            return ws
+    return None
+
+
+def timeit(func, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) / count * 1e9
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=100_000)
+    args = parser.parse_args()
+    rooms = args.rooms
+
+    sockets = [FakeWebSocket() for _ in range(rooms * 2)]
+
+    (legacy, _), legacy_size = measure(lambda: build_legacy(rooms, sockets))
+    (room_map, _), rooms_size = measure(lambda: build_rooms(rooms, sockets))
+    print(f"legacy dicts:     {legacy_size / rooms:8.0f} bytes per room")
+    print(f"Room/Member:      {rooms_size / rooms:8.0f} bytes per room")
+
+    room_id = f'room-{rooms // 2}'
+    room = room_map[room_id]
+    print(f"partner lookup:   legacy {timeit(lambda: legacy_partner(legacy, room_id, 'alice'), 200_000):6.0f} ns, "
+          f"Room {timeit(lambda: room_map[room_id].partner_of('alice'), 200_000):6.0f} ns")
+    print(f"online users:     legacy {timeit(lambda: list(legacy[room_id].keys()), 200_000):6.0f} ns, "
+          f"Room {timeit(room.usernames, 200_000):6.0f} ns")
+    del legacy, room_map, room
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    service = await build_service(rooms, sockets)
+    # Даем писателям отправить приветственные кадры и завершиться
+    await asyncio.sleep(0.5)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    service_size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print(f"ConnectionService (idle rooms): {service_size / rooms:8.0f} bytes per room")
+
+    frame = '{"type":"new_message","message":{}}'
+    count = 100_000
+    start = time.perf_counter()
+    for i in range(count):
+        await service.broadcast_to_room(frame, f'room-{i % rooms}')
+        # Отдаем управление писателям, как это происходит между входящими сообщениями
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    print(f"broadcast_to_room: {(time.perf_counter() - start) / count * 1e9:6.0f} ns per call")
+
+    await service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
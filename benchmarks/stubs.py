@@ -0,0 +1,266 @@
+"""
+Локальные заглушки внешних сервисов для проверки и нагрузочных тестов.
+
+Worker: сообщения в памяти, bulk-эндпоинт записи, очередь и матчи.
+Gateway: словари пользователей, поиск, статистика и профили.
+
+Обе заглушки умеют вносить сбои во все запросы: задержку с разбросом,
+долю ответов 503 и долю "зависших" запросов. Настройки меняются на лету:
+    POST /_faults {"latency": 0.5, "failure_rate": 1.0}
+    GET  /_stats
+
+Запуск: python -m benchmarks.stubs [--worker-port 9001] [--gateway-port 9002]
+                                   [--latency 0.01] [--failure-rate 0.1]
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Query, Request, Response
+
+
+class StubState:
+    """ Настройки сбоев и счетчики заглушки, доступны из тестов """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            failure_rate: float = 0.0,
+            hang_rate: float = 0.0,
+            hang_time: float = 30.0,
+            bulk: bool = True,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self.bulk = bulk
+        self.calls: Dict[str, int] = {}
+        self.injected_failures = 0
+        self.injected_hangs = 0
+
+        # room_id -> list of messages
+        self.messages: Dict[str, List[dict]] = {}
+        # user_id -> list of words
+        self.words: Dict[int, List[dict]] = {}
+        # user_id -> найденный матч
+        self.matches: Dict[int, dict] = {}
+
+    def hit(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def should_fail(self) -> bool:
+        return self.failure_rate > 0 and random.random() < self.failure_rate
+
+    async def inject(self) -> Optional[Response]:
+        """Задержка и сбои перед обработкой запроса. Ответ - если запрос надо провалить"""
+        if self.hang_rate > 0 and random.random() < self.hang_rate:
+            self.injected_hangs += 1
+            await asyncio.sleep(self.hang_time)
+
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.should_fail():
+            self.injected_failures += 1
+            return Response(status_code=503)
+        return None
+
+    def configure(self, settings: dict):
+        for name in ('latency', 'jitter', 'failure_rate', 'hang_rate', 'hang_time', 'bulk'):
+            if name in settings:
+                setattr(self, name, settings[name])
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "injected_failures": self.injected_failures,
+            "injected_hangs": self.injected_hangs,
+        }
+
+
+def _with_faults(app: FastAPI, state: StubState) -> FastAPI:
+    @app.middleware("http")
+    async def faults(request: Request, call_next):
+        if not request.url.path.startswith("/_"):
+            failed = await state.inject()
+            if failed is not None:
+                return failed
+        return await call_next(request)
+
+    @app.post("/_faults")
+    async def set_faults(request: Request):
+        state.configure(json.loads(await request.body()))
+        return {"ok": True}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return state.stats()
+
+    return app
+
+
+def create_worker_app(state: StubState) -> FastAPI:
+    app = FastAPI()
+    prefix = "/api/v0"
+
+    @app.get(prefix + "/messages")
+    async def get_messages(room_id: str = Query(...)):
+        state.hit("get_messages")
+        return state.messages.get(room_id, [])
+
+    @app.post(prefix + "/messages")
+    async def save_message(request: Request, room_id: str = Query(...)):
+        state.hit("save_message")
+        state.messages.setdefault(room_id, []).append(json.loads(await request.body()))
+        return 200
+
+    @app.post(prefix + "/messages/bulk")
+    async def save_messages_bulk(request: Request):
+        state.hit("save_messages_bulk")
+        if not state.bulk:
+            return Response(status_code=404)
+
+        body = json.loads(await request.body())
+        for message in body["messages"]:
+            state.messages.setdefault(message["room_id"], []).append(message)
+        return {"saved": len(body["messages"])}
+
+    @app.get(prefix + "/queue/status")
+    async def queue_status():
+        state.hit("queue_status")
+        return {"queue_size": len(state.matches)}
+
+    @app.get(prefix + "/queue/{user_id}/status")
+    async def user_queue_status(user_id: int):
+        state.hit("user_queue_status")
+        return {"in_queue": user_id not in state.matches}
+
+    @app.get(prefix + "/check_match")
+    async def check_match(user_id: int = Query(...)):
+        state.hit("check_match")
+        return state.matches.get(user_id, {})
+
+    @app.post(prefix + "/match/toggle")
+    async def toggle_match():
+        state.hit("toggle_match")
+        return {"status": "joined"}
+
+    @app.get(prefix + "/cancel_match")
+    async def cancel_match(user_id: int = Query(...)):
+        state.hit("cancel_match")
+        state.matches.pop(user_id, None)
+        return {"status": "success"}
+
+    return _with_faults(app, state)
+
+
+def create_gateway_app(state: StubState) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/words")
+    async def get_words(user_id: int = Query(...)):
+        state.hit("get_words")
+        return {str(user_id): state.words.get(user_id, [])}
+
+    @app.post("/api/words")
+    async def add_word(request: Request, user_id: int = Query(...)):
+        state.hit("add_word")
+        word = json.loads(await request.body())
+        words = state.words.setdefault(user_id, [])
+        word["word_id"] = len(words) + 1
+        words.append(word)
+        return 200
+
+    @app.put("/api/words")
+    async def edit_word(user_id: int = Query(...)):
+        state.hit("edit_word")
+        return 200
+
+    @app.delete("/api/words")
+    async def delete_word(user_id: int = Query(...), word_id: int = Query(...)):
+        state.hit("delete_word")
+        words = state.words.get(user_id, [])
+        state.words[user_id] = [word for word in words if word.get("word_id") != word_id]
+        return 200
+
+    @app.get("/api/words/search")
+    async def search_word(word: str = Query(...), user_id: Optional[int] = Query(None)):
+        state.hit("search_word")
+        found = {
+            str(owner): [item for item in words if item.get("word") == word]
+            for owner, words in state.words.items()
+            if user_id is None or owner == user_id
+        }
+        return {owner: items for owner, items in found.items() if items}
+
+    @app.get("/api/words/stats")
+    async def words_stats(user_id: int = Query(...)):
+        state.hit("words_stats")
+        return {"total": len(state.words.get(user_id, []))}
+
+    @app.get("/api/users")
+    async def get_user(user_id: int = Query(...), target_field: Optional[str] = Query(None)):
+        state.hit("get_user")
+        return {
+            "nickname": f"user{user_id}", "username": f"user{user_id}", "gender": "male",
+            "language": "en", "fluency": 1, "topics": [], "dating": False, "lang_code": "en",
+        }
+
+    @app.get("/api/check_profile")
+    async def check_profile(user_id: int = Query(...)):
+        state.hit("check_profile")
+        return True
+
+    @app.put("/api/update_profile")
+    async def update_profile():
+        state.hit("update_profile")
+        return 200
+
+    return _with_faults(app, state)
+
+
+def serve_in_thread(app: FastAPI, host: str, port: int) -> uvicorn.Server:
+    """Запускает заглушку в фоновом потоке, для бенчмарков в одном процессе"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--worker-port", type=int, default=9001)
+    parser.add_argument("--gateway-port", type=int, default=9002)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--no-bulk", action="store_true")
+    args = parser.parse_args()
+
+    def make_state() -> StubState:
+        return StubState(
+            latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+            hang_rate=args.hang_rate, bulk=not args.no_bulk,
+        )
+
+    serve_in_thread(create_worker_app(make_state()), args.host, args.worker_port)
+    gateway = uvicorn.Server(uvicorn.Config(
+        create_gateway_app(make_state()), host=args.host, port=args.gateway_port, log_level="warning"
+    ))
+    gateway.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Пропускная способность проверки токена при подключении к чату.
+
+Шторм переподключений: --users пользователей переподключаются --reconnects раз
+(например, после рестарта балансировщика), каждый со своим токеном.
+
+До: convert_token() и validate_access() с повторным декодированием и print.
+После: token_verifier.verify() - одно декодирование на токен, затем кэш.
+
+Запуск: python -m benchmarks.token_handshake [--users 2000] [--reconnects 20]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+
+import jwt
+
+from src.config import config
+from src.validators.tokens import TokenVerifier, convert_token, create_token
+
+
+async def legacy_validate_access(token: str, room_id: str) -> bool:
+    # Прежняя реализация validate_access
+    user_data = convert_token(token)
+    print(f"user data {user_data}")
+    print(f"room_id from token: {user_data.get('room_id')}, room_id from query: {room_id}")
+    if user_data.get("room_id") == room_id:
+        print("Аутентификация прошла успешно")
+        return True
+    print("Некоректный token!")
+    return False
+
+
+async def legacy_handshake(token: str, room_id: str):
+    userdata = convert_token(token)
+    assert userdata["nickname"]
+    assert await legacy_validate_access(token, room_id)
+
+
+async def make_storm(users: int, reconnects: int):
+    tokens = [
+        (await create_token(i, f"user{i}", f"room-{i // 2}"), f"room-{i // 2}")
+        for i in range(users)
+    ]
+    storm = tokens * reconnects
+    random.shuffle(storm)
+    return storm
+
+
+async def run(users: int, reconnects: int):
+    storm = await make_storm(users, reconnects)
+
+    # Вывод print уходит в буфер, чтобы не мерить скорость терминала
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for token, room_id in storm:
+            await legacy_handshake(token, room_id)
+        legacy = time.perf_counter() - start
+
+    verifier = TokenVerifier(config.tokens.cache_size)
+    start = time.perf_counter()
+    for token, room_id in storm:
+        verifier.verify(token, room_id)
+    cached = time.perf_counter() - start
+
+    print(f"handshakes: {len(storm)} ({users} users x {reconnects} reconnects), jwt {jwt.__version__}")
+    print(f"legacy (decode x2 + print): {len(storm) / legacy:12.0f} handshakes/s")
+    print(f"cached verification:        {len(storm) / cached:12.0f} handshakes/s")
+    print(f"verifier stats: {verifier.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--reconnects", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.reconnects))
+
+
+if __name__ == "__main__":
+    main()
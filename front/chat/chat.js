@@ -22,13 +22,46 @@ let partnerNickname = null;
 let partnerDiscovered = false;
 let sessionEnded = false; // Флаг завершения сессии
 
+// Состояние истории сообщений для переподключений и подгрузки
+let lastMessageAt = null;    // created_at последнего полученного сообщения
+let lastMessageKeys = new Set();  // сообщения с этим created_at: since включает границу
+let oldestMessageAt = null;  // created_at самого старого показанного сообщения
+let hasMoreHistory = false;
+let loadingOlder = false;
+// Последнее отправленное сообщение: возвращается в поле ввода, если сервер его отклонил
+let lastSentText = '';
+let hasConnectedOnce = false;
+let reconnectAttempts = 0;
+
+// 1001 - сервер уходит, 1006 - обрыв, 1012 - перезапуск, 1013 - перегрузка
+const RECONNECT_CLOSE_CODES = [1001, 1006, 1012, 1013];
+const CLOSE_REASONS = {
+    1008: 'Your chat session has expired. Please return to the waiting room.',
+    1009: 'The message was too large and the connection was closed.',
+    1011: 'Could not join the chat room. Please return to the waiting room.',
+};
+
 // Подключаемся к WebSocket серверу
 function connectWebSocket() {
-    const wsUrl = `${API_WS_URL}/ws/chat?room_id=${roomId}&token=${token}`;
-    websocket = new WebSocket(wsUrl);
+    let wsUrl = `${API_WS_URL}/ws/chat?room_id=${roomId}&token=${token}`;
+    // При переподключении запрашиваем только пропущенные сообщения
+    if (lastMessageAt) {
+        wsUrl += `&since=${encodeURIComponent(lastMessageAt)}`;
+    }
+    // Бинарные кадры MessagePack, если декодер загружен; иначе сервер выберет chat.json
+    const protocols = window.ChatMsgpack && window.DataView.prototype.getBigUint64
+        ? ['chat.msgpack', 'chat.json']
+        : ['chat.json'];
+    websocket = new WebSocket(wsUrl, protocols);
+    websocket.binaryType = 'arraybuffer';
 
     websocket.onopen = function() {
         console.log('WebSocket connection established');
+        reconnectAttempts = 0;
+
+        if (hasConnectedOnce) return;
+        hasConnectedOnce = true;
+
         showWaitingInterface();
         
         // Таймер блокировки чата через 15 минут
@@ -39,15 +72,30 @@ function connectWebSocket() {
 
     websocket.onmessage = function(event) {
         try {
-            const data = JSON.parse(event.data);
+            const data = event.data instanceof ArrayBuffer
+                ? ChatMsgpack.decode(new Uint8Array(event.data))
+                : JSON.parse(event.data);
             handleWebSocketMessage(data);
         } catch (error) {
             console.error('Error parsing WebSocket message:', error);
         }
     };
 
-    websocket.onclose = function() {
-        console.log('WebSocket connection closed');
+    websocket.onclose = function(event) {
+        console.log('WebSocket connection closed:', event.code);
+        if (sessionEnded) return;
+
+        // Переподключаемся только после обрыва или перезапуска сервера
+        if (RECONNECT_CLOSE_CODES.includes(event.code)) {
+            const delay = Math.min(1000 * 2 ** reconnectAttempts, 10000);
+            reconnectAttempts++;
+            setTimeout(connectWebSocket, delay);
+            return;
+        }
+
+        // Сервер закрыл соединение намеренно: с тем же токеном переподключение не поможет
+        showConnectionError(CLOSE_REASONS[event.code] || 'Connection to the chat was closed.');
+        handleSessionEnded(`closed with code ${event.code}`);
     };
 
     websocket.onerror = function(error) {
@@ -189,6 +237,30 @@ function handleWebSocketMessage(data) {
             break;
             
         case 'message_history':
+            // Более старые сообщения добавляются в начало чата
+            if (data.older) {
+                prependOlderMessages(data.messages, data.has_more);
+                break;
+            }
+
+            // Пропущенных сообщений больше страницы: показываем последнюю страницу
+            // заново, более старые подгружаются как при первом подключении
+            if (data.incremental && data.has_more) {
+                document.getElementById('messagesContainer')
+                    .querySelectorAll('.message').forEach(element => element.remove());
+                lastMessageAt = null;
+                lastMessageKeys = new Set();
+                data.incremental = false;
+            }
+
+            // При первом подключении запоминаем, есть ли еще более старые сообщения
+            if (!data.incremental) {
+                hasMoreHistory = data.has_more;
+                if (data.messages.length > 0) {
+                    oldestMessageAt = data.messages[0].created_at;
+                }
+            }
+
             // Отображаем историю сообщений
             data.messages.forEach(msg => {
                 addMessageToChat(msg, msg.sender === userName);
@@ -207,17 +279,12 @@ function handleWebSocketMessage(data) {
             break;
             
         case 'new_message':
-            // Устанавливаем ник отправителя как партнера
-            if (data.message.sender !== userName && !partnerDiscovered) {
-                setPartnerNickname(data.message.sender);
-            }
-            
-            addMessageToChat(data.message, data.message.sender === userName);
-            
-            // Если это сообщение от партнера и мы еще не в режиме чата
-            if (data.message.sender !== userName && !partnerConnected) {
-                switchToChatInterface();
-            }
+            handleNewMessage(data.message);
+            break;
+
+        // Пачка сообщений из частой комнаты, в порядке отправки
+        case 'new_messages':
+            data.messages.forEach(handleNewMessage);
             break;
             
         case 'partner_status':
@@ -253,7 +320,69 @@ function handleWebSocketMessage(data) {
         case 'user_exited':
             handlePartnerExited(data.reason || 'Partner left the chat');
             break;
+
+        // Сервер отклонил сообщение: слишком часто или слишком длинное
+        case 'rate_limited':
+            loadingOlder = false;
+            restoreLastMessage();
+            pauseSending(data.retry_after);
+            showSystemNotice('You are sending messages too fast. Please wait a moment.');
+            break;
+
+        case 'message_rejected':
+            restoreLastMessage();
+            showSystemNotice(`Message is too long (max ${data.max_length} characters).`);
+            break;
+    }
+}
+
+function handleNewMessage(message) {
+    // Устанавливаем ник отправителя как партнера
+    if (message.sender !== userName && !partnerDiscovered) {
+        setPartnerNickname(message.sender);
+    }
+
+    addMessageToChat(message, message.sender === userName);
+
+    // Если это сообщение от партнера и мы еще не в режиме чата
+    if (message.sender !== userName && !partnerConnected) {
+        switchToChatInterface();
+    }
+}
+
+// Возвращает отклоненное сообщение в поле ввода, если пользователь еще ничего не набрал
+function restoreLastMessage() {
+    const messageInput = document.getElementById('messageInput');
+    if (lastSentText && !messageInput.value) {
+        messageInput.value = lastSentText;
     }
+    lastSentText = '';
+}
+
+// Блокирует кнопку отправки до пополнения лимита
+function pauseSending(seconds) {
+    const sendButton = document.getElementById('sendButton');
+    sendButton.disabled = true;
+    setTimeout(() => {
+        if (!sessionEnded) sendButton.disabled = false;
+    }, Math.max(seconds || 0, 0.2) * 1000);
+}
+
+function showConnectionError(text) {
+    const notice = document.createElement('div');
+    notice.className = 'system-message';
+    notice.textContent = text;
+    document.getElementById('messagesContainer').appendChild(notice);
+}
+
+function showSystemNotice(text) {
+    const container = document.getElementById('messagesContainer');
+    const notice = document.createElement('div');
+    notice.className = 'system-message';
+    notice.textContent = text;
+    container.appendChild(notice);
+    container.scrollTop = container.scrollHeight;
+    setTimeout(() => notice.remove(), 4000);
 }
 
 // Обработка выхода партнера
@@ -379,10 +508,25 @@ function endSession(reason) {
 }
 
 // Функция добавления сообщения в чат
-function addMessageToChat(messageData, isMyMessage = false) {
+function addMessageToChat(messageData, isMyMessage = false, prepend = false) {
     // Если сессия завершена, не добавляем новые сообщения
     if (sessionEnded) return;
     
+    // Запоминаем последнее полученное сообщение для переподключения
+    if (!prepend) {
+        const key = `${messageData.sender}|${messageData.text}`;
+        if (messageData.created_at === lastMessageAt) {
+            // Повтор с границы since после переподключения
+            if (lastMessageKeys.has(key)) return;
+        } else if (!lastMessageAt || messageData.created_at > lastMessageAt) {
+            lastMessageAt = messageData.created_at;
+            lastMessageKeys = new Set();
+        }
+        if (messageData.created_at === lastMessageAt) {
+            lastMessageKeys.add(key);
+        }
+    }
+
     const container = document.getElementById('messagesContainer');
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${isMyMessage ? 'my-message' : 'other-message'}`;
@@ -411,8 +555,12 @@ function addMessageToChat(messageData, isMyMessage = false) {
     messageContent.appendChild(messageTimeElement);
     messageDiv.appendChild(messageContent);
 
-    container.appendChild(messageDiv);
-    container.scrollTop = container.scrollHeight;
+    if (prepend) {
+        container.insertBefore(messageDiv, container.firstChild);
+    } else {
+        container.appendChild(messageDiv);
+        container.scrollTop = container.scrollHeight;
+    }
 
     // Определяем, короткое ли сообщение (одна строка)
     setTimeout(() => {
@@ -429,10 +577,39 @@ function addMessageToChat(messageData, isMyMessage = false) {
     }, 0);
 }
 
+// Добавление более старых сообщений в начало чата
+function prependOlderMessages(messages, hasMore) {
+    const container = document.getElementById('messagesContainer');
+    const previousHeight = container.scrollHeight;
+
+    // Вставляем с конца, чтобы сохранить порядок
+    for (let i = messages.length - 1; i >= 0; i--) {
+        addMessageToChat(messages[i], messages[i].sender === userName, true);
+    }
+
+    if (messages.length > 0) {
+        oldestMessageAt = messages[0].created_at;
+    }
+    hasMoreHistory = hasMore;
+    loadingOlder = false;
+
+    // Сохраняем позицию прокрутки
+    container.scrollTop = container.scrollHeight - previousHeight;
+}
+
+// Запрос более старых сообщений при прокрутке к началу чата
+function loadOlderMessages() {
+    if (!hasMoreHistory || loadingOlder || !oldestMessageAt) return;
+    if (!websocket || websocket.readyState !== WebSocket.OPEN) return;
+
+    loadingOlder = true;
+    websocket.send(JSON.stringify({ type: 'load_history', before: oldestMessageAt }));
+}
+
 // Функция отправки сообщения
 function sendMessage() {
-    // Если сессия завершена, блокируем отправку сообщений
-    if (sessionEnded) {
+    // Если сессия завершена или сервер попросил подождать, блокируем отправку сообщений
+    if (sessionEnded || document.getElementById('sendButton').disabled) {
         return;
     }
     
@@ -441,6 +618,7 @@ function sendMessage() {
 
     if (message && websocket && websocket.readyState === WebSocket.OPEN) {
         websocket.send(JSON.stringify({ text: message }));
+        lastSentText = message;
         messageInput.value = '';
     }
 }
@@ -500,6 +678,15 @@ document.addEventListener('DOMContentLoaded', function() {
     if (sendButton) {
         sendButton.addEventListener('click', sendMessage);
     }
+
+    const messagesContainer = document.getElementById('messagesContainer');
+    if (messagesContainer) {
+        messagesContainer.addEventListener('scroll', function() {
+            if (messagesContainer.scrollTop === 0) {
+                loadOlderMessages();
+            }
+        });
+    }
     
     // Обработчик для выпадающего меню
     document.querySelector('.menu-dots').addEventListener('click', function(e) {
@@ -1,5 +1,6 @@
 const API_BASE_URL = `${window.location.origin}/api/user` || 'https://chat.lllang.site/api/user';
 const API_WORKER_URL = `${window.location.origin}/api/worker` || 'https://chat.lllang.site/api/worker'
+const API_WS_URL = window.location.origin.replace(/^http/, 'ws');
 
 // Массив креативных сообщений о поиске
 const searchMessages = [
@@ -120,6 +121,8 @@ let isLoading = false;
 let searchMessageInterval = null;
 let currentMessageIndex = 0;
 let statusCheckInterval = null;
+let queueDataInterval = null;
+let queueSocket = null;
 let matchFound = false;
 let searchMessagesRunning = false;
 let currentShuffledMessages = [];
@@ -173,13 +176,90 @@ async function initRoom() {
     await updateRoomImageOnInit();
     await checkUserStatus();
 
+    // Статус очереди и матч приходят через WebSocket,
+    // опрос используется только если канал недоступен
+    const userId = await getUserId();
+    if (!userId || !connectQueueSocket(userId)) {
+        startPolling();
+    }
+
+    roomInitialized = true;
+}
+
+// Запуск опроса сервера (резервный режим без WebSocket)
+function startPolling() {
     // Запускаем периодическую проверку статуса пользователя
     startStatusChecking();
 
     // Периодически обновляем статус очереди
-    setInterval(updateQueueData, 2000);
+    if (!queueDataInterval) {
+        queueDataInterval = setInterval(updateQueueData, 2000);
+    }
+}
 
-    roomInitialized = true;
+// Подключение к push-каналу комнаты ожидания
+function connectQueueSocket(userId) {
+    if (!('WebSocket' in window)) return false;
+
+    try {
+        queueSocket = new WebSocket(`${API_WS_URL}/ws/queue?user_id=${encodeURIComponent(userId)}`);
+    } catch (error) {
+        console.error('Error opening queue socket:', error);
+        return false;
+    }
+
+    queueSocket.onmessage = function(event) {
+        try {
+            handleQueueMessage(JSON.parse(event.data), userId);
+        } catch (error) {
+            console.error('Error parsing queue message:', error);
+        }
+    };
+
+    queueSocket.onclose = function() {
+        queueSocket = null;
+        // Если матч еще не найден, возвращаемся к опросу
+        if (!matchFound) {
+            console.warn('Queue socket closed, falling back to polling');
+            startPolling();
+        }
+    };
+
+    queueSocket.onerror = function(error) {
+        console.error('Queue socket error:', error);
+    };
+
+    return true;
+}
+
+// Обработчик сообщений push-канала
+function handleQueueMessage(data, userId) {
+    switch (data.type) {
+        case 'queue_status':
+            if (matchFound) return;
+            currentQueueSize = data.queue_size;
+            updateRoomImage(data.queue_size);
+            break;
+
+        case 'user_status':
+            const wasInQueue = userInQueue;
+            userInQueue = data.in_queue;
+            updateUserStatus();
+
+            if (!wasInQueue && userInQueue) {
+                startSearchMessages();
+            } else if (wasInQueue && !userInQueue && !matchFound) {
+                stopSearchMessages();
+            }
+            break;
+
+        case 'match_found':
+            if (matchFound) return;
+            matchFound = true;
+            userInQueue = false;
+            showMatchFound(data.match_id, data.room_id, userId, data.token);
+            break;
+    }
 }
 
 // Функция для обновления картинки при инициализации
@@ -341,12 +421,18 @@ async function checkMatchFound() {
 }
 
 // Показать найденный матч
-async function showMatchFound(matchId, roomId, userId) {
+async function showMatchFound(matchId, roomId, userId, token = null) {
     roomElements.roomImage.src = 'media/door.jpeg';
     roomElements.userStatus.textContent = 'Собеседник найден! Нажми чтобы начать общение';
 
     // Заменяем обработчик на переход в чат
     roomElements.roomImage.onclick = async function() {
+        // Токен уже получен через push-канал
+        if (token) {
+            window.location.href = `/enter/chat?user_id=${userId}&match_id=${matchId}&room_id=${roomId}&token=${token}`;
+            return;
+        }
+
         try {
             const response = await fetch(`${API_BASE_URL}/create_token?user_id=${userId}&room_id=${roomId}`);
             if (response.ok) {
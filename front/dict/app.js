@@ -983,7 +983,10 @@ function playAudio(audioUrl) {
     try {
         // Исправляем протокол, если URL начинается с http://
         let fixedAudioUrl = audioUrl;
-        if (audioUrl.startsWith('http://')) {
+        if (/^[0-9a-f]{64}$/.test(audioUrl)) {
+            // Ссылка на запись в хранилище сервиса
+            fixedAudioUrl = `${API_BASE_URL}/api/audio/${audioUrl}`;
+        } else if (audioUrl.startsWith('http://')) {
             fixedAudioUrl = audioUrl.replace('http://', 'https://');
         }
 
@@ -1386,6 +1389,9 @@ function resetAddWordForm() {
 }
 
 // --- Find translation ---
+// Контроллер текущего поиска: новый поиск отменяет предыдущий запрос
+let searchController = null;
+
 async function findTranslation() {
     const searchWordInput = document.getElementById('searchWord');
     if (!searchWordInput) return;
@@ -1399,13 +1405,22 @@ async function findTranslation() {
     if (!currentUserId) { showNotification('Ошибка: Не указан user_id', 'error'); return; }
 
     const url = `${API_BASE_URL}/api/words/search?user_id=${encodeURIComponent(currentUserId)}&word=${encodeURIComponent(word)}`;
+
+    if (searchController) searchController.abort();
+    const controller = new AbortController();
+    searchController = controller;
+
     try {
         if (loadingOverlay) loadingOverlay.style.display = 'flex';
         const response = await fetch(url, {
             headers: { 'Accept': 'application/json' },
-            credentials: isSameOrigin(API_BASE_URL) ? 'include' : 'omit'
+            credentials: isSameOrigin(API_BASE_URL) ? 'include' : 'omit',
+            signal: controller.signal
         });
 
+        // Сервер отменил этот поиск ради более нового
+        if (response.status === 409) return;
+
         const text = await response.text().catch(() => null);
         if (!response.ok) {
             console.error('findTranslation bad response', response.status, text);
@@ -1414,6 +1429,9 @@ async function findTranslation() {
 
         const result = text ? JSON.parse(text) : null;
         console.log('Результат поиска:', result);
+        if (result && result.partial) {
+            console.warn('Search returned partial results');
+        }
         const searchResult = document.getElementById('searchResult');
         if (!searchResult) return;
 
@@ -1491,10 +1509,15 @@ async function findTranslation() {
         }
 
     } catch (err) {
+        if (err.name === 'AbortError') return;
         console.error('findTranslation error:', err);
         showNotification('Ошибка при поиске слова', 'error');
     } finally {
-        if (loadingOverlay) loadingOverlay.style.display = 'none';
+        // Оверлей скрывает только последний поиск
+        if (searchController === controller) {
+            searchController = null;
+            if (loadingOverlay) loadingOverlay.style.display = 'none';
+        }
     }
 }
 
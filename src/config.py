@@ -25,6 +25,232 @@ class GatewayConfig:
     def __post_init__(self):
         if not self.url: self.url=f'http://{self.host}:{self.port}'
 
+@dataclass
+class HttpConfig:
+    """ Настройки пулов соединений для gateway и worker """
+    max_connections: int = int(os.getenv('HTTP_MAX_CONNECTIONS', 200))
+    max_keepalive_connections: int = int(os.getenv('HTTP_MAX_KEEPALIVE', 50))
+    keepalive_expiry: float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30.0))
+
+    connect_timeout: float = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.0))
+    read_timeout: float = float(os.getenv('HTTP_READ_TIMEOUT', 10.0))
+    write_timeout: float = float(os.getenv('HTTP_WRITE_TIMEOUT', 10.0))
+    pool_timeout: float = float(os.getenv('HTTP_POOL_TIMEOUT', 5.0))
+
+    http2: bool = os.getenv('HTTP_HTTP2', 'true').lower() == 'true'
+
+
+@dataclass
+class QueueConfig:
+    """ Настройки push-канала комнаты ожидания """
+    tick_interval: float = float(os.getenv('QUEUE_TICK_INTERVAL', 1.0))
+    max_concurrency: int = int(os.getenv('QUEUE_MAX_CONCURRENCY', 50))
+    # Статус в очереди и матч каждого подписчика проверяются раз в интервал
+    # (со случайным сдвигом), а не каждый тик: 2 GET к worker'у на проверку
+    user_check_interval: float = float(os.getenv('QUEUE_USER_CHECK_INTERVAL', 5.0))
+    # Сокет, не принявший кадр за это время, закрывается
+    send_timeout: float = float(os.getenv('QUEUE_SEND_TIMEOUT', 5.0))
+
+
+@dataclass
+class CacheConfig:
+    """ Настройки короткоживущего кэша идемпотентных GET-запросов """
+    ttl: float = float(os.getenv('CACHE_TTL', 1.0))
+    max_entries: int = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+
+
+@dataclass
+class BackplaneConfig:
+    """ Общее состояние комнат между процессами: memory | redis """
+    backend: str = os.getenv('BACKPLANE', 'memory')
+    redis_url: str = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    channel: str = os.getenv('BACKPLANE_CHANNEL', 'chat:broadcast')
+    presence_ttl: int = int(os.getenv('BACKPLANE_PRESENCE_TTL', 86400))
+    # Переподписка после обрыва соединения с Redis: задержка удваивается до max
+    reconnect_delay: float = float(os.getenv('BACKPLANE_RECONNECT_DELAY', 0.5))
+    reconnect_max_delay: float = float(os.getenv('BACKPLANE_RECONNECT_MAX_DELAY', 30.0))
+
+
+@dataclass
+class OutboundConfig:
+    """ Очереди исходящих сообщений сокетов: drop_oldest | disconnect """
+    queue_size: int = int(os.getenv('OUTBOUND_QUEUE_SIZE', 256))
+    policy: str = os.getenv('OUTBOUND_POLICY', 'drop_oldest')
+
+
+@dataclass
+class LifecycleConfig:
+    """ Обслуживание соединений чата """
+    sweep_interval: float = float(os.getenv('LIFECYCLE_SWEEP_INTERVAL', 30.0))
+    # Комната без сообщений дольше этого закрывается, 0 - не закрывать
+    room_idle_timeout: float = float(os.getenv('ROOM_IDLE_TIMEOUT', 1800.0))
+    # Время на отправку session_ended перед закрытием сокета
+    close_timeout: float = float(os.getenv('LIFECYCLE_CLOSE_TIMEOUT', 5.0))
+
+
+@dataclass
+class ChatLimitsConfig:
+    """ Ограничения входящих сообщений чата, rate 0 - без ограничения """
+    # Сообщений в секунду на соединение и размер всплеска
+    rate: float = float(os.getenv('CHAT_RATE_LIMIT', 5.0))
+    burst: float = float(os.getenv('CHAT_RATE_BURST', 10))
+    # То же на комнату (оба участника вместе)
+    room_rate: float = float(os.getenv('CHAT_ROOM_RATE_LIMIT', 8.0))
+    room_burst: float = float(os.getenv('CHAT_ROOM_RATE_BURST', 16))
+    # Больший кадр закрывает соединение с кодом 1009
+    max_frame_size: int = int(os.getenv('CHAT_MAX_FRAME_SIZE', 16384))
+    max_text_length: int = int(os.getenv('CHAT_MAX_TEXT_LENGTH', 4000))
+
+
+@dataclass
+class ChatProtocolConfig:
+    """ Кодирование кадров чата: JSON по умолчанию, MessagePack по подпротоколу """
+    # Разрешить подпротокол chat.msgpack (нужен пакет msgpack). Выключен по умолчанию:
+    # после permessage-deflate кадры не меньше JSON (см. benchmarks/frame_encoding.py)
+    msgpack: bool = os.getenv('CHAT_MSGPACK', 'false').lower() in ('1', 'true', 'yes')
+
+
+@dataclass
+class ChatBatchingConfig:
+    """ Микро-пачки new_message для комнат с частыми сообщениями """
+    enabled: bool = os.getenv('CHAT_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+    # Сообщений в секунду на комнату, с которых включаются пачки.
+    # При CHAT_ROOM_RATE_LIMIT ниже порога пачки не включатся
+    threshold: float = float(os.getenv('CHAT_BATCH_THRESHOLD', 20.0))
+    # Наибольшая добавочная задержка сообщения
+    window_ms: float = float(os.getenv('CHAT_BATCH_WINDOW_MS', 5.0))
+    max_size: int = int(os.getenv('CHAT_BATCH_MAX_SIZE', 64))
+
+
+@dataclass
+class PersistenceConfig:
+    """ Отложенная пакетная запись сообщений чата в worker """
+    queue_size: int = int(os.getenv('PERSIST_QUEUE_SIZE', 10000))
+    batch_size: int = int(os.getenv('PERSIST_BATCH_SIZE', 100))
+    flush_interval: float = float(os.getenv('PERSIST_FLUSH_INTERVAL', 0.05))
+    # Неудачная пачка повторяется, пока буфер не переполнится; задержка
+    # растет от retry_backoff до max_retry_delay
+    retry_backoff: float = float(os.getenv('PERSIST_RETRY_BACKOFF', 0.2))
+    max_retry_delay: float = float(os.getenv('PERSIST_MAX_RETRY_DELAY', 5.0))
+    drain_timeout: float = float(os.getenv('PERSIST_DRAIN_TIMEOUT', 10.0))
+
+
+@dataclass
+class HistoryConfig:
+    """ Кэш и постраничная выдача истории сообщений """
+    ring_size: int = int(os.getenv('HISTORY_RING_SIZE', 200))
+    max_rooms: int = int(os.getenv('HISTORY_MAX_ROOMS', 10000))
+    page_size: int = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+    max_page_size: int = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 200))
+
+
+@dataclass
+class TokenConfig:
+    """ Кэш проверенных токенов чата """
+    cache_size: int = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+
+@dataclass
+class SearchConfig:
+    """ Таймауты параллельного поиска слова, в секундах """
+    user_timeout: float = float(os.getenv('SEARCH_USER_TIMEOUT', 3.0))
+    global_timeout: float = float(os.getenv('SEARCH_GLOBAL_TIMEOUT', 1.5))
+
+
+@dataclass
+class WordsCacheConfig:
+    """ Кэш словарей пользователей """
+    max_entries: int = int(os.getenv('WORDS_CACHE_MAX_ENTRIES', 5000))
+    max_bytes: int = int(os.getenv('WORDS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    ttl: float = float(os.getenv('WORDS_CACHE_TTL', 300.0))
+
+
+@dataclass
+class ProfileCacheConfig:
+    """ Кэш записей пользователей из gateway """
+    # Кэш свой у каждого процесса: после регистрации остальные процессы
+    # видят новую запись не позже, чем через TTL (отсутствие - через negative_ttl)
+    ttl: float = float(os.getenv('PROFILE_CACHE_TTL', 300.0))
+    # Отсутствующий пользователь или незаполненный профиль
+    negative_ttl: float = float(os.getenv('PROFILE_CACHE_NEGATIVE_TTL', 15.0))
+    max_entries: int = int(os.getenv('PROFILE_CACHE_MAX_ENTRIES', 20000))
+
+
+@dataclass
+class AudioConfig:
+    """ Хранилище аудиозаписей слов """
+    backend: str = os.getenv('AUDIO_STORE', 'local')
+    path: str = os.getenv('AUDIO_STORE_PATH', 'data/audio')
+    max_bytes: int = int(os.getenv('AUDIO_MAX_BYTES', 10 * 1024 * 1024))
+    chunk_size: int = int(os.getenv('AUDIO_CHUNK_SIZE', 64 * 1024))
+
+
+@dataclass
+class BatchConfig:
+    """ Пакетные операции со словарем """
+    max_operations: int = int(os.getenv('BATCH_MAX_OPERATIONS', 500))
+    concurrency: int = int(os.getenv('BATCH_CONCURRENCY', 8))
+
+
+@dataclass
+class ResilienceConfig:
+    """ Размыкатели цепи, повторы и hedging запросов к gateway и worker """
+    failure_threshold: int = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+    reset_timeout: float = float(os.getenv('BREAKER_RESET_TIMEOUT', 10.0))
+    half_open_max: int = int(os.getenv('BREAKER_HALF_OPEN_MAX', 1))
+    # Таймауты по префиксу пути, в секундах: "/check_match=2,/match/toggle=30"
+    timeouts: str = os.getenv('UPSTREAM_TIMEOUTS', '/check_match=2,/queue=2,/api/words/search=3,/match/toggle=30')
+    retries: int = int(os.getenv('UPSTREAM_RETRIES', 2))
+    retry_backoff: float = float(os.getenv('UPSTREAM_RETRY_BACKOFF', 0.1))
+    # Задержка перед дублирующим запросом по префиксу пути
+    hedge: str = os.getenv('UPSTREAM_HEDGE', '/check_match=0.2')
+
+
+@dataclass
+class MetricsConfig:
+    """ Метрики в формате Prometheus """
+    enabled: bool = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # Период замера задержки цикла событий, в секундах
+    loop_lag_interval: float = float(os.getenv('METRICS_LOOP_LAG_INTERVAL', 0.5))
+
+
+@dataclass
+class LogConfig:
+    """ Вывод логов: color - для разработки, json - строка JSON на запись через фоновый поток """
+    format: str = os.getenv('LOG_FORMAT', 'color')
+    # Записи сверх размера очереди отбрасываются, цикл событий не ждет вывода
+    queue_size: int = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    # Доля сохраняемых DEBUG-записей (1.0 - все)
+    debug_sample_rate: float = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 1.0))
+
+
+@dataclass
+class ServerConfig:
+    """ Запуск uvicorn в production """
+    # Пусто - по числу ядер (при общем backplane) или один процесс
+    workers: str = os.getenv('SERVER_WORKERS', '')
+    # Перезапуск при изменении файлов, только для разработки
+    reload: bool = os.getenv('SERVER_RELOAD', 'false').lower() in ('1', 'true', 'yes')
+    # auto | uvloop | asyncio и auto | httptools | h11
+    loop: str = os.getenv('SERVER_LOOP', 'auto')
+    http: str = os.getenv('SERVER_HTTP', 'auto')
+    backlog: int = int(os.getenv('SERVER_BACKLOG', 2048))
+    # Дольше keepalive у nginx, чтобы соединение закрывал прокси, а не мы
+    keepalive: int = int(os.getenv('SERVER_KEEPALIVE', 75))
+    graceful_timeout: int = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+    # Время на отправку очередей WebSocket перед закрытием с кодом 1012
+    drain_timeout: float = float(os.getenv('SERVER_DRAIN_TIMEOUT', 5.0))
+    access_log: bool = os.getenv('SERVER_ACCESS_LOG', 'false').lower() in ('1', 'true', 'yes')
+    # Пинги WebSocket на уровне протокола; без ответа за timeout соединение закрывается
+    ws_ping_interval: float = float(os.getenv('SERVER_WS_PING_INTERVAL', 20.0))
+    ws_ping_timeout: float = float(os.getenv('SERVER_WS_PING_TIMEOUT', 20.0))
+    # permessage-deflate. Окно и memLevel меньше умолчаний zlib:
+    # контекст сжатия живет все время соединения и занимает память на каждый сокет
+    ws_deflate: bool = os.getenv('SERVER_WS_DEFLATE', 'true').lower() in ('1', 'true', 'yes')
+    ws_deflate_window_bits: int = int(os.getenv('SERVER_WS_DEFLATE_WINDOW_BITS', 12))
+    ws_deflate_mem_level: int = int(os.getenv('SERVER_WS_DEFLATE_MEM_LEVEL', 5))
+
+
 @dataclass
 class Config:
 
@@ -38,10 +264,52 @@ class Config:
 
     gateway: "GatewayConfig" = None
     worker: "WorkerConfig" = None
+    http: "HttpConfig" = None
+    queue: "QueueConfig" = None
+    cache: "CacheConfig" = None
+    backplane: "BackplaneConfig" = None
+    outbound: "OutboundConfig" = None
+    lifecycle: "LifecycleConfig" = None
+    chat_limits: "ChatLimitsConfig" = None
+    chat_protocol: "ChatProtocolConfig" = None
+    chat_batching: "ChatBatchingConfig" = None
+    persistence: "PersistenceConfig" = None
+    history: "HistoryConfig" = None
+    tokens: "TokenConfig" = None
+    search: "SearchConfig" = None
+    words_cache: "WordsCacheConfig" = None
+    profiles: "ProfileCacheConfig" = None
+    audio: "AudioConfig" = None
+    batch: "BatchConfig" = None
+    resilience: "ResilienceConfig" = None
+    metrics: "MetricsConfig" = None
+    logging: "LogConfig" = None
+    server: "ServerConfig" = None
 
     def __post_init__(self):
         if not self.gateway: self.gateway = GatewayConfig()
         if not self.worker: self.worker = WorkerConfig()
+        if not self.http: self.http = HttpConfig()
+        if not self.queue: self.queue = QueueConfig()
+        if not self.cache: self.cache = CacheConfig()
+        if not self.backplane: self.backplane = BackplaneConfig()
+        if not self.outbound: self.outbound = OutboundConfig()
+        if not self.lifecycle: self.lifecycle = LifecycleConfig()
+        if not self.chat_limits: self.chat_limits = ChatLimitsConfig()
+        if not self.chat_protocol: self.chat_protocol = ChatProtocolConfig()
+        if not self.chat_batching: self.chat_batching = ChatBatchingConfig()
+        if not self.persistence: self.persistence = PersistenceConfig()
+        if not self.history: self.history = HistoryConfig()
+        if not self.tokens: self.tokens = TokenConfig()
+        if not self.search: self.search = SearchConfig()
+        if not self.words_cache: self.words_cache = WordsCacheConfig()
+        if not self.profiles: self.profiles = ProfileCacheConfig()
+        if not self.audio: self.audio = AudioConfig()
+        if not self.batch: self.batch = BatchConfig()
+        if not self.resilience: self.resilience = ResilienceConfig()
+        if not self.metrics: self.metrics = MetricsConfig()
+        if not self.logging: self.logging = LogConfig()
+        if not self.server: self.server = ServerConfig()
 
 
 config = Config()
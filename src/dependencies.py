@@ -1,9 +1,69 @@
+from src.services.audio import audio_store
+from src.services.batch import word_batch_runner
+from src.services.cache import upstream_cache
 from src.services.connection import connection_service
+from src.services.history import history_cache
+from src.services.lifecycle import lifecycle_manager
+from src.services.persistence import message_writer
+from src.services.profiles import profile_cache
+from src.services.queue import queue_notifier
+from src.services.ratelimit import chat_rate_limiter
+from src.services.search import inflight_searches
+from src.services.upstream import upstream_clients
+from src.services.words import words_cache
 
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from src.services.audio import AudioStore
+    from src.services.batch import WordBatchRunner
+    from src.services.cache import CoalescingCache
     from src.services.connection import ConnectionService
+    from src.services.history import HistoryCache
+    from src.services.lifecycle import LifecycleManager
+    from src.services.persistence import MessageWriter
+    from src.services.profiles import ProfileCache
+    from src.services.queue import QueueNotifier
+    from src.services.ratelimit import ChatRateLimiter
+    from src.services.search import InflightSearches
+    from src.services.upstream import UpstreamClients
+    from src.services.words import WordsCache
 
 async def get_ws_connection() -> "ConnectionService":
-    return connection_service
\ No newline at end of file
+    return connection_service
+
+async def get_upstream() -> "UpstreamClients":
+    return upstream_clients
+
+async def get_queue_notifier() -> "QueueNotifier":
+    return queue_notifier
+
+async def get_upstream_cache() -> "CoalescingCache":
+    return upstream_cache
+
+async def get_message_writer() -> "MessageWriter":
+    return message_writer
+
+async def get_history_cache() -> "HistoryCache":
+    return history_cache
+
+async def get_inflight_searches() -> "InflightSearches":
+    return inflight_searches
+
+async def get_words_cache() -> "WordsCache":
+    return words_cache
+
+async def get_audio_store() -> "AudioStore":
+    return audio_store
+
+async def get_word_batch_runner() -> "WordBatchRunner":
+    return word_batch_runner
+
+async def get_profile_cache() -> "ProfileCache":
+    return profile_cache
+
+async def get_lifecycle_manager() -> "LifecycleManager":
+    return lifecycle_manager
+
+async def get_chat_rate_limiter() -> "ChatRateLimiter":
+    return chat_rate_limiter
@@ -0,0 +1,104 @@
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Request, Response
+from fastapi.responses import StreamingResponse
+
+from src.config import config
+from src.dependencies import get_audio_store
+from src.exc import AudioTooLarge, UnsupportedAudio
+from src.logconf import opt_logger as log
+from src.services.audio import AudioStore
+
+router = APIRouter(prefix="/api")
+logger = log.setup_logger('audio_endpoints')
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@router.post("/audio")
+async def api_upload_audio_handler(
+        request: Request,
+        store: AudioStore = Depends(get_audio_store),
+):
+    """ Загрузить аудиозапись слова. Тело запроса - сами байты записи """
+    max_bytes = config.audio.max_bytes
+
+    # Заведомо большие записи отклоняются до чтения тела
+    length = request.headers.get('content-length')
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Audio is larger than {max_bytes} bytes")
+
+    try:
+        audio_id, size, content_type = await store.save(request.stream(), max_bytes)
+
+    except AudioTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    except UnsupportedAudio as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    logger.debug('Audio %s saved (%s bytes, %s)', audio_id, size, content_type)
+    return {"audio_id": audio_id, "size": size, "content_type": content_type}
+
+
+@router.get("/audio/{audio_id}")
+async def api_audio_handler(
+        audio_id: str = Path(..., pattern=r'^[0-9a-f]{64}$'),
+        range_header: Optional[str] = Header(None, alias="Range"),
+        if_none_match: Optional[str] = Header(None),
+        store: AudioStore = Depends(get_audio_store),
+):
+    """ Отдать аудиозапись, поддерживает запросы диапазонов (Range) """
+    # Запись адресуется содержимым и не меняется
+    headers = {
+        "ETag": f'"{audio_id}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match is not None and audio_id in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    blob = await store.open(audio_id)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    status_code = 200
+    start, end = 0, blob.size - 1
+    # Несколько диапазонов и прочие формы не поддерживаются, отдается вся запись
+    match = _RANGE.match(range_header.strip()) if range_header is not None else None
+    if match is not None:
+        requested = _parse_range(match, blob.size)
+        if requested is None:
+            blob.close()
+            headers["Content-Range"] = f"bytes */{blob.size}"
+            return Response(status_code=416, headers=headers)
+        start, end = requested
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{blob.size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        blob.iter_range(start, end, config.audio.chunk_size),
+        status_code=status_code,
+        media_type=blob.content_type,
+        headers=headers,
+    )
+
+
+def _parse_range(match: re.Match, size: int) -> Optional[Tuple[int, int]]:
+    """Диапазон bytes=a-b, bytes=a- или bytes=-n. None, если он вне записи"""
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Последние n байт
+        if int(last) == 0:
+            return None
+        return max(size - int(last), 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start > end:
+        return None
+    return start, end
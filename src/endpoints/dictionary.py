@@ -1,11 +1,22 @@
-from typing import List
+import asyncio
+from typing import Optional
 
-import httpx
-from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
 from src.config import config
+from src.dependencies import (
+    get_inflight_searches, get_upstream, get_upstream_cache, get_word_batch_runner, get_words_cache
+)
+from src.exc import SearchSuperseded
 from src.logconf import opt_logger as log
-from src.models.dict_models import Word
+from src.models.dict_models import Word, WordBatch
+from src.services.batch import WordBatchRunner
+from src.services.cache import CoalescingCache
+from src.services.search import InflightSearches
+from src.services.streaming import extract_member
+from src.services.upstream import UpstreamClients
+from src.services.words import WordsCache
 
 router = APIRouter(prefix="/api")
 logger = log.setup_logger('dictionary_endpoints')
@@ -14,68 +25,143 @@ logger = log.setup_logger('dictionary_endpoints')
 @router.get("/words")
 async def api_words_handler(
     user_id: int = Query(..., description="User ID"),
-) -> List[dict]:
-    async with httpx.AsyncClient() as client:
-        url = config.gateway.url + f'/api/words?user_id={user_id}'
-        resp = await client.get(url=url)
-        if resp.status_code == 200:
-
-            # Пытается преобразовать из формата json
-            try:
-                data = resp.json()
-                user_words_ls = data.get(str(user_id), [])
-
-            except: # noqa
-                user_words_ls = []
-
-            return [dict(item) for item in user_words_ls]
-
-
-        else:
-            raise HTTPException(
-                status_code=resp.status_code, detail=resp.text
-            )
+    limit: Optional[int] = Query(None, ge=1, description="Размер страницы на gateway"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы от gateway"),
+    stream: bool = Query(False, description="Отдать словарь потоком, минуя кэш"),
+    if_none_match: Optional[str] = Header(None),
+    upstream: UpstreamClients = Depends(get_upstream),
+    cache: WordsCache = Depends(get_words_cache),
+):
+    """ Словарь пользователя, повторные загрузки отдаются из кэша """
+    params = {"user_id": user_id}
+
+    # Страницы и явный поток проходят насквозь, не занимая память целым словарем
+    if stream or limit is not None or cursor is not None:
+        if limit is not None:
+            params["limit"] = limit
+        if cursor is not None:
+            params["cursor"] = cursor
+        return await stream_words(upstream, user_id, params)
+
+    async def load() -> bytes:
+        request = upstream.gateway.build_request('GET', '/api/words', params=params)
+        resp = await upstream.gateway.send(request, stream=True)
+        try:
+            await _raise_for_upstream(resp)
+            return b''.join([part async for part in extract_member(resp.aiter_bytes(), str(user_id))])
+        finally:
+            await resp.aclose()
+
+    entry = await cache.get(user_id, load)
+    # Браузер перепроверяет словарь по ETag при каждой загрузке страницы
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if if_none_match is not None and _etag_matches(if_none_match, entry.etag):
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Заголовки пагинации gateway, которые передаются клиенту
+PAGINATION_HEADERS = ('x-next-cursor', 'link')
+
+
+async def stream_words(upstream: UpstreamClients, user_id: int, params: dict) -> StreamingResponse:
+    """ Передает слова пользователя из ответа gateway по мере получения """
+    request = upstream.gateway.build_request('GET', '/api/words', params=params)
+    resp = await upstream.gateway.send(request, stream=True)
+    try:
+        await _raise_for_upstream(resp)
+    except HTTPException:
+        await resp.aclose()
+        raise
+
+    async def body():
+        try:
+            async for part in extract_member(resp.aiter_bytes(), str(user_id)):
+                yield part
+        finally:
+            await resp.aclose()
+
+    headers = {name: resp.headers[name] for name in PAGINATION_HEADERS if name in resp.headers}
+    return StreamingResponse(body(), media_type="application/json", headers=headers)
+
+
+async def _raise_for_upstream(resp):
+    if resp.status_code != 200:
+        await resp.aread()
+        raise HTTPException(
+            status_code=resp.status_code, detail=resp.text
+        )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    # Слабое сравнение: W/ префикс не учитывается
+    return any(
+        candidate.strip().removeprefix('W/') == etag
+        for candidate in if_none_match.split(',')
+    )
+
+
+@router.get("/words/cache/stats")
+async def api_words_cache_stats_handler(
+    cache: WordsCache = Depends(get_words_cache),
+):
+    """ Метрики кэша словарей: доля попаданий и занятая память """
+    return cache.stats()
 
 
 @router.post("/words")
-async def api_add_word_handler(request: Word,):
+async def api_add_word_handler(
+    request: Word,
+    upstream: UpstreamClients = Depends(get_upstream),
+    cache: WordsCache = Depends(get_words_cache),
+):
     """ Добавить новое слово в словарь """
-    async with httpx.AsyncClient() as client:
-        url = config.gateway.url + f'/api/words?user_id={request.user_id}'
-        resp = await client.post(url=url, content=request.model_dump_json())
-        if resp.status_code == 200:
-            return Response(status_code=200)
+    url = f'/api/words?user_id={request.user_id}'
+    resp = await upstream.gateway.post(url=url, content=request.model_dump_json())
+    await cache.invalidate(request.user_id)
+    if resp.status_code == 200:
+        return Response(status_code=200)
 
-        logger.warning('Malfunction occured in api_add_word_handler')
-        raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    logger.warning('Malfunction occured in api_add_word_handler')
+    raise HTTPException(status_code=resp.status_code, detail=resp.text)
 
 
 @router.put('/words')
-async def api_edit_word_handler(request: Word,):
+async def api_edit_word_handler(
+    request: Word,
+    upstream: UpstreamClients = Depends(get_upstream),
+    cache: WordsCache = Depends(get_words_cache),
+):
     """ Изменить уже существующее слово в словаре """
-    async with httpx.AsyncClient() as client:
-        url = config.gateway.url + f'/api/words?user_id={request.user_id}'
-        resp = await client.put(url=url, content=request.model_dump_json())
-        if resp.status_code == 200:
-            return Response(status_code=200)
+    url = f'/api/words?user_id={request.user_id}'
+    resp = await upstream.gateway.put(url=url, content=request.model_dump_json())
+    await cache.invalidate(request.user_id)
+    if resp.status_code == 200:
+        return Response(status_code=200)
 
-        logger.warning('Malfunction occured in api_add_word_handler')
-        raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    logger.warning('Malfunction occured in api_add_word_handler')
+    raise HTTPException(status_code=resp.status_code, detail=resp.text)
 
 @router.delete("/words")
 async def api_delete_word_handler(
     user_id: int = Query(..., description="User ID"),
     word_id: int = Query(..., description="Word ID which it goes by in DB"),
+    upstream: UpstreamClients = Depends(get_upstream),
+    cache: WordsCache = Depends(get_words_cache),
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            url = config.gateway.url + f'/api/words?user_id={user_id}&word_id={word_id}'
-            resp = await client.delete(url=url)
-            if resp.status_code == 200:
-                return Response(status_code=200)
+        url = f'/api/words?user_id={user_id}&word_id={word_id}'
+        resp = await upstream.gateway.delete(url=url)
+        await cache.invalidate(user_id)
+        if resp.status_code == 200:
+            return Response(status_code=200)
 
-            logger.warning('Malfunction occured in api_delete_word_handler')
-            raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        logger.warning('Malfunction occured in api_delete_word_handler')
+        raise HTTPException(status_code=resp.status_code, detail=resp.text)
 
     except Exception as e:
         logger.error(f"Error in api_delete_word_handler: {str(e)}")
@@ -83,87 +169,144 @@ async def api_delete_word_handler(
 
 
 
+@router.post("/words/batch")
+async def api_words_batch_handler(
+    batch: WordBatch,
+    upstream: UpstreamClients = Depends(get_upstream),
+    runner: WordBatchRunner = Depends(get_word_batch_runner),
+    cache: WordsCache = Depends(get_words_cache),
+):
+    """ Пакет операций create/update/delete одним запросом, результат по каждой операции """
+    max_operations = config.batch.max_operations
+    if len(batch.operations) > max_operations:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {max_operations} operations")
+
+    try:
+        results = await runner.run(upstream, batch.operations)
+    finally:
+        for user_id in {operation.user_id for operation in batch.operations}:
+            await cache.invalidate(user_id)
+
+    return {"results": results, "ok": all(result["ok"] for result in results)}
+
+
 @router.get("/words/search")
 async def api_search_word_handler(
         user_id: int = Query(..., description="User ID пользователя"),
         word: str = Query(..., description="Слово для поиска среди пользователей"),
+        upstream: UpstreamClients = Depends(get_upstream),
+        searches: InflightSearches = Depends(get_inflight_searches),
 ):
     try:
-        # Ищем слово от других участников
-        async with httpx.AsyncClient() as client:
+        # Новый поиск пользователя отменяет его предыдущий, еще не завершенный
+        return await searches.run(user_id, search_word(upstream, user_id, word))
 
-            # Отправляет два запроса на gateway сервер
-            user_word_resp = await client.get(
-                url=config.gateway.url + f'/api/words/search?user_id={user_id}&word={word}'
-            )
-            all_words_resp = await client.get(
-                url=config.gateway.url + f'/api/words/search?word={word}'
-            )
+    except SearchSuperseded:
+        raise HTTPException(status_code=409, detail="Search superseded by a newer request")
 
+    except HTTPException:
+        raise
 
-            if not user_word_resp.status_code == 200 and user_word_resp.status_code != 204:
-                logger.warning('Malfunction occured in api_search_word_handler')
-                raise HTTPException(
-                    status_code=user_word_resp.status_code, detail=user_word_resp.text
-                )
-            if not all_words_resp.status_code == 200 and all_words_resp.status_code != 204:
-                logger.warning('Malfunction occured in api_search_word_handler')
-                raise HTTPException(
-                    status_code=all_words_resp.status_code, detail=all_words_resp.text
-                )
+    except Exception as e:
+        logger.error(f"Error in api_search_word_handler: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
 
-            # Если два запроса прошли успешно,
-            # то конвертируем resp объекты в словарики
 
-            user_word, all_user_words = None, None
+async def search_word(upstream: UpstreamClients, user_id: int, word: str) -> dict:
+    """ Ищет слово пользователя и слова других участников параллельно """
+    settings = config.search
 
-            if user_word_resp.status_code == 200:
-                # Пытается преобразовать resp объект
-                user_data = user_word_resp.json().get(str(user_id), [])
-                user_word = user_data.pop() if user_data else {}
+    # Два независимых запроса на gateway сервер, у каждого свой таймаут
+    user_word_resp, all_words_resp = await asyncio.gather(
+        asyncio.wait_for(
+            upstream.gateway.get(url='/api/words/search', params={"user_id": user_id, "word": word}),
+            timeout=settings.user_timeout,
+        ),
+        asyncio.wait_for(
+            upstream.gateway.get(url='/api/words/search', params={"word": word}),
+            timeout=settings.global_timeout,
+        ),
+        return_exceptions=True,
+    )
 
-                logger.debug(f'user word: {user_word}')
+    user_word = _parse_user_word(user_word_resp, user_id)
+    all_user_words = _parse_all_words(all_words_resp, user_id)
 
-            if all_words_resp.status_code == 200:
-                # Пытается преобразовать resp объект
-                all_user_words = all_words_resp.json()
-                # у всех пользователей не должно быть собственного слова
-                if str(user_id) in all_user_words:
-                    del all_user_words[str(user_id)]
+    # Частичный результат лучше ошибки, если ответила хотя бы одна сторона
+    if user_word is _FAILED and all_user_words is _FAILED:
+        raise HTTPException(status_code=504, detail="Search is not available")
 
-                logger.debug(f'all words: {all_user_words}')
+    partial = user_word is _FAILED or all_user_words is _FAILED
+    return {
+        "user_word": None if user_word is _FAILED else user_word,
+        "all_users_words": None if all_user_words is _FAILED else all_user_words,
+        "partial": partial,
+    }
 
 
-            # возвращает полученные слова
-            return {"user_word": user_word, "all_users_words": all_user_words}
+# Маркер неудавшейся части поиска
+_FAILED = object()
 
 
+def _failed(resp, part: str) -> bool:
+    if isinstance(resp, BaseException):
+        reason = 'timeout' if isinstance(resp, asyncio.TimeoutError) else repr(resp)
+        logger.warning(f'{part} search failed: {reason}')
+        return True
+    if resp.status_code not in (200, 204):
+        logger.warning(f'{part} search failed: {resp.status_code} {resp.text}')
+        return True
+    return False
 
-    except Exception as e:
-        logger.error(f"Error in api_search_word_handler: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+
+def _parse_user_word(resp, user_id: int):
+    if _failed(resp, 'User'):
+        return _FAILED
+    if resp.status_code == 204:
+        return None
+
+    user_data = resp.json().get(str(user_id), [])
+    user_word = user_data.pop() if user_data else {}
+    logger.debug('user word: %s', user_word)
+    return user_word
+
+
+def _parse_all_words(resp, user_id: int):
+    if _failed(resp, 'Global'):
+        return _FAILED
+    if resp.status_code == 204:
+        return None
+
+    all_user_words = resp.json()
+    # у всех пользователей не должно быть собственного слова
+    all_user_words.pop(str(user_id), None)
+    logger.debug('all words: %s', all_user_words)
+    return all_user_words
 
 
 @router.get("/stats")
 async def api_stats_handler(
-        user_id: int = Query(..., description="USer ID")
+        user_id: int = Query(..., description="USer ID"),
+        upstream: UpstreamClients = Depends(get_upstream),
+        cache: CoalescingCache = Depends(get_upstream_cache),
 ):
     """ Обработчик статистики слов пользователя """
+
+    async def load():
+        url = f'/api/words/stats?user_id={user_id}'
+        resp = await upstream.gateway.get(url=url)
+        if resp.status_code == 200:
+            return resp.json()
+        elif resp.status_code == 204:
+            return {}
+        else:
+            raise HTTPException(
+                status_code=resp.status_code, detail=resp.text
+            )
+
     try:
-        async with httpx.AsyncClient() as client:
-            url = config.gateway.url + f'/api/words/stats?user_id={user_id}'
-            resp = await client.get(url=url)
-            if resp.status_code == 200:
-                data = resp.json()
-                logger.info(f'data: {data}')
-                return resp.json()
-            elif resp.status_code == 204:
-                return {}
-            else:
-                raise HTTPException(
-                    status_code=resp.status_code, detail=resp.text
-                )
+        return await cache.get(('stats', user_id), load)
 
     except Exception as e:
         logger.error(f"Error in api_stats_handler: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+
+from src.dependencies import get_upstream
+from src.services.resilience import CLOSED
+from src.services.upstream import UpstreamClients
+
+router = APIRouter(prefix="/api")
+
+
+@router.get("/health")
+async def health_handler(
+        upstream: UpstreamClients = Depends(get_upstream),
+):
+    """ Состояние сервиса и его зависимостей. degraded - цепь к upstream разомкнута """
+    upstreams = upstream.stats()
+    degraded = any(state["state"] != CLOSED for state in upstreams.values())
+    return {
+        "status": "degraded" if degraded else "ok",
+        "upstreams": upstreams,
+    }
@@ -0,0 +1,89 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from src.logconf import opt_logger
+from src.services.batch import word_batch_runner
+from src.services.cache import upstream_cache
+from src.services.connection import connection_service
+from src.services.history import history_cache
+from src.services.lifecycle import lifecycle_manager
+from src.services.metrics import registry
+from src.services.persistence import message_writer
+from src.services.profiles import profile_cache
+from src.services.ratelimit import chat_rate_limiter
+from src.services.queue import queue_notifier
+from src.services.resilience import OPEN
+from src.services.upstream import upstream_clients
+from src.services.words import words_cache
+from src.validators.tokens import token_verifier
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# failures сбрасывается при закрытии цепи, поэтому остается gauge
+UPSTREAM_COUNTERS = ("trips", "rejected", "retried", "hedged")
+
+
+def _connections() -> dict:
+    return {
+        "active": len(connection_service.sessions),
+        "rooms": len(connection_service.rooms),
+        "queue_subscribers": sum(len(sockets) for sockets in queue_notifier.subscribers.values()),
+        **connection_service.outbound_stats(),
+    }
+
+
+def _batching() -> dict:
+    batcher = connection_service.batcher
+    return batcher.stats() if batcher is not None else {}
+
+
+def _upstreams() -> dict:
+    values = {}
+    for name, stats in upstream_clients.stats().items():
+        values[f"{name}_circuit_open"] = int(stats["state"] == OPEN)
+        for key in ("failures",) + UPSTREAM_COUNTERS:
+            values[f"{name}_{key}"] = stats[key]
+    return values
+
+
+def _logging() -> dict:
+    # Записи отбрасываются только очередью JSON-логгера
+    stats = getattr(opt_logger, "stats", None)
+    return stats() if stats is not None else {}
+
+
+# Состояние сервисов считается только при сборе, горячий путь не трогается.
+# Накопительные значения перечислены в counters и отдаются как *_total
+registry.collector("ws", "WebSocket connections and rooms of this process", _connections,
+                   counters=("dropped_frames",))
+registry.collector("chat_batching", "new_messages batches", _batching,
+                   counters=("batches", "batched_messages"))
+registry.collector("upstream", "Circuit breakers and retries", _upstreams,
+                   counters=[f"{name}_{key}" for name in ("gateway", "worker") for key in UPSTREAM_COUNTERS])
+registry.collector("upstream_cache", "Coalescing upstream cache", upstream_cache.stats,
+                   counters=("hits", "misses", "coalesced"))
+registry.collector("words_cache", "User dictionaries cache", words_cache.stats,
+                   counters=("hits", "misses", "not_modified", "evictions", "invalidations"))
+registry.collector("profile_cache", "User profiles cache", profile_cache.stats,
+                   counters=("hits", "negative_hits", "misses", "invalidations"))
+registry.collector("history_cache", "Room history cache", history_cache.stats,
+                   counters=("hits", "misses"))
+registry.collector("lifecycle", "Chat connection lifecycle", lifecycle_manager.stats,
+                   counters=("sweeps", "orphans", "idle_rooms", "ended_rooms", "empty_rooms"))
+registry.collector("chat_limits", "Rejected incoming chat frames", chat_rate_limiter.stats,
+                   counters=("limited_connection", "limited_room", "oversized_frames", "rejected_texts"))
+registry.collector("message_writer", "Write-behind message persistence", message_writer.stats,
+                   counters=("saved", "dropped", "retries"))
+registry.collector("token_cache", "Verified token cache", token_verifier.stats,
+                   counters=("hits", "misses", "rejected"))
+registry.collector("word_batch", "Dictionary batch operations", word_batch_runner.stats,
+                   counters=("operations", "coalesced", "failed"))
+registry.collector("log", "Log records dropped on a full queue", _logging, counters=("dropped",))
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_handler():
+    """ Метрики процесса в текстовом формате Prometheus """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,11 +1,13 @@
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.params import Query
 
-from src.config import config
+from src.dependencies import get_upstream, get_profile_cache
 from src.endpoints.matchmaking import logger
 from src.exc import FailToCreateToken
 from src.models import Profile
+from src.services.profiles import ProfileCache
+from src.services.upstream import UpstreamClients
 from src.validators.tokens import create_token
 
 router = APIRouter(prefix="/api/user")
@@ -13,17 +15,15 @@ router = APIRouter(prefix="/api/user")
 
 @router.get("/check_profile")
 async def check_profile_exists(
-        user_id: str = Query(..., description="User ID")
+        user_id: str = Query(..., description="User ID"),
+        upstream: UpstreamClients = Depends(get_upstream),
+        profiles: ProfileCache = Depends(get_profile_cache),
 ):
     """ Проверяет, существует ли профиль пользователя в БД """
     try:
-        async with httpx.AsyncClient() as client:
-            url = config.gateway.url + f'/api/check_profile?user_id={user_id}'
-            resp = await client.get(url=url)
-            if resp.status_code == 200:
-                return {"exists": resp.json()}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        # Отсутствие профиля тоже кэшируется, коротко
+        exists = await profiles.profile_exists(upstream, user_id)
+        return {"exists": exists if exists is not None else False}
 
     except Exception as e:
         logger.error(f'Error in check_user_handler: {e}')
@@ -32,17 +32,13 @@ async def check_profile_exists(
 
 @router.get("/check_user")
 async def check_user_handler(
-        user_id: str = Query(..., description="User ID")
+        user_id: str = Query(..., description="User ID"),
+        upstream: UpstreamClients = Depends(get_upstream),
+        profiles: ProfileCache = Depends(get_profile_cache),
 ):
     """ Проверяет, существует ли пользователь в БД """
     try:
-        async with httpx.AsyncClient() as client:
-            url = config.gateway.url + f'/api/users?user_id={user_id}'
-            resp = await client.get(url=url)
-            if resp.status_code == 200:
-                return {"exists": resp.json()}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        return {"exists": await profiles.user(upstream, user_id)}
 
     except Exception as e:
         logger.error(f'Error in check_user_handler: {e}')
@@ -52,16 +48,19 @@ async def check_user_handler(
 @router.put("/register")
 async def register_user_handler(
         user_data: Profile,
+        upstream: UpstreamClients = Depends(get_upstream),
+        profiles: ProfileCache = Depends(get_profile_cache),
 ):
     # Сохранение в базу данных профиля пользователя
     try:
-        async with httpx.AsyncClient() as client:
-            url = config.gateway.url + f'/api/update_profile'
-            resp = await client.put(url=url, content=user_data.model_dump_json())
-            if resp.status_code == 200:
-                return 200
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        url = f'/api/update_profile'
+        resp = await upstream.gateway.put(url=url, content=user_data.model_dump_json())
+        # Сбрасываем и при ошибке: запись могла измениться частично
+        profiles.invalidate(user_data.user_id)
+        if resp.status_code == 200:
+            return 200
+        else:
+            raise HTTPException(status_code=resp.status_code, detail=resp.text)
 
     except Exception as e:
         logger.error(f'Error in register_user_handler: {e}')
@@ -71,35 +70,27 @@ async def register_user_handler(
 async def create_token_handler(
         user_id: int = Query(..., description="ID пользователя"),
         room_id: str = Query(..., description="Уникальный идентификатор комнаты"),
+        upstream: UpstreamClients = Depends(get_upstream),
+        profiles: ProfileCache = Depends(get_profile_cache),
 ):
     """ Обработчик создания токена """
     try:
-        async with httpx.AsyncClient() as client:
+        # Никнейм берется из кэша профилей, gateway - только при промахе
+        nickname = await profiles.nickname(upstream, user_id)
 
-            url = config.gateway.url + \
-                  f'/api/users?user_id={user_id}&target_field=nickname'
+        if not nickname or not room_id:
+            raise HTTPException(status_code=400, detail=f"Missing parameters: {nickname}, {room_id}")
 
-            resp = await client.get(url=url)
-            if resp.status_code == 200:
+        # Создает токен для аутентификации сессии
+        token = await create_token(user_id, nickname, room_id)
+        return {"token": token}
 
-                # Извлекает данные с gateway сервера
-                data = resp.json()
-                nickname = data.get('nickname')
-
-                if not nickname or not room_id:
-                    raise HTTPException(status_code=400, detail=f"Missing parameters: {nickname}, {room_id}")
-
-                # Создает токен для аутентификации сессии
-                token = await create_token(user_id, nickname, room_id)
-                return {"token": token}
-            else:
-                raise HTTPException(
-                    status_code=resp.status_code, detail=resp.text
-                )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
 
     except FailToCreateToken:
         raise HTTPException(status_code=500, detail="Error creating token")
 
     except Exception as e:
         logger.error(f"Error in create_token_handler: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
@@ -1,19 +1,28 @@
 import json
 from datetime import datetime
-from typing import TYPE_CHECKING, Optional, Dict
+from typing import TYPE_CHECKING, Optional, List, Tuple
 
-import httpx
 from fastapi import WebSocket, APIRouter, Query, WebSocketDisconnect, HTTPException
 from starlette import status
 
 from src.config import config
-from src.dependencies import get_ws_connection
+from src.dependencies import (
+    get_ws_connection, get_queue_notifier, get_message_writer, get_history_cache, get_chat_rate_limiter
+)
 from src.logconf import opt_logger as log
 from src.models import MessageContent
-from src.validators.tokens import convert_token, validate_access
+from src.services.frames import negotiate, wrap
+from src.services.metrics import chat_messages
+from src.exc import InvalidToken
+from src.validators.tokens import token_verifier
 
 if TYPE_CHECKING:
     from src.services.connection import ConnectionService
+    from src.services.history import HistoryCache
+    from src.services.persistence import MessageWriter
+    from src.services.queue import QueueNotifier
+    from src.services.ratelimit import ChatRateLimiter
+    from src.services.rooms import Member
 
 
 router = APIRouter()
@@ -26,36 +35,36 @@ async def websocket_chat(
         websocket: WebSocket,
         room_id: str = Query(..., alias="room_id"),
         token: str = Query(..., alias="token"),
+        since: Optional[str] = Query(None, description="created_at последнего полученного сообщения"),
+        limit: Optional[int] = Query(None, description="Размер страницы истории"),
 ):
     """Обработчик подключения клиента к чату"""
 
-    logger.info(f"=== NEW CONNECTION ATTEMPT ===")
-    logger.info(f"Room ID: {room_id}")
+    logger.debug("New connection attempt to room %s", room_id)
 
     connection: "ConnectionService" = await get_ws_connection()
+    limiter: "ChatRateLimiter" = await get_chat_rate_limiter()
 
     try:
-        # Проверяем токен и получаем данные пользователя
-        userdata = convert_token(token)
-        username = userdata["nickname"]
-
-        logger.info(f"User: {username}")
-
-        if not room_id or not username:
+        # Токен декодируется один раз: подпись, срок действия и комната
+        try:
+            userdata = token_verifier.verify(token, room_id)
+        except InvalidToken as e:
+            logger.info("Rejected connection to room %s: %s", room_id, e)
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
-        # Проверка валидности токена и прав доступа к комнате
-        is_valid = await validate_access(token, room_id)
-        if not is_valid:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
+        username = userdata["nickname"]
+
+        # Подпротокол: chat.msgpack - бинарные кадры сервера, chat.json или без него - JSON.
+        # От клиента в обоих случаях ожидаются текстовые JSON-кадры
+        subprotocol = negotiate(websocket.scope.get("subprotocols", ()), config.chat_protocol.msgpack)
 
         # Подключаем пользователя
         success = await connection.connect(websocket, room_id, {
             "nickname": username,
             "token": token
-        })
+        }, subprotocol=subprotocol)
 
         if not success:
             await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
@@ -67,27 +76,41 @@ async def websocket_chat(
             "username": username
         }, websocket)
 
-        # Отправляем историю сообщений
-        history = await get_message_history(room_id)
+        # Отправляем историю сообщений (при since - только пропущенные)
+        history, has_more = await get_message_history(room_id, since=since, limit=limit)
         await connection.send_personal_message({
             "type": "message_history",
-            "messages": history
+            "messages": history,
+            "has_more": has_more,
+            "incremental": since is not None,
         }, websocket)
 
-        logger.info(f"User {username} successfully connected to room {room_id}")
+        logger.info("User %s connected to room %s", username, room_id)
 
         # Основной цикл обработки сообщений
         try:
             while True:
                 # Ожидаем сообщение от клиента
                 data = await websocket.receive_text()
+
+                # Размер проверяется до разбора JSON
+                if limiter.frame_too_large(data):
+                    logger.info("Oversized frame from %s in room %s, closing", username, room_id)
+                    await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                    break
+
                 message_data = json.loads(data)
 
+                # Запрос более старых сообщений
+                if message_data.get("type") == "load_history":
+                    await handle_load_history(websocket, message_data)
+                    continue
+
                 # Обрабатываем отправку сообщения
                 await handle_send_message(websocket, message_data)
 
         except WebSocketDisconnect:
-            logger.info(f"User {username} disconnected from room {room_id}")
+            logger.info("User %s disconnected from room %s", username, room_id)
 
         except Exception as e:
             logger.error(f"Error in WebSocket connection: {e}")
@@ -101,6 +124,31 @@ async def websocket_chat(
         await connection.disconnect(websocket)
 
 
+@router.websocket("/ws/queue")
+async def websocket_queue(
+        websocket: WebSocket,
+        user_id: int = Query(..., alias="user_id"),
+):
+    """Push-канал комнаты ожидания: статус очереди и найденный матч"""
+
+    notifier: "QueueNotifier" = await get_queue_notifier()
+
+    await notifier.subscribe(websocket, user_id)
+    try:
+        # Клиент ничего не отправляет, чтение нужно только для отслеживания отключения
+        while True:
+            await websocket.receive_text()
+
+    except WebSocketDisconnect:
+        logger.debug("Queue subscriber %s disconnected", user_id)
+
+    except Exception as e:
+        logger.error(f"Error in queue WebSocket: {e}")
+
+    finally:
+        await notifier.unsubscribe(websocket, user_id)
+
+
 async def handle_send_message(websocket: WebSocket, message_data: dict):
     """Обработка отправки сообщения"""
 
@@ -111,61 +159,129 @@ async def handle_send_message(websocket: WebSocket, message_data: dict):
     if not session:
         return
 
-    room_id = session.get("room_id")
-    username = session.get("username", "Anonymous")
+    session.touch()
+    room_id = session.room_id
+    username = session.username or "Anonymous"
 
     if not room_id:
         return
 
+    limiter: "ChatRateLimiter" = await get_chat_rate_limiter()
+
+    text = message_data.get("text", "")
+    if isinstance(text, str) and limiter.text_too_long(text):
+        await connection.send_personal_message({
+            "type": "message_rejected",
+            "reason": "text_too_long",
+            "max_length": limiter.max_text_length,
+        }, websocket)
+        return
+
+    if not await _accept_rate(connection, limiter, session, websocket, room=True):
+        return
+
+    chat_messages.inc()
+
     # Создаем объект сообщения
     message_content = MessageContent(
         sender=username,
-        text=message_data.get("text", ""),
+        text=text,
         created_at=datetime.now(
             tz=config.tzinfo
         ).isoformat(timespec="milliseconds"),
         room_id=room_id,
     )
 
-    # Сохранение сообщения в Redis
-    await save_message(message_content)
+    # Сообщение сериализуется один раз: тот же JSON уходит в worker и всем в комнате
+    payload = message_content.model_dump_json()
 
     # Отправка сообщения всем в комнате
-    await connection.broadcast_to_room({
-        "type": "new_message",
-        "message": message_content.model_dump()
-    }, room_id)
+    await connection.broadcast_to_room(wrap("new_message", "message", payload), room_id)
 
+    # Последние сообщения комнаты держим в памяти для переподключений
+    history: "HistoryCache" = await get_history_cache()
+    history.append(room_id, message_content.model_dump())
 
-async def get_message_history(room_id: str) -> Optional[Dict[str, str]]:
-    """Получение истории сообщений"""
-    try:
-        async with httpx.AsyncClient() as client:
-            url = config.worker.url + config.worker.prefix + \
-                  f'/messages?room_id={room_id}'
-            resp = await client.get(url=url)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    # Сохранение сообщения в Redis в фоне, пачками
+    writer: "MessageWriter" = await get_message_writer()
+    writer.submit(room_id, payload)
+
+
+async def handle_load_history(websocket: WebSocket, message_data: dict):
+    """Отправка страницы сообщений старше указанного"""
+
+    connection: "ConnectionService" = await get_ws_connection()
+
+    session = await connection.get_user_session(websocket)
+    if not session:
+        return
+
+    before = message_data.get("before")
+    if not before:
+        return
+
+    # Страницы истории считаются в лимит соединения, но не комнаты
+    limiter: "ChatRateLimiter" = await get_chat_rate_limiter()
+    if not await _accept_rate(connection, limiter, session, websocket, room=False):
+        return
 
+    history: "HistoryCache" = await get_history_cache()
+    try:
+        messages, has_more = await history.older(
+            session.room_id, before, _page_size(message_data.get("limit"))
+        )
     except Exception as e:
-        logger.error(f"Error saving message onto ext server: {e}")
-        raise HTTPException(status_code=500, detail='Internal Server Error')
+        logger.error(f"Error loading older messages: {e}")
+        return
+
+    await connection.send_personal_message({
+        "type": "message_history",
+        "messages": messages,
+        "has_more": has_more,
+        "older": True,
+    }, websocket)
+
+
+async def _accept_rate(
+        connection: "ConnectionService",
+        limiter: "ChatRateLimiter",
+        session: "Member",
+        websocket: WebSocket,
+        room: bool,
+) -> bool:
+    """Проверка лимитов; отклоненное сообщение не обрабатывается, клиент получает rate_limited"""
+    limited = limiter.check(session, room=room)
+    if limited is None:
+        return True
+
+    scope, retry_after = limited
+    if limiter.should_notify(session):
+        await connection.send_personal_message({
+            "type": "rate_limited",
+            "scope": scope,
+            "retry_after": round(retry_after, 3),
+        }, websocket)
+    return False
+
+
+def _page_size(limit: Optional[int]) -> int:
+    """Размер страницы истории с ограничением сверху"""
+    if not isinstance(limit, int) or limit <= 0:
+        return config.history.page_size
+    return min(limit, config.history.max_page_size)
 
 
-async def save_message(message_data: "MessageContent"):
-    """Сохранение сообщения в Redis"""
+async def get_message_history(
+        room_id: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+) -> Tuple[List[dict], bool]:
+    """Получение истории сообщений"""
+    history: "HistoryCache" = await get_history_cache()
+
     try:
-        async with httpx.AsyncClient() as client:
-            url = config.worker.url + config.worker.prefix + \
-                  f'/messages?room_id={message_data.room_id}'
-            resp = await client.post(url=url, content=message_data.model_dump_json())
-            if resp.status_code == 200:
-                return 200
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        return await history.recent(room_id, _page_size(limit), since=since)
 
     except Exception as e:
-        logger.error(f"Error saving message onto ext server: {e}")
-        raise HTTPException(status_code=500, detail='Internal Server Error')
\ No newline at end of file
+        logger.error(f"Error loading message history: {e}")
+        raise HTTPException(status_code=500, detail='Internal Server Error')
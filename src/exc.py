@@ -2,4 +2,19 @@ class PaymentException(Exception):
     pass
 
 class FailToCreateToken(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class InvalidToken(Exception):
+    pass
+
+class BackplaneError(Exception):
+    pass
+
+class SearchSuperseded(Exception):
+    pass
+
+class AudioTooLarge(Exception):
+    pass
+
+class UnsupportedAudio(Exception):
+    pass
@@ -1,8 +1,20 @@
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
 
 from colorama import init, Fore, Style
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from config import config
 
 
@@ -137,4 +149,177 @@ class CustomLogger:
         return logging.getLevelName(level)
 
 
-opt_logger = RootLogger() if config.debug else  CustomLogger()
\ No newline at end of file
+# Стандартные атрибуты LogRecord, все остальное пришло через extra=.
+# color_message - копия сообщения с ANSI-цветами от uvicorn
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'color_message'}
+
+
+class DebugSampler(logging.Filter):
+    """Пропускает только долю DEBUG-записей, остальные уровни - всегда"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Кладет запись в очередь без форматирования; при переполнении запись отбрасывается"""
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def handle(self, record):
+        # Очередь потокобезопасна, блокировка обработчика не нужна
+        if self.filters and not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def prepare(self, record):
+        # Сообщение собирается здесь: args могут быть изменяемыми объектами,
+        # которые вызывающий код поменяет раньше, чем запись дойдет до потока вывода.
+        # Трассировка тоже: она держит кадры стека живыми
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # Граница приблизительная: qsize у SimpleQueue без блокировок
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class JsonLogWriter:
+    """Поток вывода: забирает записи из очереди пачками и пишет пачку одним вызовом write"""
+
+    def __init__(self, log_queue: queue.SimpleQueue, stream, batch_size: int = 512):
+        self.queue = log_queue
+        self.stream = stream
+        self.batch_size = batch_size
+        self.formatter = JsonFormatter()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Дописывает очередь и останавливает поток"""
+        if self._thread is None:
+            return
+        self.queue.put_nowait(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            for record in batch:
+                if record is None:
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    lines.append(f'{{"level":"ERROR","logger":"logconf","msg":"unformattable record from {record.name}"}}')
+            if lines:
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except Exception:
+                    pass
+
+            if batch[-1] is None:
+                return
+
+
+class QueueLogger:
+    """ Логгер для production: записи уходят в очередь, JSON и запись в stdout - в отдельном потоке """
+
+    def __init__(self, queue_size: int = config.logging.queue_size,
+                 debug_sample_rate: float = config.logging.debug_sample_rate):
+        self.queue = queue.SimpleQueue()
+        self.handler = NonBlockingQueueHandler(self.queue, queue_size)
+        if debug_sample_rate < 1.0:
+            self.handler.addFilter(DebugSampler(debug_sample_rate))
+
+        self.listener = JsonLogWriter(self.queue, sys.stdout)
+        self.listener.start()
+        # Дописываем оставшиеся в очереди записи при выходе
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Останавливает поток вывода, дождавшись записи очереди"""
+        self.listener.stop()
+
+    def stats(self) -> dict:
+        return {
+            "dropped": self.handler.dropped,
+        }
+
+    def setup_logger(self, name=None, level: str | int = config.log_level):
+        """Логгер, пишущий через общую очередь"""
+        logger = logging.getLogger(name)
+        logger.setLevel(self.convert_level(level))
+        logger.handlers.clear()
+        logger.addHandler(self.handler)
+        logger.propagate = False
+        return logger
+
+    @staticmethod
+    def convert_level(level):
+        """Возвращает числовое значение"""
+        if isinstance(level, str):
+            level = level.upper()
+        return logging.getLevelName(level)
+
+
+def _create_logger():
+    if config.debug:
+        return RootLogger()
+    if config.logging.format == 'json':
+        return QueueLogger()
+    return CustomLogger()
+
+
+opt_logger = _create_logger()
\ No newline at end of file
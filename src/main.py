@@ -1,19 +1,59 @@
-import uvicorn
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from src.config import config
+from src.endpoints.audio import router as audio
 from src.endpoints.dictionary import router as dictionary
+from src.endpoints.health import router as health
+from src.endpoints.metrics import router as metrics
 from src.endpoints.waiting_room import router as wait_router
 from src.endpoints.matchmaking import router as match_router
 from src.endpoints.websockets import router as websockets
 
 from src.logconf import opt_logger as log
+from src.services.connection import connection_service
+from src.services.history import history_cache
+from src.services.lifecycle import lifecycle_manager
+from src.services.metrics import MetricsMiddleware, loop_lag_monitor
+from src.services.persistence import message_writer
+from src.services.queue import queue_notifier
+from src.services.upstream import upstream_clients
+from src.services.words import words_cache
 
 logger = log.setup_logger("main")
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Открывает общие ресурсы при старте и закрывает при остановке"""
+    await upstream_clients.start()
+    # Сообщения из других процессов тоже попадают в кэш истории
+    connection_service.add_remote_listener(history_cache.observe_frame)
+    # session_ended из другого процесса закрывает и местных участников
+    connection_service.add_remote_listener(lifecycle_manager.observe_frame)
+    # Изменения слов в одном процессе сбрасывают кэш словарей во всех
+    words_cache.attach(connection_service.backplane)
+    await connection_service.start()
+    await message_writer.start()
+    await lifecycle_manager.start()
+    if config.metrics.enabled:
+        await loop_lag_monitor.start()
+    try:
+        yield
+    finally:
+        await loop_lag_monitor.close()
+        await lifecycle_manager.close()
+        await queue_notifier.close()
+        await connection_service.close()
+        # Сохраняем буфер сообщений до закрытия пулов соединений
+        await message_writer.close()
+        await upstream_clients.close()
+
+
 # Создаем единственный экземпляр FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware, # noqa
     allow_origins=["*"],
@@ -21,18 +61,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+if config.metrics.enabled:
+    # Последним, чтобы время запроса включало все остальные middleware
+    app.add_middleware(MetricsMiddleware) # noqa
 
 # Подключаем роутеры
 app.include_router(dictionary)
+app.include_router(audio)
+app.include_router(health)
+if config.metrics.enabled:
+    app.include_router(metrics)
 app.include_router(wait_router)
 app.include_router(match_router)
 app.include_router(websockets)
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host=config.this_host,
-        port=config.this_port,
-        reload=True,
-    )
\ No newline at end of file
+    from src.server import run
+    run()
@@ -1,10 +1,12 @@
 __all__ = [
     'Word',
+    'WordOperation',
+    'WordBatch',
     'Profile',
     'MessageContent',
     'UserIdRequest',
     'MatchRequestModel'
 ]
 
-from .dict_models import Word, Profile
+from .dict_models import Word, WordOperation, WordBatch, Profile
 from .chat_models import MessageContent, UserIdRequest, MatchRequestModel
\ No newline at end of file
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class Word(BaseModel):
@@ -12,7 +12,38 @@ class Word(BaseModel):
     translations: Optional[dict] = Field(None, description="Перевод слова")
     is_public: bool = Field(False, description="Видно ли слово остальным пользователям")
     context: Optional[str] = Field(None, description="Контекст к слову")
-    audio: Optional[bytes] = Field(None, description="bytes of audio recording")
+    audio: Optional[str] = Field(None, max_length=2048, description="id записи из /api/audio или ее URL")
+
+
+class WordOperation(BaseModel):
+    """
+    Одна операция пакетного изменения словаря
+    """
+    op: Literal["create", "update", "delete"] = Field(..., description="Тип операции")
+    word: Optional[Word] = Field(None, description="Слово для create и update")
+    user_id: Optional[int] = Field(None, description="Владелец слова, по умолчанию word.user_id")
+    word_id: Optional[int] = Field(None, description="Word ID в БД, обязателен для delete")
+
+    @model_validator(mode="after")
+    def check_fields(self) -> "WordOperation":
+        if self.op == "delete":
+            if self.user_id is None or self.word_id is None:
+                raise ValueError("delete requires user_id and word_id")
+        else:
+            if self.word is None:
+                raise ValueError(f"{self.op} requires word")
+            if self.user_id is None:
+                self.user_id = self.word.user_id
+            elif self.user_id != self.word.user_id:
+                raise ValueError("user_id does not match word.user_id")
+        return self
+
+
+class WordBatch(BaseModel):
+    """
+    Пакет операций со словарем
+    """
+    operations: List[WordOperation] = Field(..., min_length=1, description="Операции в порядке выполнения")
 
 
 class Profile(BaseModel):
@@ -0,0 +1,143 @@
+"""
+Запуск сервиса.
+
+    python src/server.py                     # production
+    SERVER_RELOAD=true python src/server.py  # разработка, перезапуск при изменениях
+
+Как и src/main.py, запускается файлом: каталог src должен быть в sys.path.
+"""
+import os
+import socket
+from importlib.util import find_spec
+from typing import List, Optional
+
+import uvicorn
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from uvicorn.supervisors import Multiprocess
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.backplane import create_backplane
+
+logger = log.setup_logger('server')
+
+APP = "main:app"
+
+# Логи uvicorn идут через тот же вывод, что и логи приложения.
+# На INFO uvicorn пишет каждое подключение WebSocket вместе с токеном в query
+for _name in ('uvicorn', 'uvicorn.error', 'uvicorn.access'):
+    log.setup_logger(_name, level=config.log_level if config.server.access_log else 'WARNING')
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server, который перед остановкой отправляет очереди WebSocket"""
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None):
+        # Сначала перестаем принимать соединения, новые клиенты уходят к другим процессам
+        for server in self.servers:
+            server.close()
+        for sock in sockets or []:
+            sock.close()
+
+        from src.services.connection import connection_service
+        await connection_service.drain(config.server.drain_timeout)
+
+        await super().shutdown(sockets)
+
+
+class ChatWebSocketProtocol(WebSocketProtocol):
+    """Протокол websockets из uvicorn с настроенным permessage-deflate.
+    uvicorn включает сжатие с параметрами zlib по умолчанию: окно 15 бит и memLevel 8
+    дают около 100 КБ на соединение, 12 и 5 - около 35 КБ"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        settings = config.server
+        self.available_extensions = [
+            ServerPerMessageDeflateFactory(
+                server_max_window_bits=settings.ws_deflate_window_bits,
+                compress_settings={"memLevel": settings.ws_deflate_mem_level},
+            )
+        ] if settings.ws_deflate else []
+
+
+def _available_cpus() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def resolve_workers(requested: str, shared_state: bool) -> int:
+    """Число процессов. Несколько процессов - только при общем состоянии комнат"""
+    if not requested:
+        workers = _available_cpus() if shared_state else 1
+    else:
+        workers = _available_cpus() if requested == 'auto' else int(requested)
+
+    if workers > 1 and not shared_state:
+        raise SystemExit(
+            f'SERVER_WORKERS={workers} requires a shared backplane: '
+            f'with BACKPLANE={config.backplane.backend} rooms and presence live in one process. '
+            f'Set BACKPLANE=redis or run a single worker.'
+        )
+    return max(workers, 1)
+
+
+def resolve_implementation(choice: str, fast: str, fallback: str, setting: str) -> str:
+    """auto выбирает быструю реализацию, если она установлена"""
+    if choice == 'auto':
+        return fast if find_spec(fast) is not None else fallback
+    if choice == fast and find_spec(fast) is None:
+        raise SystemExit(f'{setting}={choice}, but {fast} is not installed')
+    return choice
+
+
+def build_config(workers: int) -> uvicorn.Config:
+    settings = config.server
+    return uvicorn.Config(
+        APP,
+        host=config.this_host,
+        port=config.this_port,
+        loop=resolve_implementation(settings.loop, 'uvloop', 'asyncio', 'SERVER_LOOP'),
+        http=resolve_implementation(settings.http, 'httptools', 'h11', 'SERVER_HTTP'),
+        ws=ChatWebSocketProtocol,
+        ws_ping_interval=settings.ws_ping_interval,
+        ws_ping_timeout=settings.ws_ping_timeout,
+        # Слишком большой кадр отклоняется протоколом до сборки в памяти
+        ws_max_size=config.chat_limits.max_frame_size,
+        workers=workers,
+        backlog=settings.backlog,
+        timeout_keep_alive=settings.keepalive,
+        timeout_graceful_shutdown=settings.graceful_timeout,
+        access_log=settings.access_log,
+        log_config=None,
+    )
+
+
+def run():
+    settings = config.server
+
+    if settings.reload:
+        logger.warning('Reload mode: single process, not for production')
+        uvicorn.run(APP, host=config.this_host, port=config.this_port, reload=True)
+        return
+
+    # Backplane только создается, без подключения: нужен лишь тип состояния комнат
+    workers = resolve_workers(settings.workers, create_backplane().is_shared)
+    server_config = build_config(workers)
+    server = DrainingServer(server_config)
+
+    logger.info(
+        'Starting %s worker(s) on %s:%s (loop: %s, http: %s)',
+        workers, config.this_host, config.this_port, server_config.loop, server_config.http,
+    )
+    if workers > 1:
+        sock = server_config.bind_socket()
+        Multiprocess(server_config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from src.config import config
+from src.exc import AudioTooLarge, UnsupportedAudio
+from src.logconf import opt_logger as log
+
+logger = log.setup_logger('audio')
+
+# Сигнатуры поддерживаемых форматов: (смещение, байты, content-type)
+AUDIO_SIGNATURES = (
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'\x1a\x45\xdf\xa3', 'audio/webm'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'\xff\xfb', 'audio/mpeg'),
+    (0, b'\xff\xf3', 'audio/mpeg'),
+    (0, b'\xff\xf1', 'audio/aac'),
+    (0, b'fLaC', 'audio/flac'),
+    (4, b'ftyp', 'audio/mp4'),
+    (8, b'WAVE', 'audio/wav'),
+)
+
+
+def detect_content_type(head: bytes) -> Optional[str]:
+    """Определяет формат записи по первым байтам"""
+    for offset, signature, content_type in AUDIO_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return content_type
+    return None
+
+
+class AudioBlob:
+    """ Открытая запись хранилища, читается через mmap """
+
+    __slots__ = ('audio_id', 'size', 'content_type', '_file', '_map')
+
+    def __init__(self, audio_id: str, path: str):
+        self.audio_id = audio_id
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.size = len(self._map)
+        self.content_type = detect_content_type(self._map[:16]) or 'application/octet-stream'
+
+    def iter_range(self, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+        """Отдает байты [start, end] кусками и закрывает запись"""
+        try:
+            position = start
+            while position <= end:
+                stop = min(position + chunk_size, end + 1)
+                yield self._map[position:stop]
+                position = stop
+        finally:
+            self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# Хранилище аудиозаписей слов. Записи адресуются sha256 содержимого,
+# поэтому одинаковые записи хранятся один раз и никогда не меняются
+class AudioStore(ABC):
+    @abstractmethod
+    async def save(self, chunks: AsyncIterator[bytes], max_bytes: int) -> Tuple[str, int, str]:
+        """Сохраняет запись из потока. Возвращает (audio_id, размер, content-type)"""
+
+    @abstractmethod
+    async def open(self, audio_id: str) -> Optional[AudioBlob]:
+        """Открывает запись для чтения, None если ее нет"""
+
+
+# Хранилище на локальном диске: root/ab/abcdef...
+class LocalAudioStore(AudioStore):
+    def __init__(self, root: str):
+        self.root = root
+        self._tmp = os.path.join(root, 'tmp')
+
+    def _path(self, audio_id: str) -> str:
+        return os.path.join(self.root, audio_id[:2], audio_id)
+
+    async def save(self, chunks: AsyncIterator[bytes], max_bytes: int) -> Tuple[str, int, str]:
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+
+        os.makedirs(self._tmp, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise AudioTooLarge(f'Audio is larger than {max_bytes} bytes')
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    await asyncio.to_thread(tmp.write, chunk)
+
+            content_type = detect_content_type(head)
+            if content_type is None:
+                raise UnsupportedAudio('Unknown audio format')
+
+            audio_id = digest.hexdigest()
+            path = self._path(audio_id)
+            if os.path.exists(path):
+                # Такая запись уже есть
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return audio_id, size, content_type
+
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def open(self, audio_id: str) -> Optional[AudioBlob]:
+        try:
+            return AudioBlob(audio_id, self._path(audio_id))
+        except FileNotFoundError:
+            return None
+
+
+def create_audio_store() -> AudioStore:
+    """Создает хранилище по настройкам AUDIO_STORE"""
+    settings = config.audio
+    if settings.backend == 'local':
+        logger.info(f'Using local audio store at {settings.path}')
+        return LocalAudioStore(settings.path)
+    raise ValueError(f'Unknown audio store backend: {settings.backend}')
+
+
+# Глобальный экземпляр хранилища аудио
+audio_store = create_audio_store()
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.config import config
+from src.exc import BackplaneError
+from src.logconf import opt_logger as log
+from src.services.frames import dumps
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import WatchError
+except ImportError:
+    aioredis = None
+
+    class WatchError(Exception):
+        pass
+
+logger = log.setup_logger('backplane')
+
+# (room_id, frame, exclude_username) -> доставка локальным участникам комнаты
+DeliverHandler = Callable[[str, str, Optional[str]], Awaitable[None]]
+# key -> сброс записи локального кэша
+InvalidationListener = Callable[[str], None]
+
+
+class Backplane(ABC):
+    """ Общие для всех процессов участники комнат и рассылка сообщений """
+
+    @abstractmethod
+    async def start(self, deliver: DeliverHandler):
+        """Подписывается на сообщения, опубликованные другими процессами"""
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def join(self, room_id: str, username: str):
+        pass
+
+    @abstractmethod
+    async def leave(self, room_id: str, username: str):
+        pass
+
+    @abstractmethod
+    async def members(self, room_id: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def publish(self, room_id: str, frame: str, exclude: Optional[str] = None):
+        """Передает закодированный кадр остальным процессам. Локальная доставка на стороне вызывающего"""
+
+    @abstractmethod
+    def add_invalidation_listener(self, scope: str, listener: InvalidationListener):
+        """Подписывает локальный кэш scope на сбросы, опубликованные другими процессами"""
+
+    @abstractmethod
+    async def invalidate(self, scope: str, key: str):
+        """Передает сброс записи кэша scope остальным процессам. Свой кэш сбрасывает вызывающий"""
+
+    @property
+    def is_shared(self) -> bool:
+        """Разделяется ли состояние между процессами"""
+        return False
+
+
+class InMemoryBackplane(Backplane):
+    """ Один процесс: участники комнат хранятся в самом ConnectionService """
+
+    async def start(self, deliver: DeliverHandler):
+        pass
+
+    async def close(self):
+        pass
+
+    async def join(self, room_id: str, username: str):
+        pass
+
+    async def leave(self, room_id: str, username: str):
+        pass
+
+    async def members(self, room_id: str) -> List[str]:
+        return []
+
+    async def publish(self, room_id: str, frame: str, exclude: Optional[str] = None):
+        # Других процессов нет
+        pass
+
+    def add_invalidation_listener(self, scope: str, listener: InvalidationListener):
+        pass
+
+    async def invalidate(self, scope: str, key: str):
+        pass
+
+
+class RedisBackplane(Backplane):
+    """ Участники комнат в Redis hash, рассылка через Redis pub/sub """
+
+    def __init__(self, client=None, url: str = None, channel: str = None, presence_ttl: int = None,
+                 reconnect_delay: float = None, reconnect_max_delay: float = None):
+        if client is None and aioredis is None:
+            raise BackplaneError('redis package is required for the redis backplane')
+
+        self._redis = client
+        self._url = url or config.backplane.redis_url
+        self.channel = channel or config.backplane.channel
+        self.presence_ttl = presence_ttl or config.backplane.presence_ttl
+        self.reconnect_delay = reconnect_delay or config.backplane.reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay or config.backplane.reconnect_max_delay
+
+        # Уникальный идентификатор процесса, чтобы не доставлять свои же сообщения
+        self.node_id = uuid.uuid4().hex
+        self._deliver: Optional[DeliverHandler] = None
+        # scope -> подписанные локальные кэши
+        self._invalidation_listeners: Dict[str, List[InvalidationListener]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_shared(self) -> bool:
+        return True
+
+    def _room_key(self, room_id: str) -> str:
+        return f'{self.channel}:room:{room_id}'
+
+    async def start(self, deliver: DeliverHandler):
+        if self._redis is None:
+            self._redis = aioredis.from_url(self._url, decode_responses=True)
+
+        self._deliver = deliver
+        await self._subscribe()
+        self._task = asyncio.create_task(self._listen())
+        logger.info(f'Redis backplane started (node {self.node_id})')
+
+    async def _subscribe(self):
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(self.channel)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self.channel)
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.warning(f'Error closing backplane subscription: {e}')
+            self._pubsub = None
+
+    async def _listen(self):
+        """Читает канал; после обрыва переподписывается с растущей задержкой.
+        Сообщения, опубликованные во время обрыва, теряются"""
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    delay = self.reconnect_delay
+                    await self._handle(item)
+                raise ConnectionError('subscription closed')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'Backplane subscription lost, resubscribing in {delay:.1f}s: {e}')
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+            try:
+                await self._subscribe()
+                logger.info('Backplane resubscribed')
+            except Exception as e:
+                # Следующий проход listen() упадет сразу и подождет дольше
+                logger.error(f'Backplane resubscribe failed: {e}')
+
+    async def _handle(self, item: dict):
+        if item.get('type') != 'message':
+            return
+
+        try:
+            envelope = json.loads(item['data'])
+            if envelope.get('origin') == self.node_id:
+                return
+
+            scope = envelope.get('invalidate')
+            if scope is not None:
+                for listener in self._invalidation_listeners.get(scope, ()):
+                    listener(envelope['key'])
+                return
+
+            await self._deliver(envelope['room_id'], envelope['frame'], envelope.get('exclude'))
+
+        except Exception as e:
+            logger.error(f'Error delivering backplane message: {e}')
+
+    async def join(self, room_id: str, username: str):
+        key = self._room_key(room_id)
+        await self._redis.hset(key, username, self.node_id)
+        # Защита от утечки, если процесс упал не отписавшись
+        await self._redis.expire(key, self.presence_ttl)
+
+    async def leave(self, room_id: str, username: str):
+        # Удаляем только свою запись: переподключение к другому процессу
+        # могло уже записать туда свой node_id
+        key = self._room_key(room_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if await pipe.hget(key, username) != self.node_id:
+                        await pipe.unwatch()
+                        return
+                    pipe.multi()
+                    pipe.hdel(key, username)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    # Hash изменился между проверкой и удалением, проверяем заново
+                    continue
+
+    async def members(self, room_id: str) -> List[str]:
+        return list(await self._redis.hkeys(self._room_key(room_id)))
+
+    async def publish(self, room_id: str, frame: str, exclude: Optional[str] = None):
+        envelope = {
+            "origin": self.node_id,
+            "room_id": room_id,
+            "frame": frame,
+            "exclude": exclude,
+        }
+        await self._redis.publish(self.channel, dumps(envelope))
+
+    def add_invalidation_listener(self, scope: str, listener: InvalidationListener):
+        self._invalidation_listeners.setdefault(scope, []).append(listener)
+
+    async def invalidate(self, scope: str, key: str):
+        envelope = {
+            "origin": self.node_id,
+            "invalidate": scope,
+            "key": key,
+        }
+        await self._redis.publish(self.channel, dumps(envelope))
+
+
+def create_backplane() -> Backplane:
+    """Создает backplane по настройке BACKPLANE"""
+    backend = config.backplane.backend.lower()
+    if backend == 'memory':
+        return InMemoryBackplane()
+    if backend == 'redis':
+        return RedisBackplane()
+
+    raise BackplaneError(f'Unknown backplane backend: {backend}')
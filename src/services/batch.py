@@ -0,0 +1,145 @@
+import asyncio
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.models.dict_models import WordOperation
+from src.services.frames import dumps
+from src.services.upstream import UpstreamClients
+
+logger = log.setup_logger('batch')
+
+# Статус операций, не выполненных из-за ошибки предыдущей операции над тем же словом
+FAILED_DEPENDENCY = 424
+
+
+def _target(index: int, operation: WordOperation) -> Tuple[Hashable, ...]:
+    """Слово, к которому относится операция. Операции над одним словом выполняются по порядку"""
+    if operation.word_id is not None:
+        return operation.user_id, 'id', operation.word_id
+    if operation.word is not None and operation.word.word:
+        return operation.user_id, 'word', operation.word.word.lower()
+    return 'single', index
+
+
+def _chains(targets: List[Tuple[Hashable, ...]]) -> Dict[Hashable, List[int]]:
+    """Группирует операции в цепочки, выполняемые последовательно.
+    Слово по тексту и по word_id не сопоставить без запроса к gateway, поэтому
+    если у пользователя в пакете есть оба вида ключей, все его операции идут одной цепочкой"""
+    keys: Dict[Hashable, Set[str]] = {}
+    for target in targets:
+        if target[0] != 'single':
+            keys.setdefault(target[0], set()).add(target[1])
+    mixed = {user_id for user_id, kinds in keys.items() if len(kinds) > 1}
+
+    chains: Dict[Hashable, List[int]] = {}
+    for index, target in enumerate(targets):
+        key = (target[0], 'all') if target[0] in mixed else target
+        chains.setdefault(key, []).append(index)
+    return chains
+
+
+# Выполнение пакета операций со словарем через gateway.
+# Операции группируются по слову: над одним словом - последовательно,
+# над разными - параллельно, но не больше BATCH_CONCURRENCY запросов сразу
+# на все пакеты. Подряд идущие update одного слова схлопываются в последний:
+# PUT gateway заменяет слово целиком, поэтому результат тот же, что у
+# выполнения каждого update по очереди. Поля, не переданные в последнем
+# update, не берутся из предыдущих
+class WordBatchRunner:
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.operations = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    async def run(self, upstream: UpstreamClients, operations: List[WordOperation]) -> List[dict]:
+        """Выполняет операции, возвращает результат для каждой в исходном порядке"""
+        results: List[Optional[dict]] = [None] * len(operations)
+
+        targets = [_target(index, operation) for index, operation in enumerate(operations)]
+        chains = _chains(targets)
+
+        # Схлопываем update, за которым сразу следует update того же слова
+        merged_into: Dict[int, int] = {}
+        for key, chain in chains.items():
+            kept = []
+            for index in chain:
+                previous = kept[-1] if kept else None
+                if (previous is not None and targets[previous] == targets[index]
+                        and operations[previous].op == 'update' and operations[index].op == 'update'):
+                    merged_into[kept.pop()] = index
+                kept.append(index)
+            chains[key] = kept
+
+        self.operations += len(operations)
+        self.coalesced += len(merged_into)
+
+        await asyncio.gather(*(
+            self._run_chain(upstream, operations, chain, results) for chain in chains.values()
+        ))
+
+        for index, target in merged_into.items():
+            # Цепочка схлопываний может быть длинной, итог берется у последней операции
+            while target in merged_into:
+                target = merged_into[target]
+            results[index] = {**results[target], "index": index, "coalesced": True}
+
+        return results
+
+    async def _run_chain(self, upstream: UpstreamClients, operations: List[WordOperation],
+                         chain: List[int], results: List[Optional[dict]]):
+        failed = False
+        for index in chain:
+            operation = operations[index]
+            if failed:
+                results[index] = self._result(index, operation, FAILED_DEPENDENCY, "Previous operation failed")
+                continue
+
+            async with self._semaphore:
+                results[index] = await self._execute(upstream, index, operation)
+            if not results[index]["ok"]:
+                failed = True
+                self.failed += 1
+
+    async def _execute(self, upstream: UpstreamClients, index: int, operation: WordOperation) -> dict:
+        params = {"user_id": operation.user_id}
+        try:
+            if operation.op == 'delete':
+                params["word_id"] = operation.word_id
+                resp = await upstream.gateway.delete(url='/api/words', params=params)
+            elif operation.op == 'create':
+                resp = await upstream.gateway.post(
+                    url='/api/words', params=params, content=operation.word.model_dump_json()
+                )
+            else:
+                data = operation.word.model_dump(mode='json')
+                if operation.word_id is not None:
+                    data["word_id"] = operation.word_id
+                resp = await upstream.gateway.put(url='/api/words', params=params, content=dumps(data))
+
+        except Exception as e:
+            logger.warning(f'Batch {operation.op} failed: {e!r}')
+            return self._result(index, operation, 502, "Gateway is not available")
+
+        detail = None if resp.status_code == 200 else resp.text
+        return self._result(index, operation, resp.status_code, detail)
+
+    @staticmethod
+    def _result(index: int, operation: WordOperation, status: int, detail: Optional[str]) -> dict:
+        result = {"index": index, "op": operation.op, "status": status, "ok": status == 200}
+        if detail:
+            result["detail"] = detail
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "operations": self.operations,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
+
+
+# Глобальный экземпляр, ограничение параллельности общее для всех пакетов
+word_batch_runner = WordBatchRunner(config.batch.concurrency)
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Callable, List, Optional
+
+from src.services.frames import join_messages
+from src.services.rooms import Room
+
+# Окно, за которое считается частота сообщений комнаты
+RATE_WINDOW = 1.0
+
+
+class RoomBatch:
+    """ Частота сообщений комнаты и накопленные кадры new_message """
+
+    __slots__ = ('window_start', 'count', 'active', 'frames', 'timer')
+
+    def __init__(self, now: float):
+        self.window_start = now
+        self.count = 0
+        # Частота выше порога: сообщения копятся в пачки
+        self.active = False
+        self.frames: List[str] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+# Микро-пачки сообщений для частых комнат. Пока сообщений в комнате
+# меньше threshold в секунду, кадры уходят сразу, как раньше. Выше порога
+# сообщения за window секунд склеиваются в один кадр new_messages:
+# меньше кадров и системных вызовов на каждого получателя, задержка не больше window
+class MessageBatcher:
+    def __init__(self, deliver: Callable[[Room, str], None], window: float, max_size: int, threshold: float):
+        # Синхронная раскладка готового кадра по очередям участников комнаты
+        self.deliver = deliver
+        self.window = window
+        self.max_size = max_size
+        self.threshold = threshold
+
+        self.batches = 0
+        self.batched_messages = 0
+
+    def offer(self, room: Room, frame: str, now: float) -> bool:
+        """Кадр new_message; True - кадр отложен в пачку, False - доставить сразу"""
+        batch = room.batch
+        if batch is None:
+            batch = room.batch = RoomBatch(now)
+
+        if now - batch.window_start >= RATE_WINDOW:
+            # Пачки остаются включенными, пока комната держит частоту
+            batch.active = batch.count >= self.threshold * (now - batch.window_start)
+            batch.window_start = now
+            batch.count = 0
+        batch.count += 1
+        if not batch.active and batch.count >= self.threshold * RATE_WINDOW:
+            batch.active = True
+
+        # Уже начатая пачка дособирается, чтобы не нарушить порядок сообщений
+        if not batch.active and not batch.frames:
+            return False
+
+        batch.frames.append(frame)
+        if len(batch.frames) >= self.max_size:
+            self.flush(room)
+        elif batch.timer is None:
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self.flush, room)
+        return True
+
+    def flush(self, room: Room):
+        """Отправляет накопленное: одно сообщение - прежним кадром, несколько - new_messages"""
+        batch = room.batch
+        if batch is None or not batch.frames:
+            return
+
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        frames, batch.frames = batch.frames, []
+
+        if len(frames) == 1:
+            self.deliver(room, frames[0])
+            return
+
+        self.batches += 1
+        self.batched_messages += len(frames)
+        self.deliver(room, join_messages(frames))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "batched_messages": self.batched_messages,
+        }
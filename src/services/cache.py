@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from src.config import config
+from src.logconf import opt_logger as log
+
+logger = log.setup_logger('cache')
+
+
+# Кэш идемпотентных GET-запросов: одинаковые запросы в полете
+# объединяются в один, результат живет в памяти короткое время
+class CoalescingCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, value)
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        # key -> задача, загружающая значение
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]],
+            ttl: Optional[float] = None,
+    ) -> Any:
+        """Возвращает значение из кэша либо загружает его через loader"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._load(key, loader, ttl))
+            # Исключение забирается здесь, если все ожидающие были отменены
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+
+        # Отмена одного запроса не должна прерывать загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def coalesce(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Только объединение одновременных загрузок: результат не хранится и
+        не учитывается в hits/misses. Для кэшей, которые хранят значения сами"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, 0))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]):
+        try:
+            value = await loader()
+            ttl = self.ttl if ttl is None else ttl
+            # None, исключения и значения без срока жизни не кэшируются
+            if value is not None and ttl > 0:
+                self._store(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        self._entries[key] = (now + ttl, value)
+
+        if len(self._entries) > self.max_entries:
+            # Сначала удаляем устаревшие записи, затем самые старые
+            for stale in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+
+# Глобальный экземпляр кэша
+upstream_cache = CoalescingCache(ttl=config.cache.ttl, max_entries=config.cache.max_entries)
@@ -1,133 +1,276 @@
-from typing import Dict, Optional
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Union
 
 from fastapi import WebSocket
+from starlette import status
 
+from src.config import config
 from src.logconf import opt_logger as log
+from src.services.backplane import Backplane, create_backplane
+from src.services.batching import MessageBatcher
+from src.services.frames import MSGPACK_SUBPROTOCOL, NEW_MESSAGE_PREFIX, dumps, pack
+from src.services.metrics import broadcast_duration
+from src.services.outbound import OutboundQueue
+from src.services.rooms import Member, Room
 
 logger = log.setup_logger('connection')
 
 
 # Менеджер соединений для комнат с онлайн статусами
 class ConnectionService:
-    def __init__(self):
-        # room_id -> dict of {username: WebSocket}
-        self.active_connections: Dict[str, Dict[str, WebSocket]] = {}
-        # WebSocket -> user session data
-        self.sessions: Dict[WebSocket, dict] = {}
-
-    async def connect(self, websocket: WebSocket, room_id: str, user_data: dict):
-        await websocket.accept()
+    def __init__(self, backplane: Optional[Backplane] = None, batching: Optional[bool] = None):
+        # room_id -> Room (только подключения этого процесса)
+        self.rooms: Dict[str, Room] = {}
+        # WebSocket -> Member (данные сессии пользователя)
+        self.sessions: Dict[WebSocket, Member] = {}
+        # Участники комнат и рассылка между процессами
+        self.backplane: Backplane = backplane or create_backplane()
+        # Обработчики кадров, пришедших от других процессов: (room_id, frame)
+        self.remote_listeners: List[Callable[[str, str], None]] = []
+
+        # Пачки new_message для частых комнат (по умолчанию из CHAT_BATCHING)
+        settings = config.chat_batching
+        self.batcher: Optional[MessageBatcher] = None
+        if settings.enabled if batching is None else batching:
+            self.batcher = MessageBatcher(
+                self._put_frame,
+                window=settings.window_ms / 1000,
+                max_size=settings.max_size,
+                threshold=settings.threshold,
+            )
+
+        # Метрики очередей
+        self.dropped_frames = 0
+
+    async def start(self):
+        await self.backplane.start(self._deliver_remote)
+
+    def add_remote_listener(self, listener: Callable[[str, str], None]):
+        self.remote_listeners.append(listener)
+
+    async def close(self):
+        for member in list(self.sessions.values()):
+            if member.queue is not None:
+                await member.queue.close()
+        await self.backplane.close()
+
+    async def drain(self, timeout: float):
+        """Отправляет накопленные сообщения и закрывает сокеты кодом 1012,
+        клиенты переподключаются к другому процессу"""
+        # Отложенные пачки отправляются вместе с остальной очередью
+        if self.batcher is not None:
+            for room in self.rooms.values():
+                self.batcher.flush(room)
+
+        queues = [member.queue for member in self.sessions.values() if member.queue is not None]
+        if not queues:
+            return
+
+        logger.info('Draining %s WebSocket connections', len(queues))
+        tasks = [asyncio.create_task(queue.drain(status.WS_1012_SERVICE_RESTART)) for queue in queues]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning('%s connections did not drain in %ss', len(pending), timeout)
+
+    async def connect(self, websocket: WebSocket, room_id: str, user_data: dict,
+                      subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
         username = user_data["nickname"]
 
         # Добавляем в комнату
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = {}
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = Room(room_id)
 
-        # Уведомляем партнера о подключении
-        partner_ws = await self._get_partner_websocket(room_id, username)
-        if partner_ws:
-            try:
-                await partner_ws.send_json({
-                    "type": "partner_status",
-                    "is_online": True
-                })
-            except Exception as e:
-                logger.error(f"Error sending partner status: {e}")
+        # Новый участник получит эти сообщения в истории, а не повторно из пачки
+        if self.batcher is not None:
+            self.batcher.flush(room)
+
+        member = Member(username, websocket, room, user_data.get("token"))
+        try:
+            replaced = room.add(member)
+        except ValueError:
+            logger.warning(f'Room {room_id} already has two participants, {username} rejected')
+            return False
 
-        self.active_connections[room_id][username] = websocket
+        member.queue = OutboundQueue(
+            websocket,
+            maxsize=config.outbound.queue_size,
+            policy=config.outbound.policy,
+            on_drop=self._count_dropped,
+            on_failure=self.disconnect,
+            binary=subprotocol == MSGPACK_SUBPROTOCOL,
+        )
 
         # Сохраняем сессию
-        self.sessions[websocket] = {
-            "room_id": room_id,
-            "username": username,
-            "token": user_data.get("token")
-        }
+        self.sessions[websocket] = member
+
+        # Предыдущее подключение того же пользователя больше не получает сообщения
+        if replaced is not None:
+            self.sessions.pop(replaced.websocket, None)
+            if replaced.queue is not None:
+                await replaced.queue.close()
+
+        # Партнер может быть подключен к другому процессу
+        partner_online = await self._is_partner_online(room, username)
+
+        # Уведомляем партнера о подключении
+        if partner_online:
+            await self._publish({
+                "type": "partner_status",
+                "is_online": True
+            }, room_id, exclude=username)
+
+        await self.backplane.join(room_id, username)
 
         # Отправляем текущий статус партнера новому пользователю
-        partner_status = partner_ws is not None
         await self.send_personal_message({
             "type": "partner_status",
-            "is_online": partner_status
+            "is_online": partner_online
         }, websocket)
 
         return True
 
     async def disconnect(self, websocket: WebSocket):
-        session = self.sessions.get(websocket)
-        if not session:
+        member = self.sessions.pop(websocket, None)
+        if member is None:
             return
 
-        room_id = session["room_id"]
-        username = session["username"]
+        if member.queue is not None:
+            await member.queue.close()
+
+        room = member.room
 
         # Удаляем из комнаты
-        if room_id in self.active_connections:
-            if username in self.active_connections[room_id]:
-                del self.active_connections[room_id][username]
+        if room.remove(member):
+            await self.backplane.leave(room.room_id, member.username)
 
             # Уведомляем партнера об отключении
-            partner_ws = await self._get_partner_websocket(room_id, username)
-            if partner_ws:
-                try:
-                    await partner_ws.send_json({
-                        "type": "partner_status",
-                        "is_online": False
-                    })
-                except Exception as e:
-                    logger.error(f"Error sending partner offline status: {e}")
-
-            # Удаляем пустую комнату
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
-
-        # Удаляем сессию
-        if websocket in self.sessions:
-            del self.sessions[websocket]
+            await self._publish({
+                "type": "partner_status",
+                "is_online": False
+            }, room.room_id, exclude=member.username)
+
+        # Удаляем пустую комнату
+        if room.is_empty and self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+
+    async def _is_partner_online(self, room: Room, username: str) -> bool:
+        if room.partner_of(username) is not None:
+            return True
+        if not self.backplane.is_shared:
+            return False
+
+        members = await self.backplane.members(room.room_id)
+        return any(member != username for member in members)
 
     async def _get_partner_websocket(self, room_id: str, current_username: str) -> Optional[WebSocket]:
-        """Получает websocket партнера в чате (второго пользователя)"""
-        if room_id not in self.active_connections:
+        """Получает websocket партнера в чате, если он подключен к этому процессу"""
+        room = self.rooms.get(room_id)
+        if room is None:
             return None
 
-        users_in_room = list(self.active_connections[room_id].keys())
-        if len(users_in_room) == 0:
-            return None
+        partner = room.partner_of(current_username)
+        return partner.websocket if partner is not None else None
 
-        # Находим партнера (другого пользователя в комнате)
-        for username, ws in self.active_connections[room_id].items():
-            if username != current_username:
-                return ws
+    async def broadcast_to_room(self, message: Union[dict, str], room_id: str):
+        """Рассылает сообщение всем участникам комнаты"""
+        await self._publish(message, room_id)
 
-        return None
+    async def _publish(self, message: Union[dict, str], room_id: str, exclude: Optional[str] = None):
+        """Доставляет сообщение локально и передает его остальным процессам"""
+        # Кодируется один раз, все получатели делят один буфер
+        frame = message if isinstance(message, str) else dumps(message)
 
-    async def broadcast_to_room(self, message: dict, room_id: str):
-        """Рассылает сообщение всем участникам комнаты"""
-        if room_id in self.active_connections:
-            disconnected_users = []
-            for username, connection in self.active_connections[room_id].items():
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    disconnected_users.append(username)
-                    logger.warning(f'User disconected unexpectedly: {e}')
-
-            # Удаляем отключенные соединения
-            for username in disconnected_users:
-                if username in self.active_connections[room_id]:
-                    del self.active_connections[room_id][username]
-
-    async def get_user_session(self, websocket: WebSocket) -> Optional[dict]:
+        start = time.perf_counter()
+        await self._deliver_local(room_id, frame, exclude)
+        broadcast_duration.observe(time.perf_counter() - start)
+        try:
+            await self.backplane.publish(room_id, frame, exclude)
+        except Exception as e:
+            logger.error(f'Error publishing to backplane: {e}')
+
+    async def _deliver_remote(self, room_id: str, frame: str, exclude: Optional[str] = None):
+        """Кадр, опубликованный другим процессом"""
+        for listener in self.remote_listeners:
+            try:
+                listener(room_id, frame)
+            except Exception as e:
+                logger.error(f'Error in remote frame listener: {e}')
+
+        await self._deliver_local(room_id, frame, exclude)
+
+    async def _deliver_local(self, room_id: str, frame: str, exclude: Optional[str] = None):
+        """Ставит кадр в очереди участников комнаты, подключенных к этому процессу"""
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+
+        now = room.last_active = time.monotonic()
+
+        batcher = self.batcher
+        if batcher is not None:
+            if exclude is None and frame.startswith(NEW_MESSAGE_PREFIX):
+                if batcher.offer(room, frame, now):
+                    return
+            elif room.batch is not None and room.batch.frames:
+                # Служебный кадр не обгоняет отложенные сообщения
+                batcher.flush(room)
+
+        self._put_frame(room, frame, exclude)
+
+    def _put_frame(self, room: Room, frame: str, exclude: Optional[str] = None):
+        first, second = room.first, room.second
+        # JSON-кадр перекодируется в MessagePack один раз на всех таких получателей
+        packed = None
+        if first is not None and first.username != exclude:
+            if first.queue.binary:
+                packed = pack(frame)
+                first.queue.put(packed)
+            else:
+                first.queue.put(frame)
+        if second is not None and second.username != exclude:
+            if second.queue.binary:
+                if packed is None:
+                    packed = pack(frame)
+                second.queue.put(packed)
+            else:
+                second.queue.put(frame)
+
+    async def get_user_session(self, websocket: WebSocket) -> Optional[Member]:
         return self.sessions.get(websocket)
 
-    @staticmethod
-    async def send_personal_message(message: dict, websocket: WebSocket):
-        await websocket.send_json(message)
+    async def send_personal_message(self, message: Union[dict, str], websocket: WebSocket):
+        # Через ту же очередь, чтобы сохранить порядок сообщений
+        member = self.sessions.get(websocket)
+        if member is not None and member.queue is not None:
+            member.queue.put(message)
+        else:
+            await websocket.send_text(message if isinstance(message, str) else dumps(message))
+
+    def _count_dropped(self, count: int):
+        self.dropped_frames += count
+
+    def outbound_stats(self) -> dict:
+        """Глубина очередей и количество отброшенных сообщений"""
+        depths = [member.queue.depth for member in self.sessions.values() if member.queue is not None]
+        return {
+            "queues": len(depths),
+            "total_depth": sum(depths),
+            "max_depth": max(depths, default=0),
+            "dropped_frames": self.dropped_frames,
+        }
+
+    async def get_online_users(self, room_id: str) -> list:
+        """Получает список онлайн пользователей в комнате (со всех процессов)"""
+        if self.backplane.is_shared:
+            return await self.backplane.members(room_id)
 
-    def get_online_users(self, room_id: str) -> list:
-        """Получает список онлайн пользователей в комнате"""
-        if room_id in self.active_connections:
-            return list(self.active_connections[room_id].keys())
-        return []
+        room = self.rooms.get(room_id)
+        return room.usernames() if room is not None else []
 
 
 # Глобальный экземпляр менеджера
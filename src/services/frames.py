@@ -0,0 +1,59 @@
+import json
+from typing import Any, List, Optional, Sequence, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Подпротоколы /ws/chat. Без подпротокола - JSON, как раньше
+JSON_SUBPROTOCOL = 'chat.json'
+MSGPACK_SUBPROTOCOL = 'chat.msgpack'
+
+# Префикс кадра нового сообщения (см. wrap)
+NEW_MESSAGE_PREFIX = '{"type":"new_message","message":'
+
+
+def dumps(obj: Any) -> str:
+    """Кодирует объект в компактный JSON (как starlette send_json)"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def wrap(frame_type: str, field: str, raw: str) -> str:
+    """Вкладывает уже закодированный JSON в кадр без повторной сериализации"""
+    return f'{{"type":"{frame_type}","{field}":{raw}}}'
+
+
+def join_messages(frames: List[str]) -> str:
+    """Склеивает кадры new_message в один new_messages без повторной сериализации"""
+    start = len(NEW_MESSAGE_PREFIX)
+    return '{"type":"new_messages","messages":[' + ','.join(frame[start:-1] for frame in frames) + ']}'
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def pack(message: Union[dict, str]) -> bytes:
+    """Кодирует кадр в MessagePack. Строка - уже готовый JSON-кадр рассылки"""
+    if isinstance(message, str):
+        message = loads(message)
+    return msgpack.packb(message)
+
+
+def negotiate(offered: Sequence[str], allow_msgpack: bool) -> Optional[str]:
+    """Подпротокол из предложенных клиентом; MessagePack - только если пакет установлен"""
+    if MSGPACK_SUBPROTOCOL in offered and allow_msgpack and msgpack is not None:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
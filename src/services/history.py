@@ -0,0 +1,141 @@
+import json
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.cache import upstream_cache
+from src.services.frames import NEW_MESSAGE_PREFIX
+from src.services.upstream import upstream_clients
+
+logger = log.setup_logger('history')
+
+
+class RoomHistory:
+    """ Последние сообщения комнаты в кольцевом буфере """
+
+    __slots__ = ('messages', 'loaded', 'complete')
+
+    def __init__(self, size: int):
+        self.messages: Deque[dict] = deque(maxlen=size)
+        # Загружена ли история из worker'а
+        self.loaded = False
+        # Лежит ли в буфере вся история комнаты
+        self.complete = False
+
+    def append(self, message: dict):
+        if len(self.messages) == self.messages.maxlen:
+            self.complete = False
+        self.messages.append(message)
+
+
+def _key(message: dict) -> tuple:
+    return message.get('created_at'), message.get('sender'), message.get('text')
+
+
+# Кэш истории сообщений, чтобы переподключения не ходили в worker
+class HistoryCache:
+    def __init__(self):
+        settings = config.history
+        self.ring_size = settings.ring_size
+        self.max_rooms = settings.max_rooms
+        # room_id -> RoomHistory, порядок LRU
+        self._rooms: "OrderedDict[str, RoomHistory]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def append(self, room_id: str, message: dict):
+        """Добавляет новое сообщение. Незагруженная комната дополнится историей из worker'а"""
+        room = self._rooms.get(room_id)
+        if room is None:
+            room = self._rooms[room_id] = RoomHistory(self.ring_size)
+            self._evict()
+        room.append(message)
+
+    def observe_frame(self, room_id: str, frame: str):
+        """Подхватывает сообщения, отправленные через другие процессы"""
+        if frame.startswith(NEW_MESSAGE_PREFIX):
+            self.append(room_id, json.loads(frame)['message'])
+
+    def _evict(self):
+        while len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+
+    @staticmethod
+    async def _fetch(room_id: str) -> List[dict]:
+        # Одновременные загрузки одной комнаты объединяются, результат хранится только в буфере
+        async def load():
+            resp = await upstream_clients.worker.get(url=f'/messages?room_id={room_id}')
+            if resp.status_code != 200:
+                raise RuntimeError(f'History request failed: {resp.status_code} {resp.text}')
+            return resp.json() or []
+
+        return await upstream_cache.coalesce(('history', room_id), load)
+
+    async def _get(self, room_id: str) -> RoomHistory:
+        room = self._rooms.get(room_id)
+        if room is not None and room.loaded:
+            self.hits += 1
+            self._rooms.move_to_end(room_id)
+            return room
+
+        self.misses += 1
+        stored = await self._fetch(room_id)
+
+        room = self._rooms.get(room_id)
+        if room is None or not room.loaded:
+            # Сообщения, которые еще не дошли до worker'а, дописываются в конец
+            pending = list(room.messages) if room is not None else []
+            known = {_key(message) for message in stored}
+            merged = stored + [message for message in pending if _key(message) not in known]
+
+            room = RoomHistory(self.ring_size)
+            room.messages.extend(merged[-self.ring_size:])
+            room.loaded = True
+            room.complete = len(merged) <= self.ring_size
+            self._rooms[room_id] = room
+            self._evict()
+
+        return room
+
+    async def recent(self, room_id: str, limit: int, since: Optional[str] = None) -> Tuple[List[dict], bool]:
+        """Последние сообщения, при since - начиная с него включительно
+        (в ту же миллисекунду могло прийти несколько, клиент отбрасывает повторы).
+        Возвращает (страница, есть_еще); есть_еще при since - пропущено больше страницы"""
+        room = await self._get(room_id)
+        messages = list(room.messages)
+
+        if since is not None:
+            # Буфер может не покрывать промежуток после since
+            if not room.complete and (not messages or messages[0].get('created_at', '') >= since):
+                messages = await self._fetch(room_id)
+            newer = [message for message in messages if message.get('created_at', '') >= since]
+            return newer[-limit:], len(newer) > limit
+
+        return messages[-limit:], len(messages) > limit or not room.complete
+
+    async def older(self, room_id: str, before: str, limit: int) -> Tuple[List[dict], bool]:
+        """Страница сообщений старше before. Возвращает (страница, есть_еще)"""
+        room = await self._get(room_id)
+        candidates = [message for message in room.messages if message.get('created_at', '') < before]
+
+        if not room.complete and len(candidates) < limit:
+            # Буфера не хватает, берем полную историю из worker'а
+            stored = await self._fetch(room_id)
+            candidates = [message for message in stored if message.get('created_at', '') < before]
+            return candidates[-limit:], len(candidates) > limit
+
+        has_more = len(candidates) > limit or (not room.complete and len(candidates) == limit)
+        return candidates[-limit:], has_more
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Глобальный экземпляр кэша истории
+history_cache = HistoryCache()
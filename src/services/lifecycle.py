@@ -0,0 +1,177 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from starlette import status
+from starlette.websockets import WebSocketState
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.connection import ConnectionService, connection_service
+from src.services.frames import dumps
+from src.services.rooms import Member, Room
+
+logger = log.setup_logger('lifecycle')
+
+# Кадр session_ended всегда начинается так: тип - первый ключ словаря
+SESSION_ENDED_PREFIX = '{"type":"session_ended"'
+
+
+# Фоновое обслуживание соединений чата этого процесса:
+# закрывает сокеты завершенных и простаивающих комнат и убирает
+# сессии, оставшиеся после сбоев отправки. Пинги WebSocket отправляет
+# сам uvicorn (SERVER_WS_PING_INTERVAL), мертвые соединения
+# завершаются обычным путем через disconnect
+class LifecycleManager:
+    def __init__(self, connection: ConnectionService, sweep_interval: float,
+                 room_idle_timeout: float, close_timeout: float):
+        self.connection = connection
+        self.sweep_interval = sweep_interval
+        self.room_idle_timeout = room_idle_timeout
+        self.close_timeout = close_timeout
+        self._task: Optional[asyncio.Task] = None
+        # Задачи закрытия, чтобы их не собрал сборщик мусора до завершения
+        self._closing = set()
+
+        self.sweeps = 0
+        self.orphans = 0
+        self.idle_rooms = 0
+        self.ended_rooms = 0
+        self.empty_rooms = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for task in list(self._closing):
+            task.cancel()
+
+    async def end_session(self, room_id: str, reason: str):
+        """Сообщает участникам о завершении сессии и закрывает их сокеты во всех процессах"""
+        await self.connection.broadcast_to_room({"type": "session_ended", "reason": reason}, room_id)
+        self._close_room_later(room_id)
+
+    def observe_frame(self, room_id: str, frame: str):
+        """Слушатель кадров других процессов: session_ended закрывает местных участников"""
+        if frame.startswith(SESSION_ENDED_PREFIX):
+            self._close_room_later(room_id)
+
+    def _close_room_later(self, room_id: str):
+        room = self.connection.rooms.get(room_id)
+        if room is None:
+            return
+        task = asyncio.create_task(self._close_members(self._members(room), status.WS_1000_NORMAL_CLOSURE))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+        self.ended_rooms += 1
+
+    @staticmethod
+    def _members(room: Room) -> List[Member]:
+        return [member for member in (room.first, room.second) if member is not None]
+
+    async def _close_members(self, members: List[Member], code: int):
+        """Отправляет очереди и закрывает сокеты; обработчик сокета сам вызовет disconnect"""
+        drains = [member.queue.drain(code) for member in members if member.queue is not None]
+        if not drains:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*drains, return_exceptions=True), self.close_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        # Клиент не ответил на закрытие - сессия убирается без него
+        for member in members:
+            if self.connection.sessions.get(member.websocket) is member:
+                await self.connection.disconnect(member.websocket)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f'Lifecycle sweep failed: {e}')
+
+    async def sweep(self):
+        """Один проход обслуживания"""
+        self.sweeps += 1
+        await self._remove_orphans()
+        self._remove_empty_rooms()
+        if self.room_idle_timeout > 0:
+            await self._close_idle_rooms()
+
+    @staticmethod
+    def _is_orphan(websocket, member: Member) -> bool:
+        return (
+            member.queue is None
+            or member.queue.closed
+            or member.room.get(member.username) is not member
+            or websocket.application_state == WebSocketState.DISCONNECTED
+            or websocket.client_state == WebSocketState.DISCONNECTED
+        )
+
+    async def _remove_orphans(self):
+        """Сессии, чей сокет уже не получает сообщения (сбой отправки, вытеснение)"""
+        orphans = [
+            websocket for websocket, member in self.connection.sessions.items()
+            if self._is_orphan(websocket, member)
+        ]
+        for websocket in orphans:
+            await self.connection.disconnect(websocket)
+            if websocket.application_state != WebSocketState.DISCONNECTED:
+                try:
+                    await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+                except Exception:
+                    pass
+        self.orphans += len(orphans)
+
+    def _remove_empty_rooms(self):
+        empty = [room_id for room_id, room in self.connection.rooms.items() if room.is_empty]
+        for room_id in empty:
+            del self.connection.rooms[room_id]
+        self.empty_rooms += len(empty)
+
+    async def _close_idle_rooms(self):
+        deadline = time.monotonic() - self.room_idle_timeout
+        idle = [room for room in self.connection.rooms.values() if room.last_active < deadline]
+        if not idle:
+            return
+
+        logger.info('Closing %s idle rooms', len(idle))
+        frame = dumps({"type": "session_ended", "reason": "Session closed due to inactivity"})
+        members = []
+        for room in idle:
+            for member in self._members(room):
+                if member.queue is not None:
+                    member.queue.put(frame)
+                members.append(member)
+        self.idle_rooms += len(idle)
+        await self._close_members(members, status.WS_1000_NORMAL_CLOSURE)
+
+    def stats(self) -> dict:
+        return {
+            "sweeps": self.sweeps,
+            "orphans": self.orphans,
+            "idle_rooms": self.idle_rooms,
+            "ended_rooms": self.ended_rooms,
+            "empty_rooms": self.empty_rooms,
+            "closing": len(self._closing),
+        }
+
+
+# Глобальный экземпляр, обслуживает connection_service
+lifecycle_manager = LifecycleManager(
+    connection_service,
+    sweep_interval=config.lifecycle.sweep_interval,
+    room_idle_timeout=config.lifecycle.room_idle_timeout,
+    close_timeout=config.lifecycle.close_timeout,
+)
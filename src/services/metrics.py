@@ -0,0 +1,233 @@
+import asyncio
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from src.config import config
+from src.logconf import opt_logger as log
+
+logger = log.setup_logger('metrics')
+
+# Границы корзин гистограмм задержек, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Метрики живут в одном потоке цикла событий, поэтому обходятся
+# без блокировок: запись - это поиск в словаре и сложение чисел.
+# Текстовый формат собирается только при запросе /metrics
+class Counter:
+    __slots__ = ('name', 'help', 'labelnames', 'values')
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in self.values.items():
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    __slots__ = ('name', 'help', 'labelnames', 'buckets', 'series')
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        bounds = self.buckets + (float('inf'),)
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]!r}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[object] = []
+        # Функции, вызываемые при сборе: возвращают {имя: значение};
+        # ключи из counters - монотонные счетчики, остальные - gauge
+        self._collectors: List[Tuple[str, str, Callable[[], Dict[str, float]], FrozenSet[str]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, prefix: str, help_text: str, collect: Callable[[], Dict[str, float]],
+                  counters: Iterable[str] = ()):
+        """Регистрирует значения, которые считаются только при сборе.
+        Ключи из counters отдаются как counter с суффиксом _total"""
+        self._collectors.append((prefix, help_text, collect, frozenset(counters)))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        for prefix, help_text, collect, counters in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f'Metrics collector {prefix} failed: {e}')
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{prefix}_{key}'
+                kind = 'gauge'
+                if key in counters:
+                    name += '_total'
+                    kind = 'counter'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {_format_value(value)}')
+
+        lines.append('')
+        return '\n'.join(lines)
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status'),
+)
+upstream_request_duration = registry.histogram(
+    'upstream_request_duration_seconds', 'Upstream request latency', ('upstream', 'path'),
+)
+upstream_errors = registry.counter(
+    'upstream_errors_total', 'Upstream failures by kind', ('upstream', 'path', 'kind'),
+)
+chat_messages = registry.counter(
+    'chat_messages_total', 'Chat messages accepted from clients',
+)
+broadcast_duration = registry.histogram(
+    'chat_broadcast_duration_seconds', 'Time to fan a frame out to a room', buckets=FAST_BUCKETS,
+)
+event_loop_lag = registry.histogram(
+    'event_loop_lag_seconds', 'Event loop scheduling delay', buckets=FAST_BUCKETS + (0.1, 0.25, 0.5, 1.0),
+)
+
+# Числовые сегменты пути (/queue/42/status) заменяются, чтобы не плодить ряды
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_path_labels: Dict[str, str] = {}
+
+
+def path_label(path: str) -> str:
+    """Путь upstream-запроса без query и идентификаторов"""
+    label = _path_labels.get(path)
+    if label is None:
+        label = _ID_SEGMENT.sub('/:id', path.split('?', 1)[0])
+        if len(_path_labels) < 1024:
+            _path_labels[path] = label
+    return label
+
+
+# Метрики HTTP-запросов: чистый ASGI, без BaseHTTPMiddleware и лишних задач
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                (scope["method"], route.path if route is not None else "unmatched", str(status[0])),
+            )
+
+
+# Задержка цикла событий: насколько позже запланированного просыпается sleep
+class LoopLagMonitor:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - expected, 0.0)
+            event_loop_lag.observe(self.last_lag)
+
+
+# Глобальный экземпляр монитора задержки цикла
+loop_lag_monitor = LoopLagMonitor(config.metrics.loop_lag_interval)
+registry.collector('event_loop', 'Last measured event loop lag, seconds',
+                   lambda: {"last_lag_seconds": loop_lag_monitor.last_lag})
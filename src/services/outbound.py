@@ -0,0 +1,127 @@
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Optional
+
+from fastapi import WebSocket
+from starlette import status
+
+from src.logconf import opt_logger as log
+from src.services.frames import dumps, pack
+
+logger = log.setup_logger('outbound')
+
+DROP_OLDEST = 'drop_oldest'
+DISCONNECT = 'disconnect'
+
+
+# Очередь исходящих сообщений сокета со своей задачей-писателем,
+# чтобы медленный клиент не задерживал остальных участников комнаты.
+# Писатель запускается только когда в очереди есть сообщения,
+# так простаивающее соединение не держит задачу и ее стек
+class OutboundQueue:
+    __slots__ = ('websocket', 'policy', 'maxsize', 'dropped', 'closed', 'binary',
+                 '_buffer', '_on_drop', '_on_failure', '_writer')
+
+    def __init__(
+            self,
+            websocket: WebSocket,
+            maxsize: int,
+            policy: str = DROP_OLDEST,
+            on_drop: Optional[Callable[[int], None]] = None,
+            on_failure: Optional[Callable[[WebSocket], Any]] = None,
+            binary: bool = False,
+    ):
+        self.websocket = websocket
+        self.policy = policy
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        # Клиент выбрал MessagePack: кадры уходят бинарными
+        self.binary = binary
+
+        # Буфер создается при первом сообщении и освобождается, когда опустеет
+        self._buffer: Optional[Deque[Any]] = None
+        self._on_drop = on_drop
+        self._on_failure = on_failure
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer) if self._buffer is not None else 0
+
+    def put(self, message: Any) -> bool:
+        """Ставит сообщение в очередь без ожидания. False, если сообщение отброшено"""
+        if self.closed:
+            return False
+
+        if self._buffer is None:
+            self._buffer = deque()
+
+        if len(self._buffer) >= self.maxsize:
+            self._count_drop()
+
+            if self.policy != DROP_OLDEST:
+                # Клиент не успевает читать, соединение закрывается
+                self.closed = True
+                logger.warning('Slow consumer disconnected: outbound queue is full')
+                asyncio.create_task(self.close(code=status.WS_1013_TRY_AGAIN_LATER))
+                return False
+
+            self._buffer.popleft()
+
+        self._buffer.append(message)
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+        return True
+
+    def _count_drop(self):
+        self.dropped += 1
+        if self._on_drop is not None:
+            self._on_drop(1)
+
+    async def _write_loop(self):
+        try:
+            while self._buffer:
+                message = self._buffer.popleft()
+                try:
+                    # Рассылки приходят уже закодированными, один буфер на всех получателей
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    elif self.binary:
+                        await self.websocket.send_bytes(pack(message))
+                    else:
+                        if not isinstance(message, str):
+                            message = dumps(message)
+                        await self.websocket.send_text(message)
+                except Exception as e:
+                    logger.warning(f'User disconected unexpectedly: {e}')
+                    self.closed = True
+                    if self._on_failure is not None:
+                        await self._on_failure(self.websocket)
+                    return
+        finally:
+            self._writer = None
+            self._buffer = None
+
+    async def drain(self, code: int):
+        """Дожидается отправки очереди и закрывает сокет с кодом"""
+        writer = self._writer
+        if writer is not None and writer is not asyncio.current_task():
+            try:
+                await asyncio.shield(writer)
+            except Exception:
+                pass
+        await self.close(code=code)
+
+    async def close(self, code: Optional[int] = None):
+        """Останавливает писателя. С кодом также закрывает сам сокет"""
+        self.closed = True
+        self._buffer = None
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+        if code is not None:
+            try:
+                await self.websocket.close(code=code)
+            except Exception as e:
+                logger.debug('Error closing slow consumer: %s', e)
@@ -0,0 +1,181 @@
+import asyncio
+import random
+import time
+from typing import List, Optional
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.upstream import upstream_clients
+
+logger = log.setup_logger('persistence')
+
+
+# Отложенная запись сообщений чата в worker пачками.
+#
+# Контракт bulk-эндпоинта worker'а:
+#   POST {worker.prefix}/messages/bulk
+#   body: {"messages": [MessageContent, ...]}
+#   200 - все сообщения пачки сохранены
+# Если worker не знает bulk-эндпоинт (404/405), сообщения
+# отправляются по одному в POST /messages?room_id=...
+# Доставка at-least-once: после повтора или остановки возможны дубли.
+# Пока worker недоступен, пачка повторяется без ограничения числа попыток,
+# новые сообщения копятся в буфере; теряются только сообщения, не
+# поместившиеся в переполненный буфер, и остаток при истечении drain_timeout.
+class MessageWriter:
+    def __init__(self):
+        settings = config.persistence
+        self.batch_size = settings.batch_size
+        self.flush_interval = settings.flush_interval
+        self.retry_backoff = settings.retry_backoff
+        self.max_retry_delay = settings.max_retry_delay
+
+        # (room_id, payload) - payload уже закодирован в JSON
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bulk_supported = True
+        # Пачка, которая сейчас отправляется или ждет повтора
+        self._flushing: List[tuple] = []
+
+        self.saved = 0
+        self.dropped = 0
+        self.retries = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=config.persistence.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, room_id: str, payload: str) -> bool:
+        """Ставит сообщение в буфер без ожидания. False, если буфер переполнен"""
+        try:
+            self._queue.put_nowait((room_id, payload))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f'Message buffer is full, message for room {room_id} dropped')
+            return False
+
+    @property
+    def pending(self) -> int:
+        """Несохраненные сообщения: буфер и пачка в отправке"""
+        return (self._queue.qsize() if self._queue is not None else 0) + len(self._flushing)
+
+    async def close(self):
+        """Останавливает фоновую запись и сохраняет остаток буфера"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout=config.persistence.drain_timeout)
+        except asyncio.TimeoutError:
+            lost = self.pending
+            self.dropped += lost
+            self._flushing = []
+            logger.error(f'Drain timed out, {lost} messages were not saved')
+
+    async def _drain(self):
+        while not self._queue.empty():
+            await self._flush(self._take(self.batch_size))
+
+    def _take(self, limit: int) -> List[tuple]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = []
+            try:
+                # Ждем первое сообщение, затем добираем пачку по размеру или времени
+                batch.append(await self._queue.get())
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                await self._flush(batch)
+
+            except asyncio.CancelledError:
+                # Несохраненная часть пачки вернется в буфер и будет сохранена при остановке
+                for item in batch:
+                    try:
+                        self._queue.put_nowait(item)
+                    except asyncio.QueueFull:
+                        self.dropped += 1
+                self._flushing = []
+                raise
+
+    async def _flush(self, batch: List[tuple]):
+        """Отправляет пачку, повторяя с растущей задержкой, пока она не сохранится"""
+        self._flushing = batch
+        attempt = 0
+        while True:
+            try:
+                if await self._send(batch):
+                    self.saved += len(batch)
+                    self._flushing = []
+                    return
+            except Exception as e:
+                logger.warning(f'Error saving messages onto ext server: {e}')
+
+            self.retries += 1
+            # Экспоненциальная задержка с джиттером, не больше max_retry_delay
+            delay = min(self.retry_backoff * (2 ** attempt), self.max_retry_delay)
+            attempt += 1
+            if attempt % 10 == 0:
+                logger.error(f'{len(batch)} messages still not saved after {attempt} attempts, '
+                             f'{self.pending} messages pending')
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def _send(self, batch: List[tuple]) -> bool:
+        if self._bulk_supported:
+            content = '{"messages":[' + ','.join(payload for _, payload in batch) + ']}'
+            resp = await upstream_clients.worker.post(
+                url='/messages/bulk',
+                content=content,
+                headers={"Content-Type": "application/json"},
+            )
+            if resp.status_code == 200:
+                return True
+            if resp.status_code not in (404, 405):
+                logger.warning(f'Bulk save failed: {resp.status_code} {resp.text}')
+                return False
+
+            logger.warning('Worker has no bulk endpoint, saving messages one by one')
+            self._bulk_supported = False
+
+        # Отправляем по одному, уже сохраненные убираем из пачки
+        while batch:
+            room_id, payload = batch[0]
+            resp = await upstream_clients.worker.post(url=f'/messages?room_id={room_id}', content=payload)
+            if resp.status_code != 200:
+                logger.warning(f'Save failed: {resp.status_code} {resp.text}')
+                return False
+            batch.pop(0)
+            self.saved += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "saved": self.saved,
+            "dropped": self.dropped,
+            "retries": self.retries,
+        }
+
+
+# Глобальный экземпляр записи сообщений
+message_writer = MessageWriter()
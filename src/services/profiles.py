@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.cache import upstream_cache
+from src.services.upstream import UpstreamClients
+
+logger = log.setup_logger('profiles')
+
+# Виды записей пользователя в gateway
+PROFILE = 'profile'     # /api/users?target_field=all: критерии подбора
+NICKNAME = 'nickname'   # /api/users?target_field=nickname: токены комнат
+USER = 'user'           # /api/users: проверка существования
+EXISTS = 'exists'       # /api/check_profile: заполнен ли профиль
+
+
+async def _fetch(upstream: UpstreamClients, url: str) -> Any:
+    """Ответ gateway; None, если пользователя нет. Ошибки upstream - httpx.HTTPStatusError"""
+    resp = await upstream.gateway.get(url=url)
+    if resp.status_code in (204, 404):
+        return None
+    resp.raise_for_status()
+    return resp.json()
+
+
+# Кэш записей пользователей из gateway. Записи меняются редко, а нужны
+# при каждом входе в очередь и каждом токене комнаты. Отсутствие
+# пользователя тоже кэшируется, но коротко: регистрация сбрасывает запись.
+# Кэш у каждого процесса свой: invalidate сбрасывает записи только этого
+# процесса, при SERVER_WORKERS > 1 остальные отдают старые записи до конца TTL
+class ProfileCache:
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # (kind, user_id) -> (expires_at, value), порядок LRU
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        # user_id -> номер изменения, чтобы не сохранить ответ, загруженный до записи.
+        # Нужен, только пока идут загрузки: хранится для пользователей из _loading
+        self._versions: Dict[str, int] = {}
+        # user_id -> число загрузок в полете
+        self._loading: Dict[str, int] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, kind: str, user_id: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Возвращает запись из кэша либо загружает ее через loader"""
+        user_id = str(user_id)
+        key = (kind, user_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                if entry[1]:
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        self.misses += 1
+        version = self._versions.get(user_id, 0)
+        # Одновременные запросы одного пользователя объединяются, результат хранится здесь
+        return await upstream_cache.coalesce(
+            ('profiles', kind, user_id, version), lambda: self._load(key, version, loader)
+        )
+
+    async def _load(self, key: Tuple[str, str], version: int, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Загрузка в задаче upstream_cache: доживает до конца, даже если запросивший отменен"""
+        user_id = key[1]
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            value = await loader()
+            if self._versions.get(user_id, 0) == version:
+                self._store(key, value)
+            return value
+        finally:
+            self._loading[user_id] -= 1
+            if not self._loading[user_id]:
+                del self._loading[user_id]
+                self._versions.pop(user_id, None)
+
+    def _store(self, key: Tuple[str, str], value: Any):
+        ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0:
+            return
+
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, user_id: Hashable):
+        """Сбрасывает все записи пользователя этого процесса после изменения профиля"""
+        user_id = str(user_id)
+        # Без загрузок в полете устаревшему ответу неоткуда взяться
+        if user_id in self._loading:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        for kind in (PROFILE, NICKNAME, USER, EXISTS):
+            self._entries.pop((kind, user_id), None)
+        self.invalidations += 1
+
+    async def profile(self, upstream: UpstreamClients, user_id: Hashable) -> Optional[dict]:
+        """Полная запись пользователя: никнейм, язык, критерии подбора"""
+        return await self.get(
+            PROFILE, user_id, lambda: _fetch(upstream, f'/api/users?user_id={user_id}&target_field=all')
+        )
+
+    async def nickname(self, upstream: UpstreamClients, user_id: Hashable) -> Optional[str]:
+        """Никнейм для токена комнаты - отдельное поле, не username из полной записи"""
+        data = await self.get(
+            NICKNAME, user_id, lambda: _fetch(upstream, f'/api/users?user_id={user_id}&target_field=nickname')
+        )
+        return data.get('nickname') if data else None
+
+    async def user(self, upstream: UpstreamClients, user_id: Hashable) -> Any:
+        return await self.get(USER, user_id, lambda: _fetch(upstream, f'/api/users?user_id={user_id}'))
+
+    async def profile_exists(self, upstream: UpstreamClients, user_id: Hashable) -> Any:
+        return await self.get(EXISTS, user_id, lambda: _fetch(upstream, f'/api/check_profile?user_id={user_id}'))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# Глобальный экземпляр кэша профилей
+profile_cache = ProfileCache(
+    ttl=config.profiles.ttl,
+    negative_ttl=config.profiles.negative_ttl,
+    max_entries=config.profiles.max_entries,
+)
@@ -0,0 +1,180 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+from starlette import status
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.cache import upstream_cache
+from src.services.profiles import profile_cache
+from src.services.upstream import upstream_clients
+from src.validators.tokens import create_token
+
+logger = log.setup_logger('queue')
+
+
+# Рассылка статуса очереди ожидающим клиентам вместо опроса с каждого браузера
+class QueueNotifier:
+    def __init__(self):
+        # user_id -> set of WebSocket (одна вкладка = одно соединение)
+        self.subscribers: Dict[int, Set[WebSocket]] = {}
+        # user_id -> последний отправленный статус в очереди
+        self.user_status: Dict[int, Optional[bool]] = {}
+        # Пользователи, которым уже отправлен match_found
+        self.matched: Set[int] = set()
+        # user_id -> когда проверять статус и матч в следующий раз (time.monotonic)
+        self.next_check: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, websocket: WebSocket, user_id: int):
+        await websocket.accept()
+        self.subscribers.setdefault(user_id, set()).add(websocket)
+        self.user_status.setdefault(user_id, None)
+        # Первая проверка на ближайшем тике
+        self.next_check.setdefault(user_id, 0.0)
+
+        # Тикер работает только пока есть подписчики
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def unsubscribe(self, websocket: WebSocket, user_id: int):
+        sockets = self.subscribers.get(user_id)
+        if sockets is None:
+            return
+
+        sockets.discard(websocket)
+        if not sockets:
+            del self.subscribers[user_id]
+            self.user_status.pop(user_id, None)
+            self.matched.discard(user_id)
+            self.next_check.pop(user_id, None)
+
+    def check_soon(self, user_id: int):
+        """Проверить пользователя на ближайшем тике: он сам изменил свое состояние в очереди"""
+        if user_id in self.next_check:
+            self.next_check[user_id] = 0.0
+
+    async def close(self):
+        """Останавливает тикер. Вызывается из lifespan приложения"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @staticmethod
+    async def queue_status() -> Optional[dict]:
+        """Общий статус очереди, одинаковый для всех клиентов"""
+
+        async def load():
+            resp = await upstream_clients.worker.get(url='/queue/status')
+            if resp.status_code == 200:
+                return resp.json()
+
+        return await upstream_cache.get(('queue_status',), load)
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                await self._tick()
+            except Exception as e:
+                logger.error(f'Error in queue tick: {e}')
+            await asyncio.sleep(config.queue.tick_interval)
+
+    async def _tick(self):
+        """Один опрос worker'а за тик, результат получают все подписчики"""
+        status = await self.queue_status()
+        if status is not None:
+            frame = {"type": "queue_status", **status}
+            await asyncio.gather(*(
+                self._send(user_id, frame) for user_id in list(self.subscribers)
+            ))
+
+        # Каждого пользователя проверяем раз в user_check_interval, а не каждый тик.
+        # Сдвиг ±20% разносит проверки подключившихся одновременно по разным тикам
+        now = time.monotonic()
+        interval = config.queue.user_check_interval
+        due = [
+            user_id for user_id, at in self.next_check.items()
+            if at <= now and user_id not in self.matched
+        ]
+        for user_id in due:
+            self.next_check[user_id] = now + interval * random.uniform(0.8, 1.2)
+
+        # Проверка матчей выполняется с ограниченной параллельностью
+        semaphore = asyncio.Semaphore(config.queue.max_concurrency)
+
+        async def check(user_id: int):
+            async with semaphore:
+                await self._check_user(user_id)
+
+        await asyncio.gather(*(check(user_id) for user_id in due))
+
+    async def _check_user(self, user_id: int):
+        queue_resp, match_resp = await asyncio.gather(
+            upstream_clients.worker.get(url=f'/queue/{user_id}/status'),
+            upstream_clients.worker.get(url=f'/check_match?user_id={user_id}'),
+        )
+
+        if queue_resp.status_code == 200 and user_id in self.user_status:
+            in_queue = queue_resp.json().get('in_queue')
+            # Статус отправляется только при изменении
+            if self.user_status[user_id] != in_queue:
+                self.user_status[user_id] = in_queue
+                await self._send(user_id, {"type": "user_status", "in_queue": in_queue})
+
+        if match_resp.status_code != 200:
+            return
+
+        match = match_resp.json()
+        if not match or not match.get('match_id') or not match.get('room_id'):
+            return
+
+        self.matched.add(user_id)
+        token = await self._issue_token(user_id, match['room_id'])
+        await self._send(user_id, {
+            "type": "match_found",
+            "match_id": match['match_id'],
+            "room_id": match['room_id'],
+            "token": token,
+        })
+
+    @staticmethod
+    async def _issue_token(user_id: int, room_id: str) -> Optional[str]:
+        """Выдает токен комнаты, чтобы клиенту не пришлось запрашивать его отдельно"""
+        try:
+            nickname = await profile_cache.nickname(upstream_clients, user_id)
+            if not nickname:
+                return None
+
+            return await create_token(user_id, nickname, room_id)
+
+        except Exception as e:
+            logger.warning(f'Could not issue token for user {user_id}: {e}')
+            return None
+
+    async def _send(self, user_id: int, message: dict):
+        timeout = config.queue.send_timeout
+        for websocket in list(self.subscribers.get(user_id, ())):
+            try:
+                # Медленный сокет не должен задерживать тик для остальных
+                await asyncio.wait_for(websocket.send_json(message), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'Queue subscriber {user_id} did not accept a frame in {timeout}s, closing')
+                await self.unsubscribe(websocket, user_id)
+                try:
+                    await asyncio.wait_for(websocket.close(code=status.WS_1011_INTERNAL_ERROR), timeout)
+                except Exception:
+                    pass
+            except Exception as e:
+                logger.warning(f'Queue subscriber disconnected unexpectedly: {e}')
+                await self.unsubscribe(websocket, user_id)
+
+
+# Глобальный экземпляр рассыльщика
+queue_notifier = QueueNotifier()
@@ -0,0 +1,123 @@
+import time
+from typing import Optional, Tuple
+
+from src.config import config
+from src.services.rooms import Member
+
+# Чей лимит исчерпан
+CONNECTION = 'connection'
+ROOM = 'room'
+
+
+class TokenBucket:
+    """ Token bucket: rate токенов в секунду, не больше capacity """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait(self, now: float) -> float:
+        """Пополняет ведро; 0 - токен есть, иначе сколько секунд ждать"""
+        if self.tokens < self.capacity:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+# Ограничение входящих сообщений чата. Ведра лежат прямо в Member и Room,
+# поэтому проверка - пара арифметических операций без словарей и блокировок.
+# Лимит комнаты считается в каждом процессе для его участников
+class ChatRateLimiter:
+    def __init__(self, rate: float, burst: float, room_rate: float, room_burst: float,
+                 max_frame_size: int, max_text_length: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.room_rate = room_rate
+        self.room_burst = max(room_burst, 1)
+        self.max_frame_size = max_frame_size
+        self.max_text_length = max_text_length
+
+        self.limited_connection = 0
+        self.limited_room = 0
+        self.oversized_frames = 0
+        self.rejected_texts = 0
+
+    def check(self, member: Member, room: bool = True) -> Optional[Tuple[str, float]]:
+        """None, если сообщение можно принять (токены списаны), иначе (scope, retry_after)"""
+        now = time.monotonic()
+
+        bucket = None
+        if self.rate > 0:
+            bucket = member.limiter
+            if bucket is None:
+                bucket = member.limiter = TokenBucket(self.rate, self.burst)
+            wait = bucket.wait(now)
+            if wait:
+                self.limited_connection += 1
+                return CONNECTION, wait
+
+        room_bucket = None
+        if room and self.room_rate > 0:
+            room_bucket = member.room.limiter
+            if room_bucket is None:
+                room_bucket = member.room.limiter = TokenBucket(self.room_rate, self.room_burst)
+            wait = room_bucket.wait(now)
+            if wait:
+                self.limited_room += 1
+                return ROOM, wait
+
+        # Списываем только когда оба лимита пропускают сообщение
+        if bucket is not None:
+            bucket.take()
+        if room_bucket is not None:
+            room_bucket.take()
+        member.rate_notified = False
+        return None
+
+    @staticmethod
+    def should_notify(member: Member) -> bool:
+        """Один кадр rate_limited на серию отклоненных сообщений, а не на каждое"""
+        if member.rate_notified:
+            return False
+        member.rate_notified = True
+        return True
+
+    def frame_too_large(self, data: str) -> bool:
+        if len(data) > self.max_frame_size:
+            self.oversized_frames += 1
+            return True
+        return False
+
+    def text_too_long(self, text: str) -> bool:
+        if len(text) > self.max_text_length:
+            self.rejected_texts += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "limited_connection": self.limited_connection,
+            "limited_room": self.limited_room,
+            "oversized_frames": self.oversized_frames,
+            "rejected_texts": self.rejected_texts,
+        }
+
+
+# Глобальный экземпляр с настройками из окружения
+chat_rate_limiter = ChatRateLimiter(
+    rate=config.chat_limits.rate,
+    burst=config.chat_limits.burst,
+    room_rate=config.chat_limits.room_rate,
+    room_burst=config.chat_limits.room_burst,
+    max_frame_size=config.chat_limits.max_frame_size,
+    max_text_length=config.chat_limits.max_text_length,
+)
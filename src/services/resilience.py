@@ -0,0 +1,259 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.metrics import path_label, upstream_errors, upstream_request_duration
+
+logger = log.setup_logger('resilience')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Методы, которые можно безопасно повторять
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_STATUSES = (502, 503, 504)
+
+
+def parse_path_table(raw: str) -> Dict[str, float]:
+    """Разбирает строку вида '/check_match=2,/match/toggle=30'"""
+    table = {}
+    for item in raw.split(','):
+        if '=' not in item:
+            continue
+        path, value = item.split('=', 1)
+        table[path.strip()] = float(value)
+    return table
+
+
+# Автомат размыкания цепи для одного upstream.
+# closed: запросы проходят, подряд идущие ошибки считаются;
+# open: запросы сразу отклоняются до истечения reset_timeout;
+# half_open: пропускается ограниченное число пробных запросов
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос. При True вызывающий обязан сообщить результат"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f'Circuit {self.name} is half-open, probing')
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_max:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f'Circuit {self.name} closed')
+        self.state = CLOSED
+        self.failures = 0
+        self._probes = 0
+
+    def record_cancel(self):
+        """Запрос отменен без результата, слот пробного запроса освобождается"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+                logger.warning(f'Circuit {self.name} opened after {self.failures} failures')
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+# Обертка пула соединений с upstream: таймауты по эндпоинтам,
+# размыкатель цепи, повторы идемпотентных GET с джиттером и
+# дублирование (hedging) медленных запросов для критичных чтений.
+# Сбои транспорта и открытая цепь возвращаются ответами 503/504,
+# поэтому обработчики проверяют только status_code, как и раньше
+class ResilientClient:
+    def __init__(self, name: str, client: httpx.AsyncClient):
+        settings = config.resilience
+        self.name = name
+        self.client = client
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.failure_threshold,
+            reset_timeout=settings.reset_timeout,
+            half_open_max=settings.half_open_max,
+        )
+        self.timeouts = parse_path_table(settings.timeouts)
+        self.hedge_delays = parse_path_table(settings.hedge)
+        self.retries = settings.retries
+        self.retry_backoff = settings.retry_backoff
+
+        self.retried = 0
+        self.hedged = 0
+
+    @staticmethod
+    def _path(url) -> str:
+        return str(url).split('?', 1)[0]
+
+    def _lookup(self, table: Dict[str, float], url) -> Optional[float]:
+        """Значение для самого длинного совпавшего префикса пути"""
+        path = self._path(url)
+        best: Optional[Tuple[int, float]] = None
+        for prefix, value in table.items():
+            if path.startswith(prefix) and (best is None or len(prefix) > best[0]):
+                best = (len(prefix), value)
+        return best[1] if best else None
+
+    def _unavailable(self, method: str, url, status: int, reason: str) -> httpx.Response:
+        return httpx.Response(
+            status,
+            json={"detail": f"{self.name} is unavailable: {reason}"},
+            request=httpx.Request(method, self.client.base_url.join(str(url))),
+        )
+
+    async def request(self, method: str, url, **kwargs) -> httpx.Response:
+        method = method.upper()
+        if 'timeout' not in kwargs:
+            timeout = self._lookup(self.timeouts, url)
+            if timeout is not None:
+                kwargs['timeout'] = timeout
+
+        if method not in IDEMPOTENT_METHODS:
+            return await self._attempt(method, url, kwargs)
+
+        hedge_delay = self._lookup(self.hedge_delays, url)
+        for attempt in range(self.retries + 1):
+            if hedge_delay is not None:
+                resp = await self._hedged(method, url, kwargs, hedge_delay)
+            else:
+                resp = await self._attempt(method, url, kwargs)
+
+            if resp.status_code not in RETRY_STATUSES or attempt == self.retries or self.breaker.state == OPEN:
+                return resp
+
+            self.retried += 1
+            # Полный джиттер, чтобы повторы разных клиентов не совпадали
+            await asyncio.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+        return resp
+
+    async def _attempt(self, method: str, url, kwargs: dict) -> httpx.Response:
+        return await self._guarded(method, url, lambda: self.client.request(method, url, **kwargs))
+
+    async def _guarded(self, method: str, url, call: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Один запрос через размыкатель цепи"""
+        path = path_label(url.path if isinstance(url, httpx.URL) else self._path(url))
+        if not self.breaker.allow():
+            upstream_errors.inc((self.name, path, 'rejected'))
+            return self._unavailable(method, url, 503, 'circuit is open')
+
+        start = time.perf_counter()
+        try:
+            resp = await call()
+        except httpx.TimeoutException as e:
+            self.breaker.record_failure()
+            upstream_errors.inc((self.name, path, 'timeout'))
+            logger.warning(f'{self.name} {method} {path} timed out: {e!r}')
+            return self._unavailable(method, url, 504, 'timeout')
+        except httpx.TransportError as e:
+            self.breaker.record_failure()
+            upstream_errors.inc((self.name, path, 'transport'))
+            logger.warning(f'{self.name} {method} {path} failed: {e!r}')
+            return self._unavailable(method, url, 503, 'connection failed')
+        except asyncio.CancelledError:
+            # Отмененный запрос (например, проигравший hedge) не считается ни успехом, ни ошибкой
+            self.breaker.record_cancel()
+            raise
+
+        upstream_request_duration.observe(time.perf_counter() - start, (self.name, path))
+        if resp.status_code >= 500:
+            self.breaker.record_failure()
+            upstream_errors.inc((self.name, path, '5xx'))
+        else:
+            self.breaker.record_success()
+        return resp
+
+    async def _hedged(self, method: str, url, kwargs: dict, delay: float) -> httpx.Response:
+        """Если первый запрос не ответил за delay, отправляется второй, берется первый успешный"""
+        tasks = {asyncio.create_task(self._attempt(method, url, kwargs))}
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                tasks.add(asyncio.create_task(self._attempt(method, url, kwargs)))
+                pending = set(tasks)
+
+            while True:
+                for task in done:
+                    resp = task.result()
+                    if resp.status_code < 500 or not pending:
+                        return resp
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def get(self, url, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url, **kwargs) -> httpx.Response:
+        return await self.request('PUT', url, **kwargs)
+
+    async def delete(self, url, **kwargs) -> httpx.Response:
+        return await self.request('DELETE', url, **kwargs)
+
+    def build_request(self, method: str, url, **kwargs) -> httpx.Request:
+        if 'timeout' not in kwargs:
+            timeout = self._lookup(self.timeouts, url)
+            if timeout is not None:
+                kwargs['timeout'] = timeout
+        return self.client.build_request(method, url, **kwargs)
+
+    async def send(self, request: httpx.Request, stream: bool = False) -> httpx.Response:
+        """Отправка готового запроса (потоковые ответы), без повторов"""
+        return await self._guarded(
+            request.method, request.url, lambda: self.client.send(request, stream=stream)
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            **self.breaker.stats(),
+            "retried": self.retried,
+            "hedged": self.hedged,
+        }
@@ -0,0 +1,103 @@
+import time
+from typing import Optional
+
+from fastapi import WebSocket
+
+from src.services.outbound import OutboundQueue
+
+
+class Member:
+    """ Подключение пользователя к комнате (бывший словарь сессии) """
+
+    __slots__ = ('username', 'websocket', 'queue', 'room', 'token', 'connected_at', 'last_active', 'limiter',
+                 'rate_notified')
+
+    def __init__(self, username: str, websocket: WebSocket, room: "Room", token: Optional[str] = None):
+        self.username = username
+        self.websocket = websocket
+        self.queue: Optional[OutboundQueue] = None
+        self.room = room
+        self.token = token
+        self.connected_at = time.monotonic()
+        self.last_active = self.connected_at
+        # Token bucket входящих сообщений, создается при первом сообщении
+        self.limiter = None
+        # Клиент уже получил rate_limited и еще не отправил ни одного принятого сообщения.
+        # Флаг у участника: отклонить может и ведро комнаты, когда своего ведра нет
+        self.rate_notified = False
+
+    @property
+    def room_id(self) -> str:
+        return self.room.room_id
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+
+class Room:
+    """ Комната 1:1 с прямыми ссылками на обоих участников """
+
+    __slots__ = ('room_id', 'first', 'second', 'created_at', 'last_active', 'limiter', 'batch')
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.first: Optional[Member] = None
+        self.second: Optional[Member] = None
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+        self.limiter = None
+        # Частота сообщений и пачка new_message (services.batching)
+        self.batch = None
+
+    @property
+    def is_empty(self) -> bool:
+        return self.first is None and self.second is None
+
+    def get(self, username: str) -> Optional[Member]:
+        if self.first is not None and self.first.username == username:
+            return self.first
+        if self.second is not None and self.second.username == username:
+            return self.second
+        return None
+
+    def partner_of(self, username: str) -> Optional[Member]:
+        """Второй участник комнаты"""
+        if self.first is not None and self.first.username != username:
+            return self.first
+        if self.second is not None and self.second.username != username:
+            return self.second
+        return None
+
+    def add(self, member: Member) -> Optional[Member]:
+        """Занимает слот пользователя. Возвращает вытесненное подключение того же пользователя"""
+        if self.first is not None and self.first.username == member.username:
+            replaced, self.first = self.first, member
+            return replaced
+        if self.second is not None and self.second.username == member.username:
+            replaced, self.second = self.second, member
+            return replaced
+
+        if self.first is None:
+            self.first = member
+        elif self.second is None:
+            self.second = member
+        else:
+            raise ValueError(f'Room {self.room_id} is full')
+        return None
+
+    def remove(self, member: Member) -> bool:
+        """Освобождает слот, если его занимает именно это подключение"""
+        if self.first is member:
+            self.first = None
+            return True
+        if self.second is member:
+            self.second = None
+            return True
+        return False
+
+    def usernames(self) -> list:
+        if self.first is None:
+            return [] if self.second is None else [self.second.username]
+        if self.second is None:
+            return [self.first.username]
+        return [self.first.username, self.second.username]
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Dict, Set
+
+from src.exc import SearchSuperseded
+
+
+# Текущий поиск каждого пользователя. Новый запрос отменяет
+# запросы к gateway предыдущего, чтобы не тратить на него соединения
+class InflightSearches:
+    def __init__(self):
+        # user_id -> задача текущего поиска
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._superseded: Set[asyncio.Task] = set()
+        self.cancelled = 0
+
+    async def run(self, user_id: int, search: Awaitable):
+        """Выполняет поиск, отменяя предыдущий поиск пользователя"""
+        previous = self._tasks.get(user_id)
+        if previous is not None and not previous.done():
+            self._superseded.add(previous)
+            previous.cancel()
+            self.cancelled += 1
+
+        task = asyncio.create_task(search)
+        self._tasks[user_id] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task in self._superseded:
+                raise SearchSuperseded(f'Search of user {user_id} superseded')
+            raise
+        finally:
+            self._superseded.discard(task)
+            if self._tasks.get(user_id) is task:
+                del self._tasks[user_id]
+
+    @property
+    def inflight(self) -> int:
+        return len(self._tasks)
+
+
+# Глобальный реестр поисков
+inflight_searches = InflightSearches()
@@ -0,0 +1,196 @@
+import re
+from typing import AsyncIterator, Optional
+
+from src.logconf import opt_logger as log
+
+logger = log.setup_logger('streaming')
+
+# Символы, меняющие состояние разбора вне строки и внутри нее
+_STRUCTURAL = re.compile(rb'["{}\[\],:]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_NON_SPACE = re.compile(rb'\S')
+# Завершенная строка целиком и все байты, кроме скобок, для быстрого пропуска значений
+_NOT_BRACKETS = bytes(b for b in range(256) if b not in b'[]{}')
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+_START, _KEY, _COLON, _VALUE_START, _VALUE, _DONE = range(6)
+
+
+# Потоковое извлечение значения одного ключа JSON-объекта верхнего уровня.
+# Байты значения отдаются как есть, без декодирования и повторной сериализации:
+# {"42": [...], "43": [...]} -> [...] для ключа "42".
+# Документ не валидируется, разбираются только строки и вложенность
+class JsonMemberExtractor:
+    def __init__(self, key: str):
+        self._key = key.encode()
+        self._phase = _START
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Имя ключа верхнего уровня, пока оно читается
+        self._key_buf: Optional[bytearray] = None
+        self._matched = False
+        self._emitting = False
+        self.found = False
+
+    @property
+    def done(self) -> bool:
+        return self._phase == _DONE
+
+    @property
+    def emitting(self) -> bool:
+        """Значение начато, но еще не закончилось"""
+        return self._emitting
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Принимает очередной кусок документа, возвращает найденную в нем часть значения"""
+        if self._phase == _DONE:
+            return b''
+
+        out = []
+        emit_from = 0
+        pos, size = 0, len(chunk)
+        fast = True
+
+        while pos < size:
+            if self._escape:
+                if self._key_buf is not None:
+                    self._key_buf += chunk[pos:pos + 1]
+                self._escape = False
+                pos += 1
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(chunk, pos)
+                end = match.start() if match else size
+                if self._key_buf is not None:
+                    self._key_buf += chunk[pos:end]
+                if match is None:
+                    break
+
+                if chunk[end] == 0x5C:  # \
+                    if self._key_buf is not None:
+                        self._key_buf += b'\\'
+                    self._escape = True
+                else:
+                    self._in_string = False
+                    if self._key_buf is not None:
+                        self._matched = bytes(self._key_buf) == self._key
+                        self._key_buf = None
+                        self._phase = _COLON
+                pos = end + 1
+                continue
+
+            if fast and self._phase == _VALUE and self._depth >= 2:
+                skipped = self._skip_nested(chunk, pos)
+                if skipped == -1:
+                    # Конец значения ищется посимвольно до конца куска
+                    fast = False
+                elif skipped > pos:
+                    pos = skipped
+                    continue
+
+            if self._phase == _VALUE_START:
+                match = _NON_SPACE.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.start()
+                self._phase = _VALUE
+                if self._matched:
+                    self._emitting = True
+                    emit_from = pos
+
+            match = _STRUCTURAL.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            char = chunk[i]
+            pos = i + 1
+
+            if char == 0x22:  # "
+                self._in_string = True
+                if self._phase == _KEY and self._depth == 1:
+                    self._key_buf = bytearray()
+
+            elif char in (0x7B, 0x5B):  # { [
+                self._depth += 1
+                if self._phase == _START:
+                    # Верхний уровень не объект - ключа в документе нет
+                    self._phase = _KEY if char == 0x7B else _DONE
+                    if self._phase == _DONE:
+                        break
+
+            elif char in (0x7D, 0x5D):  # } ]
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end_value(out, chunk, emit_from, i)
+                    self._phase = _DONE
+                    break
+
+            elif self._depth == 1:
+                if char == 0x3A and self._phase == _COLON:  # :
+                    self._phase = _VALUE_START
+                elif char == 0x2C:  # ,
+                    self._end_value(out, chunk, emit_from, i)
+                    if self._phase == _DONE:
+                        break
+                    self._phase = _KEY
+
+        if self._emitting:
+            out.append(chunk[emit_from:])
+        return b''.join(out)
+
+    def _skip_nested(self, chunk: bytes, pos: int) -> int:
+        """Быстрый путь внутри вложенного значения: строки и парные скобки
+        убираются средствами bytes, без цикла по символам.
+        Возвращает позицию, до которой кусок разобран, или -1"""
+        bare = _STRING.sub(b'', chunk[pos:])
+        end = len(chunk)
+
+        quote = bare.find(b'"')
+        if quote != -1:
+            # Незакрытая строка в конце куска, после нее regex ничего не вырезал
+            end -= len(bare) - quote
+            bare = bare[:quote]
+
+        brackets = bare.translate(None, _NOT_BRACKETS)
+        while True:
+            reduced = brackets.replace(b'{}', b'').replace(b'[]', b'')
+            if len(reduced) == len(brackets):
+                break
+            brackets = reduced
+
+        # Остались непарные скобки: сначала закрывающие, затем открывающие
+        closing = brackets.count(b']') + brackets.count(b'}')
+        if closing >= self._depth - 1:
+            # Значение заканчивается в этом куске
+            return -1
+
+        self._depth += len(brackets) - 2 * closing
+        return end
+
+    def _end_value(self, out: list, chunk: bytes, emit_from: int, end: int):
+        if self._emitting:
+            out.append(chunk[emit_from:end].rstrip())
+            self._emitting = False
+            self.found = True
+            # Нужный ключ прочитан, остаток документа не нужен
+            self._phase = _DONE
+
+
+async def extract_member(chunks: AsyncIterator[bytes], key: str, default: bytes = b'[]') -> AsyncIterator[bytes]:
+    """Отдает значение ключа key из потока JSON-объекта, default если ключа нет"""
+    extractor = JsonMemberExtractor(key)
+    async for chunk in chunks:
+        part = extractor.feed(chunk)
+        if part:
+            yield part
+        if extractor.done:
+            break
+
+    if extractor.found:
+        return
+    if extractor.emitting:
+        logger.warning(f'Upstream document ended inside the value of key {key}')
+        return
+    yield default
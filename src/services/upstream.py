@@ -0,0 +1,85 @@
+from typing import Optional
+
+import httpx
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.resilience import ResilientClient
+
+logger = log.setup_logger('upstream')
+
+try:
+    import h2  # noqa: F401  (нужен httpx для HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Общие пулы соединений с gateway и worker на всё время жизни приложения
+class UpstreamClients:
+    def __init__(self):
+        self._gateway: Optional[ResilientClient] = None
+        self._worker: Optional[ResilientClient] = None
+
+    @staticmethod
+    def _build_client(base_url: str) -> httpx.AsyncClient:
+        """Создает клиент с настроенным пулом соединений"""
+        settings = config.http
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(
+            connect=settings.connect_timeout,
+            read=settings.read_timeout,
+            write=settings.write_timeout,
+            pool=settings.pool_timeout,
+        )
+        # HTTP/2 согласуется через ALPN, поэтому работает только для https
+        return httpx.AsyncClient(
+            base_url=base_url,
+            limits=limits,
+            timeout=timeout,
+            http2=settings.http2 and HTTP2_AVAILABLE,
+        )
+
+    async def start(self):
+        """Открывает пулы. Вызывается из lifespan приложения"""
+        if self._gateway is None:
+            self._gateway = ResilientClient('gateway', self._build_client(config.gateway.url))
+        if self._worker is None:
+            self._worker = ResilientClient('worker', self._build_client(config.worker.url + config.worker.prefix))
+        logger.info('Upstream clients started (http2: %s)', config.http.http2 and HTTP2_AVAILABLE)
+
+    async def close(self):
+        """Закрывает пулы и все keep-alive соединения"""
+        for client in (self._gateway, self._worker):
+            if client is not None:
+                await client.aclose()
+        self._gateway, self._worker = None, None
+        logger.info('Upstream clients closed')
+
+    @property
+    def gateway(self) -> ResilientClient:
+        if self._gateway is None:
+            raise RuntimeError('Upstream clients are not started')
+        return self._gateway
+
+    @property
+    def worker(self) -> ResilientClient:
+        if self._worker is None:
+            raise RuntimeError('Upstream clients are not started')
+        return self._worker
+
+    def stats(self) -> dict:
+        """Состояние размыкателей цепи и повторов по каждому upstream"""
+        return {
+            client.name: client.stats()
+            for client in (self._gateway, self._worker)
+            if client is not None
+        }
+
+
+# Глобальный экземпляр клиентов
+upstream_clients = UpstreamClients()
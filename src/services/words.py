@@ -0,0 +1,149 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.config import config
+from src.logconf import opt_logger as log
+from src.services.backplane import Backplane
+from src.services.cache import upstream_cache
+
+logger = log.setup_logger('words_cache')
+
+# Сбросы словарей в сообщениях backplane
+INVALIDATION_SCOPE = 'words'
+
+
+class CachedWords:
+    """ Закодированный словарь пользователя и его ETag """
+
+    __slots__ = ('body', 'etag', 'expires_at')
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+
+# Кэш словарей пользователей. Ограничен числом записей и суммарным
+# размером тел ответов, вытесняются давно не читанные словари.
+# Изменения слов через этот сервис сбрасывают запись пользователя во всех
+# процессах (через backplane), TTL ограничивает устаревание при изменениях
+# в обход сервиса и при потере сообщений backplane
+class WordsCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # user_id -> CachedWords, порядок LRU
+        self._entries: "OrderedDict[int, CachedWords]" = OrderedDict()
+        # user_id -> номер изменения, чтобы не сохранить ответ, загруженный до записи.
+        # Нужен, только пока идут загрузки: хранится для пользователей из _loading
+        self._versions: Dict[int, int] = {}
+        # user_id -> число загрузок в полете
+        self._loading: Dict[int, int] = {}
+        self.bytes = 0
+        # Общий backplane процессов: через него расходятся сбросы записей
+        self._backplane: Optional[Backplane] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, user_id: int, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[CachedWords]:
+        """Возвращает словарь из кэша либо загружает его через loader"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(user_id)
+                return entry
+            self._remove(user_id)
+
+        self.misses += 1
+        version = self._versions.get(user_id, 0)
+        # Одновременные загрузки словаря объединяются, результат хранится здесь
+        return await upstream_cache.coalesce(('words', user_id, version), lambda: self._load(user_id, version, loader))
+
+    async def _load(self, user_id: int, version: int, loader: Callable[[], Awaitable[Optional[bytes]]]):
+        """Загрузка в задаче upstream_cache: доживает до конца, даже если запросивший отменен"""
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            body = await loader()
+            if body is None:
+                return None
+
+            entry = CachedWords(body, self.ttl)
+            if self._versions.get(user_id, 0) == version:
+                self._store(user_id, entry)
+            return entry
+        finally:
+            self._loading[user_id] -= 1
+            if not self._loading[user_id]:
+                del self._loading[user_id]
+                self._versions.pop(user_id, None)
+
+    def _store(self, user_id: int, entry: CachedWords):
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self._remove(user_id)
+        self._entries[user_id] = entry
+        self.bytes += len(entry.body)
+
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, user_id: int):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.bytes -= len(entry.body)
+
+    def attach(self, backplane: Backplane):
+        """Подписывает кэш на сбросы из других процессов, свои сбросы публикуются туда же"""
+        self._backplane = backplane
+        backplane.add_invalidation_listener(INVALIDATION_SCOPE, lambda key: self._drop(int(key)))
+
+    async def invalidate(self, user_id: int):
+        """Сбрасывает словарь пользователя после изменения слов во всех процессах"""
+        self._drop(user_id)
+        if self._backplane is None:
+            return
+        try:
+            await self._backplane.invalidate(INVALIDATION_SCOPE, str(user_id))
+        except Exception as e:
+            # Остальные процессы отдадут старый словарь не дольше TTL
+            logger.error(f'Error publishing words invalidation: {e}')
+
+    def _drop(self, user_id: int):
+        # Без загрузок в полете устаревшему ответу неоткуда взяться
+        if user_id in self._loading:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self._remove(user_id)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Глобальный экземпляр кэша словарей
+words_cache = WordsCache(
+    max_entries=config.words_cache.max_entries,
+    max_bytes=config.words_cache.max_bytes,
+    ttl=config.words_cache.ttl,
+)
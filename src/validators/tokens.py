@@ -1,9 +1,13 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Tuple
 
 import jwt
 
 from src.config import config
-from src.exc import FailToCreateToken
+from src.exc import FailToCreateToken, InvalidToken
 
 
 async def create_token(user_id, nickname, room_id, exp: timedelta = timedelta(minutes=15)) -> str:
@@ -31,12 +35,75 @@ def convert_token(token: str):
     return jwt.decode(jwt=token, key=config.secret_key, algorithms=["HS256"])
 
 
+# Кэш проверенных токенов. При переподключениях один и тот же токен
+# приходит много раз, повторная проверка подписи ему не нужна.
+# Ключ - хэш токена, запись живет до expires_at из самого токена
+class TokenVerifier:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # sha256(token) -> (claims, expires_at timestamp), порядок LRU
+        self._verified: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def verify(self, token: str, room_id: str) -> dict:
+        """Проверяет подпись, срок действия и комнату. Возвращает данные токена"""
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+
+        entry = self._verified.get(key)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            self._verified.move_to_end(key)
+            claims = entry[0]
+        else:
+            if entry is not None:
+                del self._verified[key]
+            self.misses += 1
+            claims, expires_at = self._decode(token, now)
+            self._verified[key] = (claims, expires_at)
+            if len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+
+        if claims.get("room_id") != room_id:
+            self.rejected += 1
+            raise InvalidToken("Token is issued for another room")
+        return claims
+
+    def _decode(self, token: str, now: float) -> Tuple[dict, float]:
+        try:
+            claims = convert_token(token)
+            expires_at = datetime.fromisoformat(claims["expires_at"]).timestamp()
+        except (jwt.PyJWTError, KeyError, TypeError, ValueError) as e:
+            self.rejected += 1
+            raise InvalidToken(f"Malformed token: {e}") from e
+
+        if not claims.get("nickname"):
+            self.rejected += 1
+            raise InvalidToken("Token has no nickname")
+        if expires_at <= now:
+            self.rejected += 1
+            raise InvalidToken("Token has expired")
+        return claims, expires_at
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._verified),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+        }
+
+
+# Глобальный экземпляр проверки токенов
+token_verifier = TokenVerifier(config.tokens.cache_size)
+
+
 async def validate_access(token: str, room_id: str) -> bool:
-    user_data = convert_token(token)
-    print(f"user data {user_data}")
-    print(f"room_id from token: {user_data.get('room_id')}, room_id from query: {room_id}")
-    if user_data.get("room_id") == room_id:
-        print("Аутентификация прошла успешно")
+    try:
+        token_verifier.verify(token, room_id)
         return True
-    print("Некоректный token!")
-    return False
+    except InvalidToken:
+        return False
@@ -0,0 +1,15 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+
+# Конфиг читает окружение при импорте: адреса заглушек, сервисы не запускаются
+for name, value in {
+    'WORKER_HOST': '127.0.0.1', 'WORKER_PORT': '9001',
+    'GATEWAY_HOST': '127.0.0.1', 'GATEWAY_PORT': '9002',
+    'THIS_HOST': '127.0.0.1', 'THIS_PORT': '8000',
+    'SECRET_KEY': '0123456789abcdef0123456789abcdef',
+    'LOG_LEVEL': 'WARNING',
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from src.services.backplane import RedisBackplane
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+class Node:
+    """ Процесс с собственным backplane и журналом доставленных кадров """
+
+    def __init__(self, server):
+        client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        self.backplane = RedisBackplane(client=client, reconnect_delay=0.01, reconnect_max_delay=0.05)
+        self.delivered = []
+
+    async def deliver(self, room_id, frame, exclude):
+        self.delivered.append((room_id, frame, exclude))
+
+    async def start(self):
+        await self.backplane.start(self.deliver)
+        return self
+
+
+async def _settle(condition, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def test_presence_and_broadcast_across_nodes():
+    async def run():
+        server = fakeredis.FakeServer()
+        first, second = await Node(server).start(), await Node(server).start()
+
+        await first.backplane.join('room', 'alice')
+        await second.backplane.join('room', 'bob')
+        assert sorted(await first.backplane.members('room')) == ['alice', 'bob']
+        assert sorted(await second.backplane.members('room')) == ['alice', 'bob']
+
+        await first.backplane.publish('room', '{"type":"new_message"}', exclude='alice')
+        await _settle(lambda: second.delivered)
+        assert second.delivered == [('room', '{"type":"new_message"}', 'alice')]
+        # Свои сообщения процесс доставляет сам, из канала они не возвращаются
+        assert first.delivered == []
+
+        await second.backplane.leave('room', 'bob')
+        assert await first.backplane.members('room') == ['alice']
+
+        for node in (first, second):
+            await node.backplane.close()
+
+    asyncio.run(run())
+
+
+def test_leave_keeps_presence_written_by_reconnect_elsewhere():
+    async def run():
+        server = fakeredis.FakeServer()
+        first, second = await Node(server).start(), await Node(server).start()
+
+        await first.backplane.join('room', 'alice')
+        # Клиент переподключился к другому процессу раньше, чем первый заметил обрыв
+        await second.backplane.join('room', 'alice')
+        await first.backplane.leave('room', 'alice')
+        assert await second.backplane.members('room') == ['alice']
+
+        await second.backplane.leave('room', 'alice')
+        assert await second.backplane.members('room') == []
+
+        for node in (first, second):
+            await node.backplane.close()
+
+    asyncio.run(run())
+
+
+def test_listener_resubscribes_after_disconnect():
+    async def run():
+        server = fakeredis.FakeServer()
+        first, second = await Node(server).start(), await Node(server).start()
+
+        # Обрыв соединения с Redis у читающего процесса
+        await second.backplane._pubsub.connection.disconnect()
+        server.connected = False
+        await asyncio.sleep(0.05)
+        server.connected = True
+
+        async def delivered():
+            await first.backplane.publish('room', 'frame')
+            await asyncio.sleep(0.02)
+            return bool(second.delivered)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 2.0
+        while not await delivered() and loop.time() < deadline:
+            pass
+        assert second.delivered and second.delivered[0][:2] == ('room', 'frame')
+        assert not second.backplane._task.done()
+
+        for node in (first, second):
+            await node.backplane.close()
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import httpx
+
+from src.models import Word, WordOperation
+from src.services.batch import WordBatchRunner
+
+
+class FakeGateway:
+    """ Словарь в памяти: PUT заменяет слово целиком, как gateway """
+
+    def __init__(self, delays=None):
+        self.words = {}
+        # Завершенные запросы в порядке ответа
+        self.calls = []
+        self.started = 0
+        # Задержка ответа по номеру вызова, чтобы параллельные запросы перемешались
+        self.delays = delays or {}
+
+    async def _respond(self, op: str, key):
+        index, self.started = self.started, self.started + 1
+        await asyncio.sleep(self.delays.get(index, 0))
+        self.calls.append((op, key))
+        return httpx.Response(200)
+
+    async def post(self, url, params, content):
+        data = json.loads(content)
+        self.words[(params["user_id"], data["word"])] = data
+        return await self._respond('create', data["word"])
+
+    async def put(self, url, params, content):
+        data = json.loads(content)
+        self.words[(params["user_id"], data.get("word_id", data["word"]))] = data
+        return await self._respond('update', data.get("word_id", data["word"]))
+
+    async def delete(self, url, params):
+        self.words.pop((params["user_id"], params["word_id"]), None)
+        return await self._respond('delete', params["word_id"])
+
+
+class FakeUpstream:
+    def __init__(self, gateway: FakeGateway):
+        self.gateway = gateway
+
+
+def _update(word_id: int, **fields) -> WordOperation:
+    return WordOperation(op='update', word_id=word_id, word=Word(user_id=1, word='apple', **fields))
+
+
+def test_merged_updates_match_applying_them_one_by_one():
+    operations = [
+        _update(5, translations={"ru": "яблоко"}, context="first"),
+        _update(5, is_public=True),
+        _update(5, translations={"de": "Apfel"}, context="last"),
+    ]
+
+    merged = FakeGateway()
+    results = asyncio.run(WordBatchRunner(concurrency=4).run(FakeUpstream(merged), operations))
+
+    one_by_one = FakeGateway()
+    runner = WordBatchRunner(concurrency=4)
+    for operation in operations:
+        asyncio.run(runner.run(FakeUpstream(one_by_one), [operation]))
+
+    assert merged.words == one_by_one.words
+    assert len(merged.calls) == 1
+    assert [result["ok"] for result in results] == [True, True, True]
+    assert [result.get("coalesced", False) for result in results] == [True, True, False]
+
+
+def test_text_and_id_keyed_operations_of_one_user_run_in_order():
+    operations = [
+        WordOperation(op='create', word=Word(user_id=1, word='apple')),
+        WordOperation(op='delete', user_id=1, word_id=7),
+        WordOperation(op='update', word=Word(user_id=1, word='apple', context='new')),
+    ]
+    # Первый запрос отвечает дольше всех: параллельный запуск поменял бы порядок
+    gateway = FakeGateway(delays={0: 0.05, 1: 0.02})
+    asyncio.run(WordBatchRunner(concurrency=4).run(FakeUpstream(gateway), operations))
+
+    assert gateway.calls == [('create', 'apple'), ('delete', 7), ('update', 'apple')]
@@ -0,0 +1,38 @@
+import asyncio
+
+import httpx
+
+from src.services.cache import upstream_cache
+from src.services.history import HistoryCache
+from src.services.upstream import upstream_clients
+
+
+class FakeWorker:
+    def __init__(self, messages):
+        self.messages = messages
+        self.calls = 0
+
+    async def get(self, url: str):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return httpx.Response(200, json=self.messages)
+
+
+def test_history_fetch_leaves_upstream_cache_empty(monkeypatch):
+    messages = [{"sender": "a", "text": str(i), "created_at": f"2025-01-01T00:00:{i:02d}"} for i in range(5)]
+    worker = FakeWorker(messages)
+    monkeypatch.setattr(upstream_clients, '_worker', worker)
+    cache = HistoryCache()
+
+    async def run():
+        # Одновременные загрузки одной комнаты объединяются в один запрос
+        return await asyncio.gather(*(cache.recent('room', 10) for _ in range(3)))
+
+    pages = asyncio.run(run())
+
+    assert worker.calls == 1
+    assert all(page == (messages, False) for page in pages)
+    stats = upstream_cache.stats()
+    assert stats["entries"] == 0
+    assert stats["inflight"] == 0
+    assert stats["hits"] == stats["misses"] == 0
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from src.services.backplane import RedisBackplane
+from src.services.words import WordsCache
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+async def _noop_deliver(room_id, frame, exclude):
+    pass
+
+
+async def _settle(condition, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def test_invalidation_reaches_other_processes():
+    async def run():
+        server = fakeredis.FakeServer()
+        nodes = []
+        for _ in range(2):
+            backplane = RedisBackplane(client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+            await backplane.start(_noop_deliver)
+            cache = WordsCache(max_entries=10, max_bytes=1 << 20, ttl=300)
+            cache.attach(backplane)
+            nodes.append((backplane, cache))
+
+        async def load():
+            return b'[{"word": "old"}]'
+
+        (first, first_cache), (second, second_cache) = nodes
+        for _, cache in nodes:
+            await cache.get(42, load)
+        assert second_cache.stats()["entries"] == 1
+
+        await first_cache.invalidate(42)
+        assert first_cache.stats()["entries"] == 0
+        await _settle(lambda: second_cache.stats()["entries"] == 0)
+        assert second_cache.stats()["entries"] == 0
+
+        for backplane, _ in nodes:
+            await backplane.close()
+
+    asyncio.run(run())